@@ -1,6 +1,9 @@
 # config_loader.py
 from __future__ import annotations
 
+import functools
+from collections import OrderedDict
+from dataclasses import dataclass, field, fields
 from pathlib import Path
 from typing import Any
 import re
@@ -10,86 +13,512 @@ try:
 except ImportError as e:
     raise SystemExit(
         "Missing dependency: PyYAML\n"
-        "Install with: python -m pip install pyyaml"
+        "Install with: python -m pip install pyyaml\n"
+        "(install libyaml-dev first to get the faster C loader)"
     ) from e
 
+# Prefer the libyaml C bindings; fall back to the pure-Python loader.
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
 
+@dataclass(frozen=True, slots=True)
 class OrgReaderConfig:
     """
-    Immutable-ish container for Org reader configuration.
-    """
-
-    def __init__(
-        self,
-        *,
-        verbatim_blocks: set[str],
-        skip_header_keys: set[str],
-        quotes: dict[str, str],
-        block_re: re.Pattern,
-        header_kv_re: re.Pattern,
-        include_keyword_re: re.Pattern,
-        section_heading_re: re.Pattern,
-        unordered_list_re: re.Pattern,
-        ordered_list_re: re.Pattern,
-        drawer_begin_re: re.Pattern,
-        drawer_end_re: re.Pattern,
-        comment_begin_re: re.Pattern,
-        comment_end_re: re.Pattern,
-        latex_macro_re: re.Pattern,   # <-- NEW
-    ):
-        self.verbatim_blocks = verbatim_blocks
-        self.skip_header_keys = skip_header_keys
-        self.quotes = quotes
-        self.block_re = block_re
-        self.header_kv_re = header_kv_re
-        self.include_keyword_re = include_keyword_re
-        self.section_heading_re = section_heading_re
-        self.unordered_list_re = unordered_list_re
-        self.ordered_list_re = ordered_list_re
-        self.drawer_begin_re = drawer_begin_re
-        self.drawer_end_re = drawer_end_re
-        self.comment_begin_re = comment_begin_re
-        self.comment_end_re = comment_end_re
-        self.latex_macro_re = latex_macro_re  # <-- NEW
+    Immutable container for Org reader configuration.
+    """
 
+    verbatim_blocks: frozenset[str]
+    skip_header_keys: frozenset[str]
+    quotes: dict[str, str] = field(hash=False)
+    block_re: re.Pattern
+    header_kv_re: re.Pattern
+    include_keyword_re: re.Pattern
+    section_heading_re: re.Pattern
+    unordered_list_re: re.Pattern
+    ordered_list_re: re.Pattern
+    drawer_begin_re: re.Pattern
+    drawer_end_re: re.Pattern
+    comment_begin_re: re.Pattern
+    comment_end_re: re.Pattern
+    latex_macro_re: re.Pattern
 
-# ---------------- Defaults ---------------------------------------------------
+    # Derived from the patterns above in __post_init__.
+    # None if some line pattern cannot be spliced into one alternation
+    # (see _splices_safely); classify() then tries them one by one.
+    combined_line_re: re.Pattern | None = field(init=False, repr=False, compare=False)
+    # (kind, pattern) in classify() order.
+    line_patterns: tuple[tuple[str, re.Pattern], ...] = field(init=False, repr=False, compare=False)
+    # First non-blank characters a line must start with to match any line
+    # pattern; None if that cannot be read off the patterns.
+    line_start_chars: frozenset[str] | None = field(init=False, repr=False, compare=False)
+    # open(.*)close for every pair in quotes, in order; None without quotes.
+    quote_strip_re: re.Pattern | None = field(init=False, repr=False, compare=False)
+    # First non-blank character -> combined pattern of only the alternatives
+    # that can start with it; None if line_start_chars is None.
+    line_re_by_char: dict[str, re.Pattern] | None = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        for f in fields(self):
+            if f.name.endswith("_re") and f.init:
+                value = getattr(self, f.name)
+                if not isinstance(value, re.Pattern):
+                    raise TypeError(f"{f.name} must be a compiled re.Pattern, got {type(value).__name__}")
+
+        # Lines are matched against lowercased keywords; normalise once here
+        # so configs built without load_config() behave the same.
+        keys = self.skip_header_keys
+        if not isinstance(keys, frozenset) or not all(k.islower() for k in keys):
+            object.__setattr__(self, "skip_header_keys", frozenset(k.lower() for k in keys))
+
+        # One alternation over the line-anchored patterns, so a single match
+        # classifies a line. Order matters: the first alternative wins.
+        named = [
+            ("comment_begin", self.comment_begin_re),
+            ("comment_end", self.comment_end_re),
+            ("drawer_end", self.drawer_end_re),
+            ("drawer_begin", self.drawer_begin_re),
+            ("block", self.block_re),
+            ("include", self.include_keyword_re),
+            ("header_kv", self.header_kv_re),
+            ("section_heading", self.section_heading_re),
+            ("unordered_list", self.unordered_list_re),
+            ("ordered_list", self.ordered_list_re),
+        ]
+        object.__setattr__(self, "line_patterns", tuple(named))
+        object.__setattr__(
+            self, "line_start_chars", _line_start_chars([pattern for _, pattern in named])
+        )
+        if all(_splices_safely(pattern) for _, pattern in named):
+            object.__setattr__(self, "combined_line_re", _combine_line_patterns(named))
+            object.__setattr__(self, "line_re_by_char", _line_patterns_by_char(named))
+        else:
+            object.__setattr__(self, "combined_line_re", None)
+            object.__setattr__(self, "line_re_by_char", None)
+        object.__setattr__(self, "quote_strip_re", _quote_strip_pattern(self.quotes))
+
+    def classify(self, line: str) -> tuple[str, re.Match] | None:
+        """
+        Classify a line with the combined pattern.
+
+        Returns (kind, match) for the first matching alternative, e.g.
+        ("block", <match>), or None. The match may belong to the combined
+        pattern; use classified_group() for the matched pattern's groups.
+        """
+        if self.combined_line_re is None:
+            for kind, pattern in self.line_patterns:
+                match = pattern.match(line)
+                if match is not None:
+                    return kind, match
+            return None
+
+        by_char = self.line_re_by_char
+        if by_char is None:
+            match = self.combined_line_re.match(line)
+        else:
+            # Only the alternatives that can start with this character are
+            # tried; prose lines need no regex at all.
+            pattern = by_char.get(line.lstrip()[:1])
+            match = pattern.match(line) if pattern is not None else None
+        if match is None:
+            return None
+        return match.lastgroup, match
+
+    def may_classify(self, stripped: str) -> bool:
+        """
+        Cheap pre-check on a left-stripped line: False means classify()
+        cannot match it, because it starts with none of line_start_chars.
+        """
+        start_chars = self.line_start_chars
+        return start_chars is None or stripped[:1] in start_chars
+
+    def classified_group(self, match: re.Match, n: int) -> str | None:
+        """
+        Group `n` of the line pattern that produced a classify() match.
+
+        The pattern's own groups follow its named wrapper group in the
+        combined pattern, so group n sits n positions after it.
+        """
+        if self.combined_line_re is None:
+            return match.group(n)
+        return match.group(match.re.groupindex[match.lastgroup] + n)
 
-DEFAULT_CONFIG = OrgReaderConfig(
-    verbatim_blocks={"example", "src", "verbatim", "export", "quote"},
-    skip_header_keys={"title", "author", "date", "options"},
-    quotes={'"': '"', "'": "'"},
-    block_re=re.compile(r"^\s*#\+(begin|end)_(\w+)\b\s*(.*)$", re.IGNORECASE),
-    header_kv_re=re.compile(r"^\s*#\+([A-Za-z0-9_-]+)\s*:", re.IGNORECASE),
-    include_keyword_re=re.compile(r"^\s*#\+include\b", re.IGNORECASE),
-    section_heading_re=re.compile(r"^([*]+)\s+([^:]*)(.*)$", re.IGNORECASE),
-    unordered_list_re=re.compile(r"^\s*[-+]\s+(.*)$", re.IGNORECASE),
-    ordered_list_re=re.compile(r"^\s*(\d+)[.)]\s+(.*)$", re.IGNORECASE),
-    drawer_begin_re=re.compile(r"^\s*:([A-Za-z0-9_@#%]+):\s*$", re.IGNORECASE),
-    drawer_end_re=re.compile(r"^\s*:END:\s*$", re.IGNORECASE),
-    comment_begin_re=re.compile(r"^\s*#\+begin_comment\b", re.IGNORECASE),
-    comment_end_re=re.compile(r"^\s*#\+end_comment\b", re.IGNORECASE),
-    latex_macro_re=re.compile(
-        r"\\(?:def|newcommand|renewcommand|providecommand|newenvironment|renewenvironment)\b"
-    ),
+
+@functools.lru_cache(maxsize=256)
+def _compile(pattern: str, flags: int = 0) -> re.Pattern:
+    """
+    re.compile, memoized by (pattern, flags) so configs loaded with the same
+    sources share compiled objects. Bounded so odd configs cannot grow it
+    without limit.
+    """
+    return re.compile(pattern, flags)
+
+
+_INLINE_FLAGS = (
+    (re.ASCII, "a"),
+    (re.IGNORECASE, "i"),
+    (re.MULTILINE, "m"),
+    (re.DOTALL, "s"),
+    (re.VERBOSE, "x"),
 )
 
+
+def _splices_safely(pattern: re.Pattern) -> bool:
+    """
+    False if `pattern` may change meaning inside _combine_line_patterns():
+    named groups (which can collide with the wrapper names or each other)
+    and references to groups by number or name (backreferences,
+    conditionals), which would point at the wrapper's groups.
+
+    Errs on the side of False; that only costs the combined match.
+    """
+    if pattern.groupindex:
+        return False
+    src = pattern.pattern
+    i = 0
+    while i < len(src):
+        c = src[i]
+        if c == "\\":
+            if src[i + 1 : i + 2].isdigit() and src[i + 1] != "0":
+                return False
+            i += 2
+            continue
+        if src.startswith("(?P=", i) or src.startswith("(?(", i):
+            return False
+        i += 1
+    return True
+
+
+def _combine_line_patterns(named: list[tuple[str, re.Pattern]]) -> re.Pattern:
+    """
+    Join patterns into one alternation of named groups.
+
+    Each pattern keeps its own flags via a scoped inline group, e.g.
+    (?P<block>(?i:^\s*#\+(begin|end)_...)).
+    """
+    parts: list[str] = []
+    for name, pattern in named:
+        flags = "".join(c for flag, c in _INLINE_FLAGS if pattern.flags & flag)
+        inner = f"(?{flags}:{pattern.pattern})" if flags else f"(?:{pattern.pattern})"
+        parts.append(f"(?P<{name}>{inner})")
+    return _compile("|".join(parts))
+
+
+def _quote_strip_pattern(quotes: dict[str, str]) -> re.Pattern | None:
+    """
+    One pattern matching a whole string wrapped in any of the quote pairs.
+
+    Alternatives keep the order of `quotes`, and each has a single group
+    for the text between the quotes.
+    """
+    if not quotes:
+        return None
+    alternatives = "|".join(
+        f"{re.escape(open_quote)}(.*){re.escape(close_quote)}"
+        for open_quote, close_quote in quotes.items()
+    )
+    return _compile(f"(?:{alternatives})", re.DOTALL)
+
+
+def _first_char_set(pattern: re.Pattern) -> set[str] | None:
+    """
+    Characters a match of `pattern` can start with after leading whitespace.
+
+    Only understands the simple anchored shape the line patterns use:
+    ^, optional \s*, optional opening group, then one literal character,
+    escaped character, ASCII \d or plain [class] that is not optional
+    (nor inside a group that is) and cannot match whitespace. Anything else
+    returns None.
+    """
+    src = pattern.pattern
+    if pattern.flags & (re.VERBOSE | re.MULTILINE) or not src.startswith("^"):
+        return None
+    pos = 1
+    if src.startswith(r"\s*", pos):
+        pos += 3
+    group_start = None
+    if src.startswith("(", pos) and not src.startswith("(?", pos):
+        group_start = pos
+        pos += 1
+
+    chars: set[str] = set()
+    if src.startswith("[", pos):
+        end = src.find("]", pos + 2)
+        body = src[pos + 1 : end] if end != -1 else ""
+        if not body or body.startswith("^") or "\\" in body or "-" in body.strip("-"):
+            return None
+        chars.update(body)
+        pos = end + 1
+    elif src.startswith("\\", pos) and pos + 1 < len(src):
+        esc = src[pos + 1]
+        if esc == "d" and pattern.flags & re.ASCII:
+            chars.update("0123456789")
+        elif esc.isalnum():
+            return None
+        else:
+            chars.add(esc)
+        pos += 2
+    elif pos < len(src) and src[pos] not in "\\[].^$|?*+(){}":
+        chars.add(src[pos])
+        pos += 1
+    else:
+        return None
+
+    if src[pos : pos + 1] in ("?", "*", "{"):
+        return None
+    if any(c.isspace() for c in chars):
+        return None  # callers test the line after lstrip()
+    if group_start is not None:
+        # A quantifier after the first group may make the character optional
+        group_end = _closing_paren(src, group_start)
+        if group_end == -1 or src[group_end + 1 : group_end + 2] in ("?", "*", "{"):
+            return None
+    if _has_alternation(src, group_start):
+        return None
+    if pattern.flags & re.IGNORECASE:
+        if not pattern.flags & re.ASCII and any(c.isalpha() for c in chars):
+            return None  # Unicode case folding has too many variants
+        chars |= {c.lower() for c in chars} | {c.upper() for c in chars}
+    return chars
+
+
+def _closing_paren(src: str, start: int) -> int:
+    """
+    Index of the ')' closing the group opened at `start`, or -1.
+    """
+    depth = 0
+    i = start
+    while i < len(src):
+        c = src[i]
+        if c == "\\":
+            i += 2
+            continue
+        if c == "[":
+            i = src.find("]", i + (3 if src.startswith("[^", i) else 2))
+            if i == -1:
+                return -1
+        elif c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+            if depth == 0:
+                return i
+        i += 1
+    return -1
+
+
+def _has_alternation(src: str, group_start: int | None) -> bool:
+    """
+    True if `src` has a top-level '|', or one inside the group opened at
+    `group_start`.
+    """
+    depth = 0
+    in_first_group = False
+    i = 0
+    while i < len(src):
+        c = src[i]
+        if c == "\\":
+            i += 2
+            continue
+        if c == "[":
+            # skip a character class ("[]" and "[^]" start with a literal ])
+            i = src.find("]", i + (3 if src.startswith("[^", i) else 2))
+            if i == -1:
+                return True
+        elif c == "(":
+            depth += 1
+            if i == group_start:
+                in_first_group = True
+        elif c == ")":
+            depth -= 1
+            if depth == 0:
+                in_first_group = False
+        elif c == "|" and (depth == 0 or in_first_group):
+            return True
+        i += 1
+    return False
+
+
+def _line_start_chars(patterns: list[re.Pattern]) -> frozenset[str] | None:
+    """
+    Union of _first_char_set over the patterns, or None if any is unknown.
+    """
+    chars: set[str] = set()
+    for pattern in patterns:
+        first = _first_char_set(pattern)
+        if first is None:
+            return None
+        chars |= first
+    return frozenset(chars)
+
+
+def _line_patterns_by_char(
+    named: list[tuple[str, re.Pattern]],
+) -> dict[str, re.Pattern] | None:
+    """
+    Map each possible first character to the combined pattern of the
+    alternatives that can start with it, keeping their order.
+
+    None if the first characters of some pattern are unknown.
+    """
+    firsts: list[tuple[str, re.Pattern, set[str]]] = []
+    for name, pattern in named:
+        first = _first_char_set(pattern)
+        if first is None:
+            return None
+        firsts.append((name, pattern, first))
+    chars = set().union(*(first for _, _, first in firsts))
+    return {
+        char: _combine_line_patterns(
+            [(name, pattern) for name, pattern, first in firsts if char in first]
+        )
+        for char in chars
+    }
+
+
+# ---------------- Defaults ---------------------------------------------------
+
+# Default pattern sources keyed by OrgReaderConfig field, as plain strings so
+# load_config can use them without compiling the defaults first.
+_DEFAULT_PATTERNS: dict[str, str] = {
+    "block_re": r"^\s*#\+(begin|end)_(\w+)\b\s*(.*)$",
+    "header_kv_re": r"^\s*#\+([A-Za-z0-9_-]+)\s*:",
+    "include_keyword_re": r"^\s*#\+include\b",
+    "section_heading_re": r"^([*]+)\s+([^:]*)(.*)$",
+    "unordered_list_re": r"^\s*[-+]\s+(.*)$",
+    "ordered_list_re": r"^\s*(\d+)[.)]\s+(.*)$",
+    "drawer_begin_re": r"^\s*:([A-Za-z0-9_@#%]+):\s*$",
+    "drawer_end_re": r"^\s*:END:\s*$",
+    "comment_begin_re": r"^\s*#\+begin_comment\b",
+    "comment_end_re": r"^\s*#\+end_comment\b",
+    # factored form of def|newcommand|renewcommand|providecommand|
+    # newenvironment|renewenvironment (shared prefixes matched once)
+    "latex_macro_re": r"\\(?:def|(?:re)?new(?:command|environment)|providecommand)\b",
+}
+
+# Flags: re.ASCII everywhere Unicode classes are not needed; re.IGNORECASE
+# only where a pattern contains literal keywords (BEGIN/END/INCLUDE/...).
+# block_re keeps Unicode matching so block names may use non-ASCII \w.
+_PATTERN_FLAGS: dict[str, int] = {
+    "block_re": re.IGNORECASE,
+    "header_kv_re": re.ASCII,
+    "include_keyword_re": re.IGNORECASE | re.ASCII,
+    "section_heading_re": re.ASCII,
+    "unordered_list_re": re.ASCII,
+    "ordered_list_re": re.ASCII,
+    "drawer_begin_re": re.ASCII,
+    "drawer_end_re": re.IGNORECASE | re.ASCII,
+    "comment_begin_re": re.IGNORECASE | re.ASCII,
+    "comment_end_re": re.IGNORECASE | re.ASCII,
+    "latex_macro_re": 0,
+}
+
+# YAML keys under `regex:` that differ from the field name.
+_YAML_REGEX_KEYS: dict[str, str] = {"include_keyword_re": "include_keyword"}
+
+_DEFAULT_SETS: dict[str, frozenset[str]] = {
+    "verbatim_blocks": frozenset({"example", "src", "verbatim", "export", "quote"}),
+    "skip_header_keys": frozenset({"title", "author", "date", "options"}),
+}
+_DEFAULT_QUOTES: dict[str, str] = {'"': '"', "'": "'"}
+
+
+def _compile_patterns(regex: dict[str, Any]) -> dict[str, re.Pattern]:
+    """
+    Compile every pattern field, taking sources from `regex` (the YAML
+    `regex:` section) and falling back to the defaults.
+    """
+    return {
+        name: _compile(
+            regex.get(_YAML_REGEX_KEYS.get(name, name), default),
+            _PATTERN_FLAGS[name],
+        )
+        for name, default in _DEFAULT_PATTERNS.items()
+    }
+
+
+@functools.cache
+def get_default_config() -> OrgReaderConfig:
+    """
+    Return the built-in configuration, compiled on first use.
+    """
+    return OrgReaderConfig(
+        verbatim_blocks=_DEFAULT_SETS["verbatim_blocks"],
+        skip_header_keys=_DEFAULT_SETS["skip_header_keys"],
+        quotes=dict(_DEFAULT_QUOTES),
+        **_compile_patterns({}),
+    )
+
+
+def __getattr__(name: str) -> Any:
+    # DEFAULT_CONFIG stays importable but is only built when first accessed.
+    if name == "DEFAULT_CONFIG":
+        return get_default_config()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 # ---------------- Loader -----------------------------------------------------
 
+# Parsed configs keyed by resolved path, least recently used first, each
+# with the (mtime_ns, size) it was parsed at; an edited file is parsed again
+# and replaces its old entry.
+_CONFIG_CACHE: OrderedDict[str, tuple[tuple[int, int], OrgReaderConfig]] = OrderedDict()
+_CONFIG_CACHE_SIZE = 16
+
 
-def _as_lower_str_set(value: Any, name: str) -> set[str]:
+def _as_lower_str_set(value: Any, name: str) -> frozenset[str]:
     if value is None:
-        return set()
+        return frozenset()
     if not isinstance(value, list):
         raise TypeError(f"{name} must be a list of strings")
-    return {str(v).lower() for v in value}
+    out: set[str] = set()
+    for v in value:
+        if type(v) is str:
+            # Keep the original object when lowering would not change it.
+            out.add(v if v.islower() else v.lower())
+        else:
+            out.add(str(v).lower())
+    return frozenset(out)
 
 
 def load_config(path: Path) -> OrgReaderConfig:
     """
     Load YAML config and return an OrgReaderConfig instance.
+
+    Results are cached per file; repeated calls for an unchanged file return
+    the same instance.
     """
-    raw = yaml.safe_load(path.read_text(encoding="utf-8"))
+    st = path.stat()
+    key = str(path.resolve())
+    stamp = (st.st_mtime_ns, st.st_size)
+    entry = _CONFIG_CACHE.get(key)
+    if entry is not None and entry[0] == stamp:
+        try:
+            _CONFIG_CACHE.move_to_end(key)
+        except KeyError:  # evicted by another thread meanwhile
+            pass
+        return entry[1]
+
+    cfg = _build_config(path)
+    _CONFIG_CACHE[key] = (stamp, cfg)
+    try:
+        _CONFIG_CACHE.move_to_end(key)
+        while len(_CONFIG_CACHE) > _CONFIG_CACHE_SIZE:
+            _CONFIG_CACHE.popitem(last=False)
+    except KeyError:
+        pass
+    return cfg
+
+
+def _build_config(path: Path) -> OrgReaderConfig:
+    """
+    Parse the YAML file at `path` and compile it into an OrgReaderConfig.
+    """
+    # Hand libyaml the file object so it reads and decodes incrementally.
+    with path.open("rb") as fh:
+        raw = yaml.load(fh, Loader=_YamlLoader)
     if raw is None:
         raw = {}
     if not isinstance(raw, dict):
@@ -99,55 +528,16 @@ def load_config(path: Path) -> OrgReaderConfig:
 
     return OrgReaderConfig(
         verbatim_blocks=_as_lower_str_set(
-            raw.get("verbatim_blocks", list(DEFAULT_CONFIG.verbatim_blocks)),
+            raw.get("verbatim_blocks", list(_DEFAULT_SETS["verbatim_blocks"])),
             "verbatim_blocks",
         ),
         skip_header_keys=_as_lower_str_set(
-            raw.get("skip_header_keys", list(DEFAULT_CONFIG.skip_header_keys)),
+            raw.get("skip_header_keys", list(_DEFAULT_SETS["skip_header_keys"])),
             "skip_header_keys",
         ),
-        quotes=dict(raw.get("quotes", DEFAULT_CONFIG.quotes)),
-        block_re=re.compile(
-            regex.get("block_re", DEFAULT_CONFIG.block_re.pattern),
-            re.IGNORECASE,
-        ),
-        header_kv_re=re.compile(
-            regex.get("header_kv_re", DEFAULT_CONFIG.header_kv_re.pattern),
-            re.IGNORECASE,
-        ),
-        include_keyword_re=re.compile(
-            regex.get("include_keyword", DEFAULT_CONFIG.include_keyword_re.pattern),
-            re.IGNORECASE,
-        ),
-        section_heading_re=re.compile(
-            regex.get("section_heading_re", DEFAULT_CONFIG.section_heading_re.pattern),
-            re.IGNORECASE,
-        ),
-        unordered_list_re=re.compile(
-            regex.get("unordered_list_re", DEFAULT_CONFIG.unordered_list_re.pattern),
-            re.IGNORECASE,
-        ),
-        ordered_list_re=re.compile(
-            regex.get("ordered_list_re", DEFAULT_CONFIG.ordered_list_re.pattern),
-            re.IGNORECASE,
-        ),
-        drawer_begin_re=re.compile(
-            regex.get("drawer_begin_re", DEFAULT_CONFIG.drawer_begin_re.pattern),
-            re.IGNORECASE,
-        ),
-        drawer_end_re=re.compile(
-            regex.get("drawer_end_re", DEFAULT_CONFIG.drawer_end_re.pattern),
-            re.IGNORECASE,
-        ),
-        comment_begin_re=re.compile(
-            regex.get("comment_begin_re", DEFAULT_CONFIG.comment_begin_re.pattern),
-            re.IGNORECASE,
-        ),
-        comment_end_re=re.compile(
-            regex.get("comment_end_re", DEFAULT_CONFIG.comment_end_re.pattern),
-            re.IGNORECASE,
-        ),
-        latex_macro_re=re.compile(
-            regex.get("latex_macro_re", DEFAULT_CONFIG.latex_macro_re.pattern)
-        ),
+        quotes=dict(raw.get("quotes", _DEFAULT_QUOTES)),
+        **_compile_patterns(regex),
     )
+
+
+load_config.cache_clear = _CONFIG_CACHE.clear  # type: ignore[attr-defined]
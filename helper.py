@@ -1,7 +1,15 @@
+import sys
+
+# ANSI colours only make sense on a terminal; log files and pipes get the
+# plain text.
+_IS_TTY = sys.stdout.isatty()
+_GRAY, _RESET = ("\033[90m", "\033[0m") if _IS_TTY else ("", "")
+
+
 def print_event_gray(text: str) -> None:
     """
     Print event/debug output in gray using ANSI escape codes.
+
+    The colour codes are omitted when stdout is not a TTY.
     """
-    GRAY = "\033[90m"
-    RESET = "\033[0m"
-    print(f"{GRAY}{text}{RESET}")
+    sys.stdout.write(f"{_GRAY}{text}{_RESET}\n")
@@ -1,9 +1,463 @@
 # math_renderer.py
 from __future__ import annotations
 
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import IO, Optional
+import atexit
+import hashlib
+import itertools
+import os
+import shutil
 import subprocess
 import tempfile
+import threading
+
+
+_BEGIN_DOCUMENT = r"\begin{document}" "\n"
+
+
+def _tex_header(macros: str) -> str:
+    """
+    Document class and macros: everything before \\begin{document}.
+
+    Each fragment sits in its own `orgmath` environment, which standalone's
+    multi mode turns into a separate (cropped) page.
+    """
+    parts = [
+        r"\documentclass[multi]{standalone}" "\n",
+        r"\newenvironment{orgmath}{}{}" "\n",
+        r"\standaloneenv{orgmath}" "\n",
+    ]
+
+    # Inject macro definitions into the preamble (recommended place).
+    if macros:
+        parts.append("% --- org-viewer macros (cached from #+LATEX:) ---\n")
+        parts.append(macros)
+        parts.append("\n% --- end macros ---\n")
+
+    return "".join(parts)
+
+
+def _tex_preamble(macros: str) -> str:
+    """
+    Everything up to and including \\begin{document}.
+    """
+    return _tex_header(macros) + _BEGIN_DOCUMENT
+
+
+def _tex_body(math_srcs: list[str]) -> str:
+    """
+    One page per fragment, then \\end{document}.
+    """
+    pages = [r"\begin{orgmath}$" + src + r"$\end{orgmath}" "\n" for src in math_srcs]
+    return "".join(pages) + r"\end{document}" "\n"
+
+
+_USER_CACHE_DIRS: dict[str, Optional[Path]] = {}
+
+
+def _user_cache_dir(name: str) -> Optional[Path]:
+    """
+    Persistent per-user cache directory: $XDG_CACHE_HOME/org-parser/<name>.
+
+    Created on first use. None if it cannot be created (e.g. a service user
+    without a writable home); callers then render without that cache.
+    """
+    if name not in _USER_CACHE_DIRS:
+        cache_dir: Optional[Path]
+        try:
+            base = os.environ.get("XDG_CACHE_HOME") or str(Path.home() / ".cache")
+            cache_dir = Path(base) / "org-parser" / name
+            cache_dir.mkdir(parents=True, exist_ok=True)
+        except (OSError, RuntimeError):  # RuntimeError: no home directory
+            cache_dir = None
+        _USER_CACHE_DIRS[name] = cache_dir
+    return _USER_CACHE_DIRS[name]
+
+
+# One scratch directory per process for all LaTeX jobs; removed at exit.
+_SCRATCH = tempfile.TemporaryDirectory(prefix="orgmath-")
+_SCRATCH_DIR = Path(_SCRATCH.name)
+_JOB_COUNTER = itertools.count()
+
+
+def _next_jobname() -> str:
+    return f"fragment{next(_JOB_COUNTER)}"
+
+
+def _remove_job_files(jobname: str) -> None:
+    """
+    Delete everything a job left in the scratch directory (.tex/.dvi/.aux/
+    .log and unclaimed page SVGs).
+    """
+    for leftover in _SCRATCH_DIR.glob(f"{jobname}[.-]*"):
+        leftover.unlink(missing_ok=True)
+
+
+def _write_tex(jobname: str, text: str) -> Path:
+    """
+    Write <jobname>.tex into the scratch directory with a single write(2).
+    """
+    tex_path = _SCRATCH_DIR / f"{jobname}.tex"
+    data = text.encode("utf-8")
+    fd = os.open(tex_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+    return tex_path
+
+
+# Precompiled preamble formats (mylatexformat), keyed by header digest.
+# None means "no usable format, compile the preamble as text".
+_FORMATS: dict[str, Optional[Path]] = {}
+# Guards _FORMATS and _FORMAT_BUILD_LOCKS only; never held while TeX runs.
+_FORMATS_LOCK = threading.Lock()
+# One lock per header digest, held while that format is checked or built, so
+# threads wait only for a build of the preamble they need.
+_FORMAT_BUILD_LOCKS: dict[str, threading.Lock] = {}
+# .fmt files kept in the format cache directory (several MB each); the least
+# recently used ones beyond this are deleted when a new format is built.
+_FORMATS_KEEP = 16
+
+
+def _ensure_preamble_format(macros: str) -> Optional[Path]:
+    """
+    Return a precompiled LaTeX format for this preamble, building it if needed.
+
+    The format is built once with mylatexformat and stored in
+    $XDG_CACHE_HOME/org-parser/fmts/<digest>.fmt; runs that load it skip the
+    document class and macro definitions entirely. Each format is checked
+    once per process with a trivial fragment, so a stale or broken file (e.g.
+    after a TeX Live upgrade) is rebuilt, and missing tools just disable it.
+    At most _FORMATS_KEEP formats are kept on disk.
+    """
+    header = _tex_header(macros)
+    key = hashlib.sha256(header.encode("utf-8")).hexdigest()[:32]
+
+    found, known = _known_format(key)
+    if found:
+        return known
+    with _FORMATS_LOCK:
+        build_lock = _FORMAT_BUILD_LOCKS.setdefault(key, threading.Lock())
+
+    with build_lock:
+        # Another thread may have finished this format while we waited.
+        found, known = _known_format(key)
+        if found:
+            return known
+
+        fmt_dir = _user_cache_dir("fmts")
+        if fmt_dir is None:
+            result = None
+        else:
+            fmt_path = fmt_dir / f"{key}.fmt"
+            if fmt_path.exists() and _format_works(fmt_path):
+                usable = True
+                try:
+                    os.utime(fmt_path)  # mark as recently used for eviction
+                except OSError:
+                    pass
+            else:
+                usable = _build_format(header, fmt_path) and _format_works(fmt_path)
+                if usable:
+                    _evict_formats(fmt_dir, keep=fmt_path)
+            result = fmt_path if usable else None
+        with _FORMATS_LOCK:
+            _FORMATS[key] = result
+        return result
+
+
+def _known_format(key: str) -> tuple[bool, Optional[Path]]:
+    """
+    Return (True, entry) for a remembered _FORMATS entry, or (False, None)
+    if there is none or its file has gone (e.g. evicted by another process).
+    """
+    with _FORMATS_LOCK:
+        known = _FORMATS.get(key, False)
+        if known is False:
+            return False, None
+        if known is None or known.exists():
+            return True, known
+        del _FORMATS[key]
+        return False, None
+
+
+def _evict_formats(fmt_dir: Path, *, keep: Path) -> None:
+    """
+    Delete the least recently used formats beyond _FORMATS_KEEP, never `keep`.
+    """
+    try:
+        by_age = sorted(
+            fmt_dir.glob("*.fmt"), key=lambda p: p.stat().st_mtime_ns, reverse=True
+        )
+    except OSError:
+        return
+    for old_fmt in by_age[_FORMATS_KEEP:]:
+        if old_fmt != keep:
+            try:
+                old_fmt.unlink(missing_ok=True)
+            except OSError:
+                pass
+
+
+def _build_format(header: str, fmt_path: Path) -> bool:
+    jobname = _next_jobname()
+    tex_path = _write_tex(jobname, header + _BEGIN_DOCUMENT)
+    try:
+        result = subprocess.run(
+            [
+                "pdftex",
+                "-ini",
+                "-interaction=nonstopmode",
+                "-halt-on-error",
+                f"-jobname={jobname}",
+                "&latex",
+                "mylatexformat.ltx",
+                tex_path.name,
+            ],
+            cwd=_SCRATCH_DIR,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        built = _SCRATCH_DIR / f"{jobname}.fmt"
+        if result.returncode != 0 or not built.exists():
+            return False
+        # Move into the cache under a temporary name, then rename atomically
+        # so concurrent processes never load a half-written format.
+        partial = fmt_path.with_name(f"{fmt_path.name}.{os.getpid()}.tmp")
+        shutil.move(str(built), str(partial))
+        os.replace(partial, fmt_path)
+        return True
+    except OSError:
+        return False
+    finally:
+        _remove_job_files(jobname)
+
+
+def _format_works(fmt_path: Path) -> bool:
+    jobname = _next_jobname()
+    tex_path = _write_tex(jobname, _BEGIN_DOCUMENT + _tex_body(["x"]))
+    try:
+        result = subprocess.run(
+            _latex_argv(fmt_path) + [tex_path.name],
+            cwd=_SCRATCH_DIR,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        return result.returncode == 0 and (_SCRATCH_DIR / f"{jobname}.dvi").exists()
+    except OSError:
+        return False
+    finally:
+        _remove_job_files(jobname)
+
+
+def _latex_argv(fmt_path: Optional[Path], *, interaction: str = "nonstopmode") -> list[str]:
+    argv = ["latex", f"-interaction={interaction}", "-halt-on-error"]
+    if fmt_path is not None:
+        argv.append(f"-fmt={fmt_path.with_suffix('')}")
+    return argv
+
+
+def _document_start(macros: str) -> tuple[Optional[Path], str]:
+    """
+    Return (format, text to send before the body) for this preamble.
+    """
+    fmt_path = _ensure_preamble_format(macros)
+    if fmt_path is not None:
+        return fmt_path, _BEGIN_DOCUMENT
+    return None, _tex_preamble(macros)
+
+
+# Keep a pre-started `latex` per process (see _LatexDaemon). Off by default:
+# each worker then holds a resident TeX process. Enable with
+# ORG_MATH_WARM_LATEX=1.
+WARM_LATEX = os.environ.get("ORG_MATH_WARM_LATEX", "").strip().lower() in ("1", "true", "yes", "on")
+
+
+class _LatexDaemon:
+    """
+    Keep one `latex` process warm for the next fragment.
+
+    A DVI file is only complete once TeX reaches \\end{document}, so a single
+    process cannot serve several fragments. Instead, after each render we
+    start the *next* process and feed it the preamble through stdin: the
+    format file (ideally the precompiled preamble format, see
+    _ensure_preamble_format), the document class and the macros are loaded
+    while the process waits. A render then only writes the fragment and
+    \\end{document} and waits for the DVI.
+
+    The spare is tied to the macro preamble it was started with; a request
+    with different macros discards it. Processes are started outside the
+    lock, since the first use of a preamble may build its format.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._proc: Optional[subprocess.Popen] = None
+        self._macros: Optional[str] = None
+        self._jobname: str = ""
+        self._disabled = False
+        self._closed = False
+
+    def _start(self, macros: str) -> tuple[Optional[subprocess.Popen], str]:
+        """
+        Start a latex process and send it the preamble. Call without the lock.
+        """
+        jobname = _next_jobname()
+        fmt_path, start = _document_start(macros)
+        try:
+            proc = subprocess.Popen(
+                _latex_argv(fmt_path, interaction="scrollmode") + [f"-jobname={jobname}"],
+                cwd=_SCRATCH_DIR,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                text=True,
+                encoding="utf-8",
+            )
+        except OSError:
+            # latex missing or not startable: use one-shot rendering only.
+            with self._lock:
+                self._disabled = True
+            return None, ""
+        try:
+            stdin: IO[str] = proc.stdin  # type: ignore[assignment]
+            stdin.write(start)
+            stdin.flush()
+        except OSError:
+            # TeX already exited; render_dvi reports its exit status.
+            pass
+        return proc, jobname
+
+    @staticmethod
+    def _kill(proc: subprocess.Popen, jobname: str) -> None:
+        proc.kill()
+        proc.wait()
+        try:
+            proc.stdin.close()  # type: ignore[union-attr]
+        except OSError:
+            pass
+        _remove_job_files(jobname)
+
+    def _take_spare(self, macros: str) -> tuple[Optional[subprocess.Popen], str]:
+        """
+        Remove and return the spare if it was started for `macros` and is
+        still running; any other spare is discarded.
+        """
+        with self._lock:
+            proc, spare_macros, jobname = self._proc, self._macros, self._jobname
+            self._proc = None
+            self._macros = None
+        if proc is None:
+            return None, ""
+        if spare_macros != macros or proc.poll() is not None:
+            self._kill(proc, jobname)
+            return None, ""
+        return proc, jobname
+
+    def _prepare_spare(self, macros: str) -> None:
+        proc, jobname = self._start(macros)
+        if proc is None:
+            return
+        with self._lock:
+            if self._proc is None and not self._closed:
+                self._proc, self._macros, self._jobname = proc, macros, jobname
+                return
+        # A concurrent render already left a spare (or we are shutting down).
+        self._kill(proc, jobname)
+
+    def render_dvi(self, body: str, macros: str) -> Optional[Path]:
+        """
+        Compile a document body (see _tex_body) with the warm process.
+
+        Returns the DVI path on success; the caller removes the job files.
+        Returns None if latex cannot be started (caller falls back to a
+        one-shot run). Raises CalledProcessError if LaTeX rejects the input.
+        """
+        if self._disabled:
+            return None
+        proc, jobname = self._take_spare(macros)
+        if proc is None:
+            proc, jobname = self._start(macros)
+            if proc is None:
+                return None
+
+        try:
+            stdin: IO[str] = proc.stdin  # type: ignore[assignment]
+            stdin.write(body)
+            stdin.close()
+        except OSError:
+            # TeX already exited (e.g. broken macros); report like a failed run.
+            pass
+
+        returncode = proc.wait()
+        if returncode != 0:
+            _remove_job_files(jobname)
+            raise subprocess.CalledProcessError(returncode, proc.args)
+
+        # Prepare the spare for the next request, now that this one is done.
+        self._prepare_spare(macros)
+        return _SCRATCH_DIR / f"{jobname}.dvi"
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._closed = True
+            proc, jobname = self._proc, self._jobname
+            self._proc = None
+            self._macros = None
+        if proc is not None:
+            self._kill(proc, jobname)
+
+
+_DAEMON = _LatexDaemon()
+atexit.register(_DAEMON.shutdown)
+
+# Recently rendered fragments: sha256(macros + NUL + math) -> SVG path.
+_RENDERED_MAX = 512
+_RENDERED: OrderedDict[str, Path] = OrderedDict()
+_RENDERED_LOCK = threading.Lock()
+
+
+def _fragment_digest(math_src: str, macros: str) -> str:
+    return hashlib.sha256((macros + "\0" + math_src).encode("utf-8")).hexdigest()
+
+
+def _lookup_rendered(digest: str, out_path: Path) -> bool:
+    """
+    Satisfy a render from an earlier identical one, if we have it.
+
+    Same target path: nothing to do as long as the file is still there
+    (callers such as webapp.py only render when the SVG is missing).
+    Different target: copy the SVG.
+    """
+    with _RENDERED_LOCK:
+        cached = _RENDERED.get(digest)
+        if cached is None:
+            return False
+        _RENDERED.move_to_end(digest)
+
+    if cached == out_path:
+        return out_path.exists()
+    try:
+        shutil.copyfile(cached, out_path)
+    except OSError:
+        return False
+    return True
+
+
+def _remember_rendered(digest: str, out_path: Path) -> None:
+    with _RENDERED_LOCK:
+        _RENDERED[digest] = out_path
+        _RENDERED.move_to_end(digest)
+        while len(_RENDERED) > _RENDERED_MAX:
+            _RENDERED.popitem(last=False)
 
 
 def render_math_to_svg(
@@ -19,51 +473,186 @@ def render_math_to_svg(
     - out_path: final SVG path, e.g. BASE_DIR / ".math-cache" / "<digest>.svg"
     - preamble_macros: LaTeX macro definitions to inject before \\begin{document}
 
-    Requires `latex` and `dvisvgm` in PATH.
+    Thin wrapper around render_math_batch() for a single fragment.
     """
-    out_path = out_path.resolve()
-    out_path.parent.mkdir(parents=True, exist_ok=True)
+    render_math_batch([(math_src, out_path)], preamble_macros=preamble_macros)
+
 
+def render_math_batch(
+    fragments: list[tuple[str, Path]],
+    *,
+    preamble_macros: str = "",
+) -> None:
+    """
+    Render several inline math fragments with one LaTeX and one dvisvgm run.
+
+    - fragments: (math_src, out_path) pairs
+    - preamble_macros: shared LaTeX macro definitions
+
+    Requires `latex` and `dvisvgm` in PATH. With WARM_LATEX, uses a
+    pre-started LaTeX process when possible (see _LatexDaemon); otherwise,
+    and as a fallback, a one-shot run.
+
+    Identical (math, macros) pairs rendered earlier in this process are not
+    run through LaTeX again; the previous SVG is reused. Larger batches are
+    split across CPU cores and rendered concurrently.
+    """
     macros = (preamble_macros or "").strip()
+    pending = _pending_fragments(fragments, macros)
+    if not pending:
+        return
 
-    # 1) Write a minimal standalone LaTeX document to a *temporary* .tex
-    with tempfile.NamedTemporaryFile("w", suffix=".tex", delete=False) as f:
-        tex_path = Path(f.name)
-        f.write(r"\documentclass{standalone}" "\n")
+    chunks = _split_chunks(pending)
 
-        # Inject macro definitions into the preamble (recommended place).
-        if macros:
-            f.write("% --- org-viewer macros (cached from #+LATEX:) ---\n")
-            f.write(macros)
-            f.write("\n% --- end macros ---\n")
+    def run_chunk(chunk: list[tuple[str, Path, str]]) -> None:
+        _render_uncached([(src, out) for src, out, _ in chunk], macros)
+        for _, out_path, digest in chunk:
+            _remember_rendered(digest, out_path)
 
-        f.write(r"\begin{document}" "\n")
-        f.write("$")
-        f.write(math_src)
-        f.write("$\n")
-        f.write(r"\end{document}" "\n")
+    if len(chunks) == 1:
+        run_chunk(chunks[0])
+        return
 
-    workdir = tex_path.parent
+    with ThreadPoolExecutor(max_workers=len(chunks)) as pool:
+        futures = [pool.submit(run_chunk, chunk) for chunk in chunks]
+    # Re-raise the first failure only after every chunk has finished.
+    for future in futures:
+        future.result()
 
-    # 2) latex -> dvi
-    subprocess.run(
-        ["latex", "-interaction=nonstopmode", "-halt-on-error", tex_path.name],
-        cwd=workdir,
-        check=True,
-    )
 
-    dvi_path = tex_path.with_suffix(".dvi")
+def _pending_fragments(
+    fragments: list[tuple[str, Path]], macros: str
+) -> list[tuple[str, Path, str]]:
+    """
+    Prepare targets and drop fragments served from _RENDERED.
+
+    Returns (math_src, out_path, digest) for everything still to render.
+    """
+    pending: list[tuple[str, Path, str]] = []
+    # Checked on every call (the cache may be wiped while the process
+    # runs), but only once per directory within the batch.
+    made_dirs: set[Path] = set()
+    for math_src, out_path in fragments:
+        # absolute() is enough for the _RENDERED bookkeeping and, unlike
+        # resolve(), does not walk the path for symlinks.
+        if not out_path.is_absolute():
+            out_path = out_path.absolute()
+        parent = out_path.parent
+        if parent not in made_dirs:
+            parent.mkdir(parents=True, exist_ok=True)
+            made_dirs.add(parent)
+
+        digest = _fragment_digest(math_src, macros)
+        if not _lookup_rendered(digest, out_path):
+            pending.append((math_src, out_path, digest))
+    return pending
+
+
+def _split_chunks(
+    pending: list[tuple[str, Path, str]],
+) -> list[list[tuple[str, Path, str]]]:
+    """
+    Split the work into one chunk per core; each chunk is its own
+    LaTeX + dvisvgm pipeline, so chunks run concurrently.
+    """
+    workers = max(1, min(os.cpu_count() or 1, len(pending)))
+    size = -(-len(pending) // workers)
+    return [pending[i : i + size] for i in range(0, len(pending), size)]
+
+
+def _render_uncached(fragments: list[tuple[str, Path]], macros: str) -> None:
+    """
+    Run LaTeX + dvisvgm once for all fragments.
+    """
+    body = _tex_body([src for src, _ in fragments])
+    out_paths = [out for _, out in fragments]
+
+    dvi_path = _DAEMON.render_dvi(body, macros) if WARM_LATEX else None
+    if dvi_path is None:
+        dvi_path = _run_latex_once(body, macros)
+
+    try:
+        _dvi_to_svgs(dvi_path, out_paths)
+    finally:
+        _remove_job_files(dvi_path.stem)
 
-    # 3) dvi -> svg, written *directly* to out_path
+
+def _run_latex_once(body: str, macros: str) -> Path:
+    """
+    Compile preamble + body with a fresh `latex` process; return the DVI path.
+    """
+    fmt_path, start = _document_start(macros)
+    jobname = _next_jobname()
+    tex_path = _write_tex(jobname, start + body)
+
+    try:
+        subprocess.run(
+            _latex_argv(fmt_path) + [tex_path.name],
+            cwd=_SCRATCH_DIR,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,  # LaTeX is chatty; details are in the .log
+            stderr=subprocess.PIPE,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        _remove_job_files(jobname)
+        raise
+
+    return tex_path.with_suffix(".dvi")
+
+
+def _dvi_to_svgs(dvi_path: Path, out_paths: list[Path]) -> None:
+    """
+    Convert page N of a DVI file to out_paths[N-1].
+
+    dvisvgm writes all pages next to the DVI (<stem>-<page>.svg); the pages
+    are then moved to their targets.
+    """
     subprocess.run(
-        [
-            "dvisvgm",
-            "-n",
-            "-a",
-            "-o",
-            str(out_path),
-            str(dvi_path),
-        ],
+        _dvisvgm_argv(dvi_path),
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
         check=True,
     )
-    
+    _collect_pages(dvi_path, out_paths)
+
+
+def _dvisvgm_argv(dvi_path: Path) -> list[str]:
+    stem = dvi_path.with_suffix("")
+    argv = [
+        "dvisvgm",
+        # Glyphs stay paths (-n): the SVGs are shown via <img>, where
+        # embedded web fonts are not reliably honoured.
+        "-n",
+        "-a",
+    ]
+    font_cache = _user_cache_dir("dvisvgm")
+    if font_cache is not None:
+        argv.append(f"--cache={font_cache}")
+    return argv + [
+        "-p",
+        "1-",
+        "-o",
+        f"{stem}-%p.svg",
+        str(dvi_path),
+    ]
+
+
+def _collect_pages(dvi_path: Path, out_paths: list[Path]) -> None:
+    """
+    Move the page SVGs dvisvgm wrote for `dvi_path` to their targets.
+    """
+    stem = dvi_path.with_suffix("")
+    # %p may be zero-padded depending on the page count; match by number.
+    pages: dict[int, Path] = {}
+    for page_path in dvi_path.parent.glob(f"{stem.name}-*.svg"):
+        number = page_path.stem.rsplit("-", 1)[1]
+        if number.isdigit():
+            pages[int(number)] = page_path
+
+    for page_no, out_path in enumerate(out_paths, start=1):
+        page_path = pages.get(page_no)
+        if page_path is None:
+            raise FileNotFoundError(f"dvisvgm produced no page {page_no} for {dvi_path}")
+        shutil.move(str(page_path), str(out_path))
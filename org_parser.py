@@ -2,13 +2,15 @@
 from __future__ import annotations
 
 from dataclasses import dataclass, field
-from typing import Optional, Any
+from typing import Any, Callable, Iterable, NamedTuple, Optional
+import functools
+import re
+import sys
 
 from config_loader import OrgReaderConfig
 
 
-@dataclass
-class OrgEvent:
+class OrgEvent(NamedTuple):
     """
     A structured event emitted by the Org parser.
 
@@ -36,7 +38,7 @@ class OrgEvent:
     type: str
     data: dict[str, Any]
 
-@dataclass
+@dataclass(slots=True)
 class OrgPreamble:
     """
     Parsed ORG preamble (document header keywords).
@@ -63,7 +65,7 @@ class OrgPreamble:
         return self.headers.get("options")
 
 
-@dataclass
+@dataclass(slots=True)
 class OrgState:
     """
     Mutable parser state for a streaming Org reader.
@@ -90,6 +92,8 @@ class OrgState:
 
     # True if we are inside *any* verbatim block (as per cfg.verbatim_blocks)
     is_inside_verbatim_block: bool = False
+    # Number of True entries in block_verbatim_stack
+    verbatim_depth: int = 0
 
     # SRC options stack (so src can be nested inside non-verbatim containers)
     src_options_stack: list[Optional[dict[str, str]]] = field(default_factory=list)
@@ -120,9 +124,9 @@ class OrgState:
     latex_macro_lines: list[str] = field(default_factory=list)
     latex_macro_set: set[str] = field(default_factory=set)
 
-def calculate_heading_level(asterisks: str) -> int:
-    """Convert the heading marker string (e.g. '***') into a numeric level."""
-    return len(asterisks)
+# ":tag1:tag2:" with optional surrounding whitespace; group 1 is the part
+# between the outer colons.
+_HEADING_TAGS_RE = re.compile(r"\s*:(.*):\s*", re.DOTALL)
 
 
 def extract_heading_tags(trailing: str) -> Optional[list[str]]:
@@ -131,16 +135,21 @@ def extract_heading_tags(trailing: str) -> Optional[list[str]]:
 
     Example: ' :foo:bar:' -> ['foo', 'bar']
     """
-    if ":" not in trailing:
+    match = _HEADING_TAGS_RE.fullmatch(trailing)
+    if match is None:
         return None
 
-    stripped = trailing.strip()
-    if not (stripped.startswith(":") and stripped.endswith(":")):
-        return None
-
-    tags = [t for t in stripped.split(":") if t]
+    tags = [t for t in match.group(1).split(":") if t]
     return tags or None
 
+# A ':key' token (start of string or after whitespace) followed by the
+# tokens up to the next ':key'. Tokens are whitespace-separated, as with
+# str.split().
+_ATTR_ARG_RE = re.compile(r"(?<!\S):(\S*)((?:\s+[^:\s]\S*)*)")
+# A ':key' token with at most one value token.
+_SRC_ARG_RE = re.compile(r"(?<!\S):(\S*)(?:\s+([^:\s]\S*))?")
+
+
 def parse_html_attr_args(arg_string: str) -> dict[str, str]:
     """
     Parse an Org #+ATTR_HTML: argument string into a dict.
@@ -150,26 +159,12 @@ def parse_html_attr_args(arg_string: str) -> dict[str, str]:
     ->  {'width': '50%', 'class': 'big img-rounded'}
 
     Very permissive: values may contain spaces until the next ':key'.
+    Stray tokens before the first key are ignored.
     """
-    tokens = arg_string.strip().split()
-    if not tokens:
-        return {}
-
     attrs: dict[str, str] = {}
-    i = 0
-    while i < len(tokens):
-        token = tokens[i]
-        if token.startswith(":"):
-            key = token[1:]
-            i += 1
-            values: list[str] = []
-            while i < len(tokens) and not tokens[i].startswith(":"):
-                values.append(tokens[i])
-                i += 1
-            attrs[key] = " ".join(values) if values else "true"
-        else:
-            # stray token: ignore
-            i += 1
+    for m in _ATTR_ARG_RE.finditer(arg_string):
+        values = m.group(2).split()
+        attrs[m.group(1)] = " ".join(values) if values else "true"
     return attrs
 
 def parse_src_block_options(arg_string: str) -> dict[str, str]:
@@ -180,36 +175,27 @@ def parse_src_block_options(arg_string: str) -> dict[str, str]:
         'python :results output :session foo :tangle out.py'
     ->  {'language': 'python', 'results': 'output', 'session': 'foo', 'tangle': 'out.py'}
     """
-    tokens = arg_string.strip().split()
-    if not tokens:
-        return {}
-
     options: dict[str, str] = {}
-    idx = 0
 
     # First token is language unless it starts with ':'
-    if not tokens[0].startswith(":"):
-        options["language"] = tokens[0]
-        idx = 1
-
-    # Parse pairs: :key value  (or :flag)
-    while idx < len(tokens):
-        token = tokens[idx]
-        if not token.startswith(":"):
-            idx += 1
-            continue
+    first = arg_string.split(None, 1)
+    if first and not first[0].startswith(":"):
+        options["language"] = first[0]
 
-        key = token[1:]
-        idx += 1
+    # Pairs: :key value  (or :flag); extra tokens are ignored
+    for m in _SRC_ARG_RE.finditer(arg_string):
+        options[m.group(1)] = m.group(2) or "true"
 
-        if idx >= len(tokens) or tokens[idx].startswith(":"):
-            options[key] = "true"
-            continue
+    return options
 
-        options[key] = tokens[idx]
-        idx += 1
 
-    return options
+def _may_match_line_pattern(stripped: str, cfg: OrgReaderConfig) -> bool:
+    """
+    Cheap pre-check on the left-stripped line: False means none of the
+    line patterns (cfg.classify, header_kv_re, ...) can match it.
+    """
+    start_chars = cfg.line_start_chars
+    return start_chars is None or stripped[:1] in start_chars
 
 
 def _handle_preamble_if_applicable(
@@ -233,11 +219,11 @@ def _handle_preamble_if_applicable(
         return None
 
     # If this looks like a #+KEY: directive, capture it
-    match = cfg.header_kv_re.match(line)
+    match = cfg.header_kv_re.match(line) if _may_match_line_pattern(stripped, cfg) else None
     if match:
-        key = match.group(1).strip().lower()
-        # Everything after the first ":" is treated as the value
-        value = line.split(":", 1)[1].strip() if ":" in line else ""
+        key = sys.intern(match.group(1).strip().lower())
+        # Everything after the "#+KEY:" colon is treated as the value
+        value = line[match.end():].strip()
         state.preamble.headers[key] = value
         return OrgEvent(type="preamble_kv", data={"key": key, "value": value})
 
@@ -259,7 +245,8 @@ def _handle_section_heading_if_present(
     if state.is_in_preamble:
         state.is_in_preamble = False
 
-    heading_level = calculate_heading_level(match.group(1))
+    # Level = number of leading asterisks
+    heading_level = len(match.group(1))
     trailing = match.group(3)
     heading_tags = extract_heading_tags(trailing)
 
@@ -278,41 +265,35 @@ def _handle_section_heading_if_present(
         },
     )
 
-def _handle_latex_macro_keyword_if_present(
-    line: str,
+def _handle_latex_macro_keyword(
+    value: str,
     cfg: OrgReaderConfig,
     state: OrgState,
-) -> Optional[OrgEvent]:
+) -> OrgEvent:
     """
-    Detect "#+LATEX:" lines that contain macro definitions and cache them.
+    Handle a "#+LATEX:" line (`value` is the text after the colon) and cache
+    it if it contains a macro definition.
 
     We only cache lines that contain one of:
       \\def, \\newcommand, \\renewcommand, \\providecommand,
       \\newenvironment, \\renewenvironment
     """
-    match = cfg.header_kv_re.match(line)
-    if not match:
-        return None
-
-    key = match.group(1).strip().lower()
-    if key != "latex":
-        return None
-
-    value = line.split(":", 1)[1].strip() if ":" in line else ""
     if not value:
         return OrgEvent(type="latex_macro", data={"raw": "", "added": False, "ignored": True})
 
+    # Already cached: it passed the macro check when it was added, so skip
+    # the regex search for repeated definitions.
+    if value in state.latex_macro_set:
+        return OrgEvent(type="latex_macro", data={"raw": value, "added": False, "ignored": False})
+
     # Only cache macro-definition lines
     if not cfg.latex_macro_re.search(value):
         return OrgEvent(type="latex_macro", data={"raw": value, "added": False, "ignored": True})
 
     # Deduplicate (keep stable order)
-    if value not in state.latex_macro_set:
-        state.latex_macro_set.add(value)
-        state.latex_macro_lines.append(value)
-        return OrgEvent(type="latex_macro", data={"raw": value, "added": True, "ignored": False})
-
-    return OrgEvent(type="latex_macro", data={"raw": value, "added": False, "ignored": False})
+    state.latex_macro_set.add(value)
+    state.latex_macro_lines.append(value)
+    return OrgEvent(type="latex_macro", data={"raw": value, "added": True, "ignored": False})
 
 def _handle_block_marker_if_present(
     line: str,
@@ -329,8 +310,10 @@ def _handle_block_marker_if_present(
     if not match:
         return None
 
-    side = match.group(1).lower()  # "begin" | "end"
-    block_name = match.group(2).lower()
+    # Interned: block names end up in the block stacks and event data and
+    # are compared against literals ("src", verbatim names) repeatedly.
+    side = sys.intern(match.group(1).lower())  # "begin" | "end"
+    block_name = sys.intern(match.group(2).lower())
 
     remainder = ""
     if match.lastindex and match.lastindex >= 3:
@@ -342,7 +325,9 @@ def _handle_block_marker_if_present(
     if side == "begin":
         state.block_stack.append(block_name)
         state.block_verbatim_stack.append(is_verbatim)
-        state.is_inside_verbatim_block = any(state.block_verbatim_stack)
+        if is_verbatim:
+            state.verbatim_depth += 1
+        state.is_inside_verbatim_block = state.verbatim_depth > 0
 
         state.is_inside_block = True
         state.current_block_name = state.block_stack[-1]
@@ -396,7 +381,9 @@ def _handle_block_marker_if_present(
     popped_verbatim = state.block_verbatim_stack.pop()
     popped_src_opts = state.src_options_stack.pop() if state.src_options_stack else None
 
-    state.is_inside_verbatim_block = any(state.block_verbatim_stack)
+    if popped_verbatim:
+        state.verbatim_depth -= 1
+    state.is_inside_verbatim_block = state.verbatim_depth > 0
 
     state.is_inside_block = bool(state.block_stack)
     state.current_block_name = state.block_stack[-1] if state.block_stack else None
@@ -447,7 +434,8 @@ def _handle_drawer_if_present(
         if cfg.drawer_end_re.match(line):
             data: dict[str, Any] = {}
             data["name"] = state.current_drawer_name or ""
-            data["lines"] = list(state.current_drawer_lines or [])
+            # Hand the collected list over; state drops it below.
+            data["lines"] = state.current_drawer_lines or []
 
             event = OrgEvent(type="drawer", data=data)
 
@@ -457,9 +445,7 @@ def _handle_drawer_if_present(
             state.current_drawer_lines = None
             return event
 
-        # Content line inside drawer
-        if state.current_drawer_lines is None:
-            state.current_drawer_lines = []
+        # Content line inside drawer (list is created when the drawer opens)
         state.current_drawer_lines.append(line)
         return None
 
@@ -475,37 +461,6 @@ def _handle_drawer_if_present(
     # No event yet; will be emitted on :END:
     return None
 
-
-    # side == "end"
-    if not state.is_inside_block:
-        return OrgEvent(type="block_end", data={"name": block_name, "orphan_ignored": True})
-
-    if state.current_block_name != block_name:
-        return OrgEvent(
-            type="block_end",
-            data={"name": block_name, "mismatch_ignored": True, "expected": state.current_block_name},
-        )
-
-    state.is_inside_block = False
-    state.current_block_name = None
-    state.last_block_event = "end"
-
-    if block_name == "src":
-        src_payload = state.src_block_options
-        state.src_block_options = None
-        return OrgEvent(
-            type="src_end",
-            data={
-                "name": "src",
-                "src": src_payload,
-                "heading_level": state.current_heading_level,
-                "heading_tags": state.current_heading_tags,
-            },
-        )
-
-    state.src_block_options = None
-    return OrgEvent(type="block_end", data={"name": block_name})
-
 def _handle_table_if_present(
     line: str,
     cfg: OrgReaderConfig,
@@ -526,29 +481,22 @@ def _handle_table_if_present(
       - "table_hline" for horizontal separator lines
       - "table_row"   for data rows, with cells as a list of strings
     """
-    stripped = line.lstrip()
-    if not stripped.startswith("|"):
+    core = line.strip()
+    if not core.startswith("|"):
         return None
 
-    core = stripped.strip()
-
     # Identify horizontal rule lines like |-----+----|
     inner = core.strip("|").strip()
-    if inner and all(ch in "-+ " for ch in inner):
+    # strip() removes only '-', '+' and ' ', so nothing may be left over
+    if inner and not inner.strip("-+ "):
         return OrgEvent(
             type="table_hline",
             data={"raw": line},
         )
 
-    # Data row: split into cells
-    row_inner = core
-    if row_inner.startswith("|"):
-        row_inner = row_inner[1:]
-    if row_inner.endswith("|"):
-        row_inner = row_inner[:-1]
-
-    raw_cells = row_inner.split("|")
-    cells = [c.strip() for c in raw_cells]
+    # Data row: drop the outer pipes, split into cells
+    row_inner = core[1:-1] if len(core) > 1 and core.endswith("|") else core[1:]
+    cells = [c.strip() for c in row_inner.split("|")]
 
     return OrgEvent(
         type="table_row",
@@ -558,29 +506,24 @@ def _handle_table_if_present(
         },
     )
 
-def _handle_tblfm_keyword_if_present(
-    line: str,
+# "::" between TBLFM formulas, with the surrounding whitespace
+_TBLFM_SEP_RE = re.compile(r"\s*::\s*")
+
+
+def _handle_tblfm_keyword(
+    value: str,
     cfg: OrgReaderConfig,
     state: OrgState,
-) -> Optional[OrgEvent]:
+) -> OrgEvent:
     """
-    Detect a TBLFM keyword line directly below an Org table:
+    Handle a TBLFM keyword line directly below an Org table:
 
       #+TBLFM: $4=$1+$2:: $5=$3*2
 
     We emit:
       OrgEvent(type="tblfm", data={"raw": "<full rhs>", "formulas": ["...", "..."]})
     """
-    match = cfg.header_kv_re.match(line)
-    if not match:
-        return None
-
-    key = match.group(1).strip().lower()
-    if key != "tblfm":
-        return None
-
-    value = line.split(":", 1)[1].strip() if ":" in line else ""
-    parts = [p.strip() for p in value.split("::") if p.strip()]
+    parts = [p for p in _TBLFM_SEP_RE.split(value.strip()) if p]
     return OrgEvent(
         type="tblfm",
         data={"raw": value, "formulas": parts},
@@ -615,7 +558,7 @@ def _handle_comment_if_present(
                 type="comment_block",
                 data={
                     "anchor": state.current_comment_anchor,
-                    "lines": list(state.current_comment_lines or []),
+                    "lines": state.current_comment_lines or [],
                 },
             )
             state.is_inside_comment = False
@@ -623,8 +566,7 @@ def _handle_comment_if_present(
             state.current_comment_lines = None
             return event
 
-        if state.current_comment_lines is None:
-            state.current_comment_lines = []
+        # list is created when the comment block opens
         state.current_comment_lines.append(line)
         return None
 
@@ -722,28 +664,19 @@ def _handle_ordered_list_if_present(
         },
     )
 
-def _handle_name_keyword_if_present(
-    line: str,
+def _handle_name_keyword(
+    value: str,
     cfg: OrgReaderConfig,
     state: OrgState,
-) -> Optional[OrgEvent]:
+) -> OrgEvent:
     """
-    Detect and store anchors from lines like:
+    Store anchors from lines like:
 
       #+NAME: fig:my-figure
 
     The name is stored in state.pending_anchor and emitted as a 'name' event.
     The actual attachment to heading/block/image happens later.
     """
-    match = cfg.header_kv_re.match(line)
-    if not match:
-        return None
-
-    key = match.group(1).strip().lower()
-    if key != "name":
-        return None
-
-    value = line.split(":", 1)[1].strip() if ":" in line else ""
     if value:
         state.pending_anchor = value
     else:
@@ -751,28 +684,19 @@ def _handle_name_keyword_if_present(
 
     return OrgEvent(type="name", data={"name": value})
 
-def _handle_caption_keyword_if_present(
-    line: str,
+def _handle_caption_keyword(
+    value: str,
     cfg: OrgReaderConfig,
     state: OrgState,
-) -> Optional[OrgEvent]:
+) -> OrgEvent:
     """
-    Detect and store captions from lines like:
+    Store captions from lines like:
 
       #+CAPTION: This is *bold* and [[https://example.com][linked]]
 
     Caption text is parsed as inline Org markup and stored in
     state.pending_caption_tokens for the next image (or other consumer).
     """
-    match = cfg.header_kv_re.match(line)
-    if not match:
-        return None
-
-    key = match.group(1).strip().lower()
-    if key != "caption":
-        return None
-
-    value = line.split(":", 1)[1].strip() if ":" in line else ""
     tokens = tokenize_inline_org_markup(value) if value else []
 
     state.pending_caption_tokens = tokens or None
@@ -785,28 +709,19 @@ def _handle_caption_keyword_if_present(
         },
     )
 
-def _handle_attr_html_keyword_if_present(
-    line: str,
+def _handle_attr_html_keyword(
+    value: str,
     cfg: OrgReaderConfig,
     state: OrgState,
-) -> Optional[OrgEvent]:
+) -> OrgEvent:
     """
-    Detect and store HTML attributes from lines like:
+    Store HTML attributes from lines like:
 
       #+ATTR_HTML: :width 50% :class big
 
     Attributes are parsed into a dict and stored in state.pending_html_attr
     to be applied to the next suitable element (e.g. an image).
     """
-    match = cfg.header_kv_re.match(line)
-    if not match:
-        return None
-
-    key = match.group(1).strip().lower()
-    if key != "attr_html":
-        return None
-
-    value = line.split(":", 1)[1].strip() if ":" in line else ""
     attrs = parse_html_attr_args(value) if value else {}
 
     state.pending_html_attr = attrs or None
@@ -820,6 +735,19 @@ def _handle_attr_html_keyword_if_present(
     )
 
 
+# Emphasis / code delimiter -> token type.
+_DELIMITER_TO_TYPE: dict[str, str] = {
+    "*": "bold_text",
+    "/": "italic_text",
+    "=": "code",
+    "~": "code",
+}
+
+# Characters that can start inline markup; everything else is plaintext.
+_INLINE_SPECIAL_CHARS = frozenset("\\$[*/=~")
+_INLINE_SPECIAL_RE = re.compile(r"[\\$\[*/=~]")
+
+
 def tokenize_inline_org_markup(text: str) -> list[tuple[str, str]]:
     """
     Tokenize a line into (type, text) spans.
@@ -836,21 +764,32 @@ def tokenize_inline_org_markup(text: str) -> list[tuple[str, str]]:
     Notes:
     - Non-nested: we do not parse markup inside markup.
     - Very permissive: intended as a simple teaching/utility tokenizer.
+    - Results are memoized per text (table cells, captions and the like
+      repeat a lot); each call returns a fresh list.
     """
-    delimiter_to_type: dict[str, str] = {
-        "*": "bold_text",
-        "/": "italic_text",
-        "=": "code",
-        "~": "code",
-    }
+    return list(tokenize_inline_org_markup_cached(text))
+
+
+@functools.lru_cache(maxsize=8192)
+def tokenize_inline_org_markup_cached(text: str) -> tuple[tuple[str, str], ...]:
+    """
+    Like tokenize_inline_org_markup(), but return the shared memoized tuple.
+
+    For read-only callers (renderers): skips the per-call list copy.
+    """
+    return tuple(_tokenize_inline(text))
+
 
+def _tokenize_inline(text: str) -> list[tuple[str, str]]:
     tokens: list[tuple[str, str]] = []
-    buffer: list[str] = []
+    append = tokens.append
+    # Plaintext is never copied piecewise: text[plain_start:i] is the
+    # pending run, sliced once when a markup token (or the end) is reached.
+    plain_start = 0
 
-    def flush_plaintext() -> None:
-        if buffer:
-            tokens.append(("plaintext", "".join(buffer)))
-            buffer.clear()
+    def flush_plaintext(stop: int) -> None:
+        if plain_start < stop:
+            append(("plaintext", text[plain_start:stop]))
 
     def is_valid_emphasis_open(pos: int, delim: str) -> bool:
         # Avoid treating leading heading stars "* " as emphasis
@@ -882,14 +821,20 @@ def tokenize_inline_org_markup(text: str) -> list[tuple[str, str]]:
 
     i = 0
     while i < len(text):
+        # --- ordinary characters: copy the whole run at once -------------
+        if text[i] not in _INLINE_SPECIAL_CHARS:
+            special = _INLINE_SPECIAL_RE.search(text, i)
+            i = special.start() if special else len(text)
+            continue
+
         # --- inline math \( ... \) -----------------------------
         if text.startswith(r"\(", i):
             end = text.find(r"\)", i + 2)
             if end != -1:
                 inner = text[i + 2 : end]   # without delimiters
-                flush_plaintext()
-                tokens.append(("math_inline", inner))
-                i = end + 2
+                flush_plaintext(i)
+                append(("math_inline", inner))
+                i = plain_start = end + 2
                 continue
 
         ch = text[i]
@@ -899,31 +844,23 @@ def tokenize_inline_org_markup(text: str) -> list[tuple[str, str]]:
             end = text.find("$$", i + 2)
             if end != -1:
                 # keep the whole $$...$$ sequence as plain text
-                buffer.append(text[i : end + 2])
                 i = end + 2
                 continue
             # no closing $$ found -> fall through to single-$ handling
 
         # --- inline math $ ... $ -------------------------------------------
         if ch == "$":
-            j = i + 1
-            closing = -1
-            while j < len(text):
-                if text[j] == "$":
-                    closing = j
-                    break
-                j += 1
+            closing = text.find("$", i + 1)
 
             if closing != -1:
                 inner = text[i + 1 : closing]
                 if inner.strip():
-                    flush_plaintext()
-                    tokens.append(("math_inline", inner))
-                    i = closing + 1
+                    flush_plaintext(i)
+                    append(("math_inline", inner))
+                    i = plain_start = closing + 1
                     continue
 
             # no closing or only whitespace -> treat literal '$'
-            buffer.append("$")
             i += 1
             continue
 
@@ -941,35 +878,33 @@ def tokenize_inline_org_markup(text: str) -> list[tuple[str, str]]:
                 url = url.strip()
                 desc = desc.strip()
 
-                flush_plaintext()
-                tokens.append(("link", f"{url}{NULL_SEP}{desc}"))
-                i = end + 2
+                flush_plaintext(i)
+                append(("link", f"{url}{NULL_SEP}{desc}"))
+                i = plain_start = end + 2
                 continue
             # no closing "]]" found -> fall through as plaintext
 
         # --- emphasis / code delimiters ------------------------------------
-        if ch in delimiter_to_type and is_valid_emphasis_open(i, ch):
-            # find closing delimiter
-            j = i + 1
-            while j < len(text):
-                if text[j] == ch and is_valid_emphasis_close(j, ch):
+        token_type = _DELIMITER_TO_TYPE.get(ch)
+        if token_type is not None and is_valid_emphasis_open(i, ch):
+            # find closing delimiter, jumping between occurrences of ch
+            j = text.find(ch, i + 1)
+            while j != -1:
+                if is_valid_emphasis_close(j, ch):
                     # emit
-                    flush_plaintext()
+                    flush_plaintext(i)
                     inner = text[i + 1 : j]
-                    tokens.append((delimiter_to_type[ch], inner))
-                    i = j + 1
+                    append((token_type, inner))
+                    i = plain_start = j + 1
                     break
-                j += 1
+                j = text.find(ch, j + 1)
             else:
                 # no close found -> treat as plaintext
-                buffer.append(ch)
                 i += 1
         else:
-            buffer.append(ch)
             i += 1
 
-
-    flush_plaintext()
+    flush_plaintext(len(text))
     return tokens
 
 
@@ -979,94 +914,59 @@ def make_line_token_event(line: str) -> OrgEvent:
 
     If you later add more inline constructs, keep this as the stable API.
     """
-    return OrgEvent(
-            type="line_tokens",
-            data={"tokens": tokenize_inline_org_markup(line)},
-    )
+    # Built every line: positional arguments skip NamedTuple's keyword
+    # handling.
+    return OrgEvent("line_tokens", {"tokens": tokenize_inline_org_markup(line)})
 
 
-def parse_org_line(
+def _parse_line_cascade(
     line: str,
     cfg: OrgReaderConfig,
     state: OrgState,
-) -> tuple[OrgState, list[OrgEvent]]:
-    events: list[OrgEvent] = []
-
-    preamble_event = _handle_preamble_if_applicable(line, cfg, state)
-    if preamble_event:
-        events.append(preamble_event)
-        if preamble_event.type == "preamble_kv":
-            line_event = make_line_token_event(line)
-            events.append(line_event)
-            return state, events
+    events: list[OrgEvent],
+    match: Optional[re.Match] = None,
+) -> None:
+    """
+    Try every handler in precedence order.
 
+    Used for lines whose classification depends on state (e.g. :END: or
+    #+end_comment outside of a drawer/comment) and as the reference for the
+    per-kind dispatch in parse_org_line().
+    """
     # ----- Comments ------------------------------------------------
     comment_event = _handle_comment_if_present(line, cfg, state)
     if comment_event is not None:
         events.append(comment_event)
-        return state, events
+        return
     if state.is_inside_comment:
         # swallow lines while collecting comment block
-        return state, events
+        return
     # ---------------------------------------------------------------
 
     # ----- Drawers -------------------------------------------------
     drawer_event = _handle_drawer_if_present(line, cfg, state)
     if drawer_event is not None:
         events.append(drawer_event)
-        return state, events
+        return
     if state.is_inside_drawer:
-        return state, events
+        return
     # ---------------------------------------------------------------
 
-    # ----- Tables -------------------------------------------------- 
+    # ----- Tables --------------------------------------------------
     table_event = _handle_table_if_present(line, cfg, state)
     if table_event is not None:
         events.append(table_event)
         # No line_tokens for tables (for now), and we don't treat them
         # as paragraphs or lists.
-        return state, events
-
-    # #+TBLFM:
-    tblfm_event = _handle_tblfm_keyword_if_present(line, cfg, state)
-    if tblfm_event:
-        events.append(tblfm_event)
-        # Optional: tokens for debug
-        line_event = make_line_token_event(line)
-        events.append(line_event)
-        return state, events
+        return
+
+    # ----- #+KEY: keywords -----------------------------------------
+    keyword_event = _handle_keyword_if_present(line, cfg, state)
+    if keyword_event:
+        events.append(keyword_event)
+        events.append(make_line_token_event(line))
+        return
     # ---------------------------------------------------------------
-    # #+NAME:
-    name_event = _handle_name_keyword_if_present(line, cfg, state)
-    if name_event:
-        events.append(name_event)
-        line_event = make_line_token_event(line)
-        events.append(line_event)
-        return state, events
-
-    # #+CAPTION:
-    caption_event = _handle_caption_keyword_if_present(line, cfg, state)
-    if caption_event:
-        events.append(caption_event)
-        line_event = make_line_token_event(line)
-        events.append(line_event)
-        return state, events
-
-    # #+ATTR_HTML:
-    attr_html_event = _handle_attr_html_keyword_if_present(line, cfg, state)
-    if attr_html_event:
-        events.append(attr_html_event)
-        line_event = make_line_token_event(line)
-        events.append(line_event)
-        return state, events
-
-    # #+LATEX: (macro caching)
-    latex_macro_event = _handle_latex_macro_keyword_if_present(line, cfg, state)
-    if latex_macro_event:
-        events.append(latex_macro_event)
-        line_event = make_line_token_event(line)
-        events.append(line_event)
-        return state, events
 
     heading_event = _handle_section_heading_if_present(line, cfg, state)
     if heading_event:
@@ -1086,8 +986,277 @@ def parse_org_line(
             if ol_event:
                 events.append(ol_event)
 
-    line_event = make_line_token_event(line)
-    if line_event:
-        events.append(line_event)
+    events.append(make_line_token_event(line))
+
+
+def _parse_plain_line(
+    line: str,
+    cfg: OrgReaderConfig,
+    state: OrgState,
+    events: list[OrgEvent],
+    match: Optional[re.Match] = None,
+) -> None:
+    # No line pattern matched: only single-line comments and tables are
+    # recognised without a regex.
+    stripped = line.lstrip()
+    if stripped.startswith("#"):
+        comment_event = _handle_comment_if_present(line, cfg, state)
+        if comment_event is not None:
+            events.append(comment_event)
+            return
+    elif stripped.startswith("|"):
+        table_event = _handle_table_if_present(line, cfg, state)
+        if table_event is not None:
+            events.append(table_event)
+            return
+
+    events.append(make_line_token_event(line))
+
+
+def _parse_container_begin_line(
+    line: str,
+    cfg: OrgReaderConfig,
+    state: OrgState,
+    events: list[OrgEvent],
+    match: Optional[re.Match] = None,
+) -> None:
+    # #+begin_comment / :NAME: only switch state; their events are emitted
+    # when the closing line is seen.
+    if _handle_comment_if_present(line, cfg, state) is None:
+        _handle_drawer_if_present(line, cfg, state)
+
+
+def _parse_keyword_line(
+    line: str,
+    cfg: OrgReaderConfig,
+    state: OrgState,
+    events: list[OrgEvent],
+    match: Optional[re.Match] = None,
+) -> None:
+    # `match` is the combined-pattern match that classified the line as
+    # header_kv, so the key and value come from it without re-matching.
+    if match is None:
+        keyword_event = _handle_keyword_if_present(line, cfg, state)
+    else:
+        keyword_event = _dispatch_keyword(
+            cfg.classified_group(match, 1), line[match.end():], cfg, state
+        )
+    if keyword_event:
+        events.append(keyword_event)
+    events.append(make_line_token_event(line))
+
 
+def _parse_heading_line(
+    line: str,
+    cfg: OrgReaderConfig,
+    state: OrgState,
+    events: list[OrgEvent],
+    match: Optional[re.Match] = None,
+) -> None:
+    heading_event = _handle_section_heading_if_present(line, cfg, state)
+    if heading_event:
+        events.append(heading_event)
+    events.append(make_line_token_event(line))
+
+
+def _parse_block_line(
+    line: str,
+    cfg: OrgReaderConfig,
+    state: OrgState,
+    events: list[OrgEvent],
+    match: Optional[re.Match] = None,
+) -> None:
+    block_event = _handle_block_marker_if_present(line, cfg, state)
+    if block_event:
+        events.append(block_event)
+    events.append(make_line_token_event(line))
+
+
+def _parse_list_line(
+    line: str,
+    cfg: OrgReaderConfig,
+    state: OrgState,
+    events: list[OrgEvent],
+    match: Optional[re.Match] = None,
+) -> None:
+    list_event = _handle_unordered_list_if_present(
+        line, cfg, state
+    ) or _handle_ordered_list_if_present(line, cfg, state)
+    if list_event:
+        events.append(list_event)
+    events.append(make_line_token_event(line))
+
+
+# #+KEY: handlers, keyed by the lowercased keyword. Each gets the stripped
+# text after the colon.
+_KEYWORD_HANDLERS = {
+    "tblfm": _handle_tblfm_keyword,
+    "name": _handle_name_keyword,
+    "caption": _handle_caption_keyword,
+    "attr_html": _handle_attr_html_keyword,
+    "latex": _handle_latex_macro_keyword,
+}
+
+
+def _handle_keyword_if_present(
+    line: str,
+    cfg: OrgReaderConfig,
+    state: OrgState,
+) -> Optional[OrgEvent]:
+    """
+    Match #+KEY: once and dispatch to the handler for KEY, if there is one.
+    """
+    if not _may_match_line_pattern(line.lstrip(), cfg):
+        return None
+
+    match = cfg.header_kv_re.match(line)
+    if not match:
+        return None
+
+    return _dispatch_keyword(match.group(1), line[match.end():], cfg, state)
+
+
+def _dispatch_keyword(
+    key: str,
+    rest: str,
+    cfg: OrgReaderConfig,
+    state: OrgState,
+) -> Optional[OrgEvent]:
+    """
+    Call the handler for the #+KEY: keyword `key` with the stripped `rest`.
+    """
+    handler = _KEYWORD_HANDLERS.get(key.strip().lower())
+    if handler is None:
+        return None
+    return handler(rest.strip(), cfg, state)
+
+# Line kind (see OrgReaderConfig.classify) -> line parser. Kinds not listed
+# here go through the full cascade.
+_LINE_PARSERS = {
+    None: _parse_plain_line,
+    "comment_begin": _parse_container_begin_line,
+    "drawer_begin": _parse_container_begin_line,
+    "block": _parse_block_line,
+    "header_kv": _parse_keyword_line,
+    "section_heading": _parse_heading_line,
+    "unordered_list": _parse_list_line,
+    "ordered_list": _parse_list_line,
+}
+
+
+def parse_org_line(
+    line: str,
+    cfg: OrgReaderConfig,
+    state: OrgState,
+) -> tuple[OrgState, list[OrgEvent]]:
+    events: list[OrgEvent] = []
+
+    if state.is_in_preamble:
+        preamble_event = _handle_preamble_if_applicable(line, cfg, state)
+        if preamble_event:
+            events.append(preamble_event)
+            if preamble_event.type == "preamble_kv":
+                line_event = make_line_token_event(line)
+                events.append(line_event)
+                return state, events
+
+    # Inside a comment block or drawer the cascade decides (a comment may
+    # still open inside a drawer).
+    if state.is_inside_comment or state.is_inside_drawer:
+        _parse_line_cascade(line, cfg, state, events)
+        return state, events
+
+    # Most lines start with a character no line pattern can match; those
+    # skip the regex. Otherwise one match of the combined pattern picks the
+    # parser. (The pre-check is _may_match_line_pattern(), inlined: this
+    # runs once per line.)
+    kind = match = None
+    start_chars = cfg.line_start_chars
+    if start_chars is None or line.lstrip()[:1] in start_chars:
+        classified = cfg.classify(line)
+        if classified is not None:
+            kind, match = classified
+    _LINE_PARSERS.get(kind, _parse_line_cascade)(line, cfg, state, events, match)
     return state, events
+
+
+def make_line_parser(
+    cfg: OrgReaderConfig,
+) -> Callable[[str, OrgState], tuple[OrgState, list[OrgEvent]]]:
+    """
+    Return parse(line, state), equivalent to parse_org_line(line, cfg, state)
+    but with the config-derived lookups (first-character patterns, parser
+    table) bound once instead of read from cfg on every line.
+    """
+    by_char = cfg.line_re_by_char
+    if by_char is None:
+        return lambda line, state: parse_org_line(line, cfg, state)
+
+    parsers = _LINE_PARSERS
+    cascade = _parse_line_cascade
+
+    def parse(line: str, state: OrgState) -> tuple[OrgState, list[OrgEvent]]:
+        events: list[OrgEvent] = []
+
+        if state.is_in_preamble:
+            preamble_event = _handle_preamble_if_applicable(line, cfg, state)
+            if preamble_event:
+                events.append(preamble_event)
+                if preamble_event.type == "preamble_kv":
+                    events.append(make_line_token_event(line))
+                    return state, events
+
+        if state.is_inside_comment or state.is_inside_drawer:
+            cascade(line, cfg, state, events)
+            return state, events
+
+        # cfg.classify(), inlined
+        pattern = by_char.get(line.lstrip()[:1])
+        match = pattern.match(line) if pattern is not None else None
+        if match is None:
+            _parse_plain_line(line, cfg, state, events)
+        else:
+            parsers.get(match.lastgroup, cascade)(line, cfg, state, events, match)
+        return state, events
+
+    return parse
+
+
+def parse_org_document(
+    lines: Iterable[str],
+    cfg: OrgReaderConfig,
+    state: Optional[OrgState] = None,
+) -> tuple[OrgState, list[list[OrgEvent]]]:
+    """
+    Parse a complete sequence of lines; return the final state and the
+    events of each line (same as calling parse_org_line() per line).
+
+    Plain body lines, which cannot match any line pattern, are tokenized
+    directly without going through the per-line dispatch.
+    """
+    if state is None:
+        state = OrgState()
+
+    # First characters that need the full parser: the line patterns plus
+    # single-line comments and tables. One set lookup rejects the rest.
+    start_chars = cfg.line_start_chars
+    structural = start_chars | {"#", "|"} if start_chars is not None else None
+    parse_line = make_line_parser(cfg)
+    all_events: list[list[OrgEvent]] = []
+    append = all_events.append
+    for line in lines:
+        if (
+            structural is not None
+            and not state.is_in_preamble
+            and not state.is_inside_comment
+            and not state.is_inside_drawer
+            and line.lstrip()[:1] not in structural
+        ):
+            append([make_line_token_event(line)])
+            continue
+
+        state, events = parse_line(line, state)
+        append(events)
+
+    return state, all_events
+
@@ -1,14 +1,29 @@
 from __future__ import annotations
 
 import argparse
+import functools
+import os
+import re
+import stat
 import sys
+from collections import OrderedDict
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Iterator, Tuple
+from typing import Iterable, Iterator, TextIO, Tuple
 
 from config_loader import OrgReaderConfig, load_config
 from org_parser import parse_org_line, OrgState
 from helper import print_event_gray
 
+# Read files in large chunks; lines are still decoded by the text layer.
+_READ_BUFFER_SIZE = 1 << 20
+
+# Output chunk size (characters) for the CLI.
+_WRITE_CHUNK_SIZE = 1 << 16
+
+# Everything after the keyword token and any leading colons, stripped.
+_INCLUDE_TARGET_RE = re.compile(r"\s*\S+\s+:*\s*(.*?)\s*", re.DOTALL)
+
 def safe_input_path(raw: str, *, root: Path | None = None) -> Path:
     """
     Parse and validate a user-supplied path.
@@ -28,8 +43,12 @@ def safe_input_path(raw: str, *, root: Path | None = None) -> Path:
 
     # Disallow path traversal patterns (conservative).
     # NOTE: This is stricter than necessary, but good for "input filename safety".
-    parts = list(p.parts)
-    if any(part == ".." for part in parts):
+    # A ".." component is "/../" once the path is wrapped in separators;
+    # one substring search instead of splitting into p.parts.
+    text = str(p)
+    if os.altsep:
+        text = text.replace(os.altsep, os.sep)
+    if f"{os.sep}..{os.sep}" in f"{os.sep}{text}{os.sep}":
         raise ValueError("Path traversal ('..') is not allowed.")
 
     # Resolve to an absolute path
@@ -37,29 +56,37 @@ def safe_input_path(raw: str, *, root: Path | None = None) -> Path:
     resolved = p.resolve(strict=False)
 
     if root is not None:
-        root_resolved = root.resolve(strict=True)
+        root_resolved = _resolve_root(root)
         try:
             resolved.relative_to(root_resolved)
         except ValueError as e:
             raise ValueError(f"Input path must be within root: {root_resolved}") from e
 
-    if not resolved.exists():
-        raise FileNotFoundError(f"File not found: {resolved}")
-    if not resolved.is_file():
+    # One stat answers both "exists?" and "regular file?"
+    try:
+        st = os.stat(resolved)
+    except (FileNotFoundError, NotADirectoryError):
+        raise FileNotFoundError(f"File not found: {resolved}") from None
+    if not stat.S_ISREG(st.st_mode):
         raise IsADirectoryError(f"Not a file: {resolved}")
 
     return resolved
 
 
+@functools.lru_cache(maxsize=64)
+def _resolve_root(root: Path) -> Path:
+    """
+    root.resolve(strict=True), memoized for batch calls with the same root.
+    """
+    return root.resolve(strict=True)
+
+
 def is_include_line(line: str, cfg: OrgReaderConfig) -> bool:
     """
     Return True if line looks like an Org include directive.
-    Uses cfg.include_keyword_re when available.
+    Same test as is_include(): the precompiled cfg.include_keyword_re.
     """
-    # Prefer regex from config if present
-    if hasattr(cfg, "include_keyword_re") and cfg.include_keyword_re is not None:
-        return bool(cfg.include_keyword_re.search(line))
-    return line.lstrip().lower().startswith("#+include")
+    return is_include(line, cfg)
 
 
 def parse_include_target(line: str) -> str | None:
@@ -93,19 +120,22 @@ def un_quote_string(string: str, cfg: OrgReaderConfig) -> str:
     """
     Remove a single matching pair of surrounding quotation marks from a string.
     """
-    for open_quote, close_quote in cfg.quotes.items():
-        if string.startswith(open_quote) and string.endswith(close_quote):
-            return string[len(open_quote):-len(close_quote)].strip()
-    return string
+    pattern = cfg.quote_strip_re
+    match = pattern.fullmatch(string) if pattern is not None else None
+    if match is None:
+        return string
+    # Each alternative has one group, so the matched one is the last.
+    return match.group(match.lastindex).strip()
 
 
 def resolve_include(line: str, path: Path, cfg: OrgReaderConfig) -> Path:
     """
     Resolve an Org-style #+INCLUDE directive to an absolute file path.
     """
-    include_path = line.split(maxsplit=1)[1]
-    include_path = include_path.lstrip(":").strip()
-    include_path = un_quote_string(include_path, cfg)
+    match = _INCLUDE_TARGET_RE.fullmatch(line)
+    if match is None:
+        raise ValueError(f"Include without target: {line!r}")
+    include_path = un_quote_string(match.group(1), cfg)
     return (path.parent / include_path).resolve()
 
 
@@ -119,6 +149,9 @@ def is_include(line: str, cfg: OrgReaderConfig) -> bool:
 def should_skip_header_line(line: str, cfg: OrgReaderConfig) -> bool:
     """
     Determine whether a line is a skippable Org header keyword line.
+
+    cfg.skip_header_keys is a lowercased frozenset, so only the keyword
+    taken from the line needs lowering.
     """
     match = cfg.header_kv_re.match(line)
     return bool(match and match.group(1).lower() in cfg.skip_header_keys)
@@ -127,16 +160,94 @@ def should_skip_header_line(line: str, cfg: OrgReaderConfig) -> bool:
 def preamble_decision(line: str, cfg: OrgReaderConfig) -> Tuple[bool, bool]:
     """
     Decide whether a line belongs to the preamble of an included Org file.
+    Blank lines and skippable header keywords stay in the preamble (and are
+    skipped); the first other line ends it. Returns (skip, in_preamble),
+    which are always equal.
     """
-    stripped = line.strip()
-
-    if stripped == "":
+    if _is_preamble_line(line, cfg):
         return True, True
+    return False, False
 
-    if should_skip_header_line(line, cfg):
-        return True, True
 
-    return False, False
+def _is_preamble_line(line: str, cfg: OrgReaderConfig) -> bool:
+    return not line.strip() or should_skip_header_line(line, cfg)
+
+
+@dataclass(slots=True)
+class _IncludeFrame:
+    """
+    A file being read by read_with_includes().
+
+    For included files, `lines` collects the expanded output and `deps` the
+    (path, mtime_ns, size) of every file it came from, for _INCLUDE_CACHE.
+    """
+
+    file: TextIO
+    path: Path
+    key: Path
+    state: OrgState
+    in_preamble: bool
+    lines: list[str] | None = None
+    deps: list[tuple[Path, int, int]] | None = None
+
+
+# Resolved path of an included file -> (cfg, deps, expanded lines). An entry
+# is used only while every dependency still has the same mtime and size.
+_INCLUDE_CACHE: OrderedDict[
+    Path, tuple[OrgReaderConfig, tuple[tuple[Path, int, int], ...], list[str]]
+] = OrderedDict()
+_INCLUDE_CACHE_SIZE = 256
+
+
+def deps_unchanged(deps: Iterable[tuple[Path, int, int]]) -> bool:
+    """
+    True if every (path, mtime_ns, size) dependency still matches the file
+    on disk (as recorded by read_with_includes(..., deps=...)).
+    """
+    for dep, mtime_ns, size in deps:
+        try:
+            st = dep.stat()
+        except OSError:
+            return False
+        if st.st_mtime_ns != mtime_ns or st.st_size != size:
+            return False
+    return True
+
+
+def _cached_include(
+    key: Path, cfg: OrgReaderConfig
+) -> tuple[tuple[tuple[Path, int, int], ...], list[str]] | None:
+    """
+    Look up a still-valid _INCLUDE_CACHE entry; returns its (deps, lines)
+    or None.
+
+    Readers in other threads may evict entries at any time, so the entry is
+    fetched once and everything is taken from it.
+    """
+    entry = _INCLUDE_CACHE.get(key)
+    if entry is None or entry[0] != cfg or not deps_unchanged(entry[1]):
+        return None
+    try:
+        _INCLUDE_CACHE.move_to_end(key)
+    except KeyError:  # evicted meanwhile; the entry itself is still valid
+        pass
+    return entry[1], entry[2]
+
+
+def _store_include(
+    key: Path, value: tuple[OrgReaderConfig, tuple[tuple[Path, int, int], ...], list[str]]
+) -> None:
+    """
+    Insert an _INCLUDE_CACHE entry and evict the oldest beyond its size,
+    tolerating concurrent evictions by other threads.
+    """
+    _INCLUDE_CACHE[key] = value
+    try:
+        _INCLUDE_CACHE.move_to_end(key)
+        while len(_INCLUDE_CACHE) > _INCLUDE_CACHE_SIZE:
+            _INCLUDE_CACHE.popitem(last=False)
+    except KeyError:
+        pass
 
 
 def read_with_includes(
@@ -144,6 +255,7 @@ def read_with_includes(
     cfg: OrgReaderConfig,
     *,
     is_root: bool = True,
+    deps: list[tuple[Path, int, int]] | None = None,
 ) -> Iterator[str]:
     """
     Iterate over an Org file line-by-line, expanding #+INCLUDE directives.
@@ -152,38 +264,112 @@ def read_with_includes(
       - verbatim blocks (OrgState.is_inside_block)
       - drawers         (OrgState.is_inside_drawer)
       - comment blocks  (OrgState.is_inside_comment)
+
+    Includes are expanded depth-first with an explicit stack of open files,
+    so every line is yielded by this one generator. An include that would
+    re-enter a file already being read raises ValueError.
+
+    The expansion of each included file is cached (see _INCLUDE_CACHE), so
+    re-reading a project only re-parses includes whose files changed.
+
+    If `deps` is given, the (path, mtime_ns, size) of every file read
+    (including cached includes) is appended to it; deps_unchanged() later
+    tells whether the expanded output could differ.
     """
     path = Path(path)
-    state = OrgState()
-    in_preamble: bool = not is_root
+    stack: list[_IncludeFrame] = []
+    active: set[Path] = set()
+
+    def push(p: Path, in_preamble: bool, collect: bool) -> None:
+        key = p.resolve()
+        if key in active:
+            raise ValueError(f"Include cycle: {p}")
+        f = p.open(encoding="utf-8", buffering=_READ_BUFFER_SIZE)
+        frame = _IncludeFrame(f, p, key, OrgState(), in_preamble)
+        stack.append(frame)
+        active.add(key)
+        if collect or deps is not None:
+            st = os.fstat(f.fileno())
+            dep = (key, st.st_mtime_ns, st.st_size)
+            if deps is not None:
+                deps.append(dep)
+            if collect:
+                frame.lines = []
+                frame.deps = [dep]
+
+    def pop() -> None:
+        frame = stack.pop()
+        frame.file.close()
+        active.discard(frame.key)
+        if frame.lines is None:
+            return
+        _store_include(frame.key, (cfg, tuple(frame.deps), frame.lines))
+        if stack and stack[-1].lines is not None:
+            stack[-1].lines.extend(frame.lines)
+            stack[-1].deps.extend(frame.deps)
 
-    with path.open(encoding="utf-8") as f:
-        for raw_line in f:
-            line = raw_line.rstrip("\n")
+    try:
+        push(path, not is_root, not is_root)
+        while stack:
+            frame = stack[-1]
+            raw_line = frame.file.readline()
+            if not raw_line:
+                pop()
+                continue
 
-            if in_preamble:
-                skip, in_preamble = preamble_decision(line, cfg)
-                if skip:
+            line = raw_line.rstrip("\n")
+            stripped = line.lstrip()
+
+            # preamble_decision(), without building its (skip, skip) tuple;
+            # lines no pattern can start with are not header keywords either
+            if frame.in_preamble:
+                if not stripped or (
+                    cfg.may_classify(stripped) and should_skip_header_line(line, cfg)
+                ):
                     continue
+                frame.in_preamble = False
 
             # Update state for this line
-            state, _ = parse_org_line(line, cfg, state)
-
-            # Expand includes only when NOT inside containers
-            if (
-                is_include(line, cfg)
-                and not state.is_inside_block
-                and not state.is_inside_drawer
-                and not getattr(state, "is_inside_comment", False)
-            ):
-                yield from read_with_includes(
-                    resolve_include(line, path, cfg),
-                    cfg,
-                    is_root=False,
-                )
-                continue
+            state, _ = parse_org_line(line, cfg, frame.state)
+            frame.state = state
+
+            # Expand includes only when NOT inside containers. Prose lines
+            # cannot be includes; skip the regex for them.
+            in_container = (
+                state.is_inside_block or state.is_inside_drawer or state.is_inside_comment
+            )
+            if not in_container and cfg.may_classify(stripped):
+                classified = cfg.classify(line)
+                if classified is not None and classified[0] == "include":
+                    target = resolve_include(line, frame.path, cfg)
+                    cached = _cached_include(target, cfg)
+                    if cached is None or active.intersection(dep for dep, _, _ in cached[0]):
+                        # Not cached, or would hide an include cycle
+                        push(target, True, True)
+                        continue
+                    cached_deps, cached_lines = cached
+                    if deps is not None:
+                        deps.extend(cached_deps)
+                    if frame.lines is not None:
+                        frame.lines.extend(cached_lines)
+                        frame.deps.extend(cached_deps)
+                    yield from cached_lines
+                    continue
 
+            if frame.lines is not None:
+                frame.lines.append(line)
             yield line
+    finally:
+        for frame in stack:
+            frame.file.close()
+
+def expand_to_list(path: Path, cfg: OrgReaderConfig) -> list[str]:
+    """
+    Read an Org file with all includes expanded into a list, for callers
+    that iterate the expanded lines more than once.
+    """
+    return list(read_with_includes(path, cfg))
+
 
 def build_arg_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(
@@ -232,12 +418,26 @@ def main(argv: list[str] | None = None) -> int:
         print(f"[org_reader] Invalid input path: {e}", file=sys.stderr)
         return 2
 
+    # Collect lines and write them in ~64 KiB chunks instead of one print()
+    # per line.
+    write = sys.stdout.write
+    chunk: list[str] = []
+    size = 0
     try:
         for line in read_with_includes(input_path, cfg):
-            print(line)
+            chunk.append(line)
+            size += len(line) + 1
+            if size >= _WRITE_CHUNK_SIZE:
+                write("\n".join(chunk) + "\n")
+                chunk.clear()
+                size = 0
     except Exception as e:
+        if chunk:
+            write("\n".join(chunk) + "\n")
         print(f"[org_reader] Error while reading: {e}", file=sys.stderr)
         return 1
+    if chunk:
+        write("\n".join(chunk) + "\n")
 
     return 0
 
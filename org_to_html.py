@@ -20,16 +20,25 @@ Everything else is kept simple and only uses information established so far.
 from __future__ import annotations
 from config_loader import load_config, OrgReaderConfig
 from pathlib import Path
-from typing import Optional
-from urllib.parse import urlparse
+from types import CodeType
+from typing import Callable, Iterable, Optional, Sequence, TextIO
 import argparse
+import functools
 import hashlib
 import html
+import io
 import ast
 import math
+import os
 import re
-
-from org_parser import OrgEvent, OrgState, parse_org_line, tokenize_inline_org_markup
+import shutil
+
+from org_parser import (
+    OrgEvent,
+    OrgState,
+    make_line_parser,
+    tokenize_inline_org_markup_cached,
+)
 from org_reader import read_with_includes
 
 MATH_CACHE = Path(".math-cache")  # or BASE_DIR / ".math-cache"
@@ -38,6 +47,11 @@ MATH_CACHE.mkdir(exist_ok=True)
 
 def escape_html(text: str) -> str:
     """Escape text for HTML output."""
+    # html.escape's chained str.replace calls beat a str.translate table on
+    # the strings emitted here (translate is several times slower as soon as
+    # anything needs escaping); only skip the call for empty text.
+    if not text:
+        return text
     return html.escape(text, quote=True)
 
 
@@ -47,6 +61,11 @@ def heading_tag_for_level(level: int) -> str:
     return f"h{safe_level}"
 
 
+# Leading whitespace then '#+'; matching in place avoids an lstrip() copy per line.
+# Group 1 is set for a '#+RESULTS' marker, so the main loop answers both
+# questions with one match.
+_DIRECTIVE_LINE_RE = re.compile(r"\s*#\+(RESULTS)?")
+
 def is_org_directive_line(line: str) -> bool:
     """
     Decide whether a line is an Org keyword/directive line like '#+TITLE:'.
@@ -54,8 +73,11 @@ def is_org_directive_line(line: str) -> bool:
     We keep headings and block markers via events, but otherwise ignore directives
     in the HTML body to avoid noise.
     """
-    stripped = line.lstrip()
-    return stripped.startswith("#+")
+    return _DIRECTIVE_LINE_RE.match(line) is not None
+
+# What urllib.parse accepts as a scheme: a letter, then letters, digits,
+# "+", "-" or ".", up to the first colon.
+_URL_SCHEME_RE = re.compile(r"[A-Za-z][A-Za-z0-9+.-]*:")
 
 def normalize_image_src(url: str) -> str:
     """
@@ -69,12 +91,10 @@ def normalize_image_src(url: str) -> str:
     if url.startswith("file:"):
         url = url[5:]  # strip "file:"
         # strip leading slashes so "file:./img/…" and "file:/img/…" both work
-        while url.startswith("/"):
-            url = url[1:]
+        url = url.lstrip("/")
 
-    parsed = urlparse(url)
     # Preserve absolute URLs (http, https, etc.) and already-absolute paths
-    if parsed.scheme or url.startswith("/"):
+    if url.startswith("/") or _URL_SCHEME_RE.match(url):
         return url
 
     # Everything else: treat as project-relative and expose under /assets/
@@ -84,7 +104,7 @@ def render_hidden_comment_block(
     *,
     comment_id: str,
     anchor: Optional[str],
-    lines: list[str],
+    lines: Iterable[str],
     preamble_macros: str,
     button_label: str = "Show comment",  # <-- NEW
 ) -> str:
@@ -114,15 +134,14 @@ def build_verse_attributes(event: OrgEvent | None) -> str:
     - Adds class="verse block block-verse"
     - Adds id="..." if the verse has an anchor (#+NAME:)
     """
-    classes = ["verse", "block", "block-verse"]
-    attrs: list[str] = [f'class="{" ".join(classes)}"']
-
     if event is not None:
         anchor = event.data.get("anchor")
-        if isinstance(anchor, str) and anchor.strip():
-            attrs.append(f'id="{escape_html(anchor.strip())}"')
+        if isinstance(anchor, str):
+            anchor = anchor.strip()
+            if anchor:
+                return f' class="verse block block-verse" id="{escape_html(anchor)}"'
 
-    return " " + " ".join(attrs)
+    return ' class="verse block block-verse"'
 
 
 def render_verse_lines(lines: list[str], preamble_macros: str) -> str:
@@ -131,16 +150,16 @@ def render_verse_lines(lines: list[str], preamble_macros: str) -> str:
 
     Each input line becomes one rendered line. Line breaks are emitted as <br />.
     """
-    rendered_lines: list[str] = []
-    for ln in lines:
-        tokens = tokenize_inline_org_markup(ln or "")
-        rendered_lines.append(render_inline_tokens(tokens, preamble_macros=preamble_macros))
+    rendered_lines = [
+        render_inline_tokens(tokenize_inline_org_markup_cached(ln or ""), preamble_macros=preamble_macros)
+        for ln in lines
+    ]
 
     # Preserve line boundaries explicitly
     return "<br />\n".join(rendered_lines)
 
 def render_comment_html_lines(
-    lines: list[str],
+    lines: Iterable[str],
     *,
     preamble_macros: str = "",
 ) -> str:
@@ -151,7 +170,7 @@ def render_comment_html_lines(
     render like normal inline Org (bold/italic/links/math).
     """
     out: list[str] = []
-    paragraph: list[list[tuple[str, str]]] = []
+    paragraph: list[Sequence[tuple[str, str]]] = []
 
     def flush_para() -> None:
         nonlocal paragraph
@@ -176,22 +195,32 @@ def render_comment_html_lines(
         if is_org_directive_line(line):
             continue
 
-        paragraph.append(tokenize_inline_org_markup(line))
+        paragraph.append(tokenize_inline_org_markup_cached(line))
 
     flush_para()
     return "\n".join(out) + ("\n" if out else "")
 
 
+@functools.lru_cache(maxsize=2048)
+def _math_digest(math_src: str, macros: str) -> str:
+    payload_for_hash = macros + "\n%%MATH%%\n" + (math_src or "")
+    return hashlib.blake2b(
+        payload_for_hash.encode("utf-8"), digest_size=20
+    ).hexdigest()
+
+
 def math_image_url(math_src: str, *, preamble_macros: str = "") -> str:
     """
     Turn (macros + math) into a cache key and URL.
 
     We hash BOTH the macro preamble and the math snippet, so changes in macros
-    produce a different SVG.
+    produce a different SVG. The digest is only a cache filename, so BLAKE2b
+    (40 hex chars, like the SHA-1 it replaced) is used for speed. Only the
+    hash is memoized: the .tex source is re-checked on every call, so a
+    wiped .math-cache is refilled by the next render.
     """
     macros = (preamble_macros or "").strip()
-    payload_for_hash = macros + "\n%%MATH%%\n" + (math_src or "")
-    digest = hashlib.sha1(payload_for_hash.encode("utf-8")).hexdigest()
+    digest = _math_digest(math_src, macros)
 
     source_path = MATH_CACHE / f"{digest}.tex"
     if not source_path.exists():
@@ -209,85 +238,124 @@ def math_image_url(math_src: str, *, preamble_macros: str = "") -> str:
 
     return f"/math/{digest}.svg"
 
-_TBLFM_LHS_RE = re.compile(r"^\s*(\$\>|\$\d+)\s*$")
-_COLREF_RE = re.compile(r"\$(\d+)")
-_PREVROW_COL_RE = re.compile(r"@-1\$(\d+)")
-_PREVROW_SAMECOL_RE = re.compile(r"(?<![\w$])@-1(?![\w$])")
+# One pass over a formula: @-1$K, bare @-1, then $N (leftmost match wins).
+_FORMULA_REF_RE = re.compile(
+    r"@-1\$(?P<pcol>\d+)|(?<![\w$])@-1(?![\w$])|\$(?P<ccol>\d+)"
+)
 
 def _coerce_number(value: str) -> float:
     s = (value or "").strip()
     if s == "":
         return 0.0
-    # very permissive numeric parsing
+    # float() never accepts a comma, so rewrite "1,23" german decimals (basic)
+    # up front and parse once instead of failing and retrying.
+    if "," in s:
+        s = s.replace(",", ".")
     try:
         return float(s)
     except ValueError:
-        # allow "1,23" german decimal (basic)
-        try:
-            return float(s.replace(",", "."))
-        except ValueError:
-            return 0.0
+        return 0.0
 
-def _safe_eval(expr: str, names: dict[str, float]) -> float:
+_TBLFM_FUNCS = {
+    "abs": abs,
+    "round": round,
+    "min": min,
+    "max": max,
+    "int": int,
+    "float": float,
+    "sqrt": math.sqrt,
+}
+
+# Exact node types allowed in a formula; checked with type() in a set lookup.
+_TBLFM_NODES = frozenset({
+    ast.Expression,
+    ast.BinOp,
+    ast.UnaryOp,
+    ast.Add,
+    ast.Sub,
+    ast.Mult,
+    ast.Div,
+    ast.Mod,
+    ast.Pow,
+    ast.USub,
+    ast.UAdd,
+    ast.Constant,
+    ast.Name,
+    ast.Load,
+    ast.Call,
+})
+
+# Formula names (c1, p1, ...) are passed as locals; functions come from here.
+_TBLFM_GLOBALS = {"__builtins__": {}, **_TBLFM_FUNCS}
+
+@functools.lru_cache(maxsize=1024)
+def _compile_expr(expr: str) -> CodeType:
     """
-    Safe-ish eval for basic arithmetic expressions.
-
-    Allowed:
-      - numbers, + - * / **, parentheses
-      - names in `names`
-      - calls: abs, round, min, max, int, float, sqrt
+    Parse, validate and compile a formula expression once; table formulas
+    repeat the same expression on every row.
     """
-    allowed_funcs = {
-        "abs": abs,
-        "round": round,
-        "min": min,
-        "max": max,
-        "int": int,
-        "float": float,
-        "sqrt": math.sqrt,
-    }
-
     node = ast.parse(expr, mode="eval")
 
-    allowed_nodes = (
-        ast.Expression,
-        ast.BinOp,
-        ast.UnaryOp,
-        ast.Add,
-        ast.Sub,
-        ast.Mult,
-        ast.Div,
-        ast.Mod,
-        ast.Pow,
-        ast.USub,
-        ast.UAdd,
-        ast.Constant,
-        ast.Name,
-        ast.Load,
-        ast.Call,
-    )
-
     for sub in ast.walk(node):
-        if not isinstance(sub, allowed_nodes):
-            raise ValueError(f"Disallowed expression node: {type(sub).__name__}")
+        node_type = type(sub)
+        if node_type not in _TBLFM_NODES:
+            raise ValueError(f"Disallowed expression node: {node_type.__name__}")
 
-        if isinstance(sub, ast.Call):
-            if not isinstance(sub.func, ast.Name):
+        if node_type is ast.Call:
+            if type(sub.func) is not ast.Name:
                 raise ValueError("Only simple function calls allowed")
-            if sub.func.id not in allowed_funcs:
+            if sub.func.id not in _TBLFM_FUNCS:
                 raise ValueError(f"Function not allowed: {sub.func.id}")
 
-    compiled = compile(node, "<tblfm>", "eval")
-    env = dict(allowed_funcs)
-    env.update(names)
-    return float(eval(compiled, {"__builtins__": {}}, env))
+    return compile(node, "<tblfm>", "eval")
+
+def _safe_eval(expr: str, names: dict[str, float]) -> float:
+    """
+    Safe-ish eval for basic arithmetic expressions.
+
+    Allowed:
+      - numbers, + - * / **, parentheses
+      - names in `names`
+      - calls: abs, round, min, max, int, float, sqrt
+    """
+    return float(eval(_compile_expr(expr), _TBLFM_GLOBALS, names))
 
 def _format_result(x: float) -> str:
-    if abs(x - round(x)) < 1e-12:
-        return str(int(round(x)))
+    # exact integers (the common case) need no rounding
+    try:
+        xi = int(x)
+    except (ValueError, OverflowError):
+        # nan / inf
+        return str(x)
+    if xi == x:
+        return str(xi)
+    xr = round(x)
+    if abs(x - xr) < 1e-12:
+        return str(xr)
     # keep it readable
     return str(x)
 
+def _translate_formula(rhs: str, dest_col: int) -> str:
+    """
+    Translate a minimal subset of Org/Calc-ish syntax into eval names:
+      - $N    -> cN
+      - @-1$K -> pK
+      - bare @-1 -> p<dest_col>
+      - ^     -> ** (Org/Calc commonly uses '^' for exponent)
+    """
+    same_col = f"p{dest_col}"
+
+    def rewrite(m: re.Match) -> str:
+        pcol = m.group("pcol")
+        if pcol is not None:
+            return f"p{pcol}"
+        ccol = m.group("ccol")
+        if ccol is not None:
+            return f"c{ccol}"
+        return same_col
+
+    return _FORMULA_REF_RE.sub(rewrite, rhs.strip().replace("^", "**"))
+
 def _parse_tblfm_assignments(formulas: list[str], max_cols: int) -> list[tuple[int, str]]:
     """
     Return list of (dest_col_1based, rhs_expr) for column formulas.
@@ -312,17 +380,16 @@ def _parse_tblfm_assignments(formulas: list[str], max_cols: int) -> list[tuple[i
         if not rhs:
             continue
 
-        m = _TBLFM_LHS_RE.match(lhs)
-        if not m:
+        # LHS is "$>" or "$" followed by digits
+        if not lhs.startswith("$"):
             continue
-
-        if lhs == "$>":
+        col = lhs[1:]
+        if col == ">":
             dest = max_cols
+        elif col.isdecimal():
+            dest = int(col)
         else:
-            try:
-                dest = int(lhs[1:])
-            except ValueError:
-                continue
+            continue
 
         if dest <= 0:
             continue
@@ -330,22 +397,41 @@ def _parse_tblfm_assignments(formulas: list[str], max_cols: int) -> list[tuple[i
         out.append((dest, rhs))
     return out
 
+def _analyze_table(table_rows: list[dict]) -> tuple[int, Optional[int]]:
+    """
+    Return (max_cols, first_hline) for a buffered table in one pass.
+
+    first_hline is the index of the first hline that has at least one row
+    below it (everything before it is the header), or None.
+    """
+    max_cols = 0
+    first_hline = None
+    pending_hline = None
+    for i, r in enumerate(table_rows):
+        row_type = r.get("type")
+        if row_type == "row":
+            max_cols = max(max_cols, len(r.get("cells", [])))
+            if first_hline is None and pending_hline is not None:
+                first_hline = pending_hline
+        elif row_type == "hline" and pending_hline is None:
+            pending_hline = i
+    return max_cols, first_hline
+
 def _apply_column_formulas_to_table(
     table_rows: list[dict],
     tblfm_formulas: list[str],
+    max_cols: int,
+    first_hline: Optional[int],
 ) -> None:
     """
-    Mutate table_rows in-place (row cells updated).
+    Mutate table_rows in-place (rows padded to max_cols, cells updated).
+
+    max_cols and first_hline come from _analyze_table(table_rows).
 
     table_rows items:
       {"type": "row", "cells": [...]}
       {"type": "hline"}
     """
-    # determine max cols
-    max_cols = 0
-    for r in table_rows:
-        if r.get("type") == "row":
-            max_cols = max(max_cols, len(r.get("cells", [])))
     if max_cols == 0:
         return
 
@@ -356,24 +442,27 @@ def _apply_column_formulas_to_table(
             if len(cells) < max_cols:
                 r["cells"] = cells + [""] * (max_cols - len(cells))
 
-    assignments = _parse_tblfm_assignments(tblfm_formulas, max_cols)
+    # Translate and compile every formula once; only eval runs per row.
+    assignments: list[tuple[int, CodeType]] = []
+    for dest_col, rhs in _parse_tblfm_assignments(tblfm_formulas, max_cols):
+        try:
+            code = _compile_expr(_translate_formula(rhs, dest_col))
+        except Exception:
+            # fail soft: the formula never changes a cell
+            continue
+        assignments.append((dest_col, code))
     if not assignments:
         return
 
-    # header detection: everything before first hline that has rows below is header
-    first_hline = None
-    for i, r in enumerate(table_rows):
-        if r.get("type") == "hline":
-            # ensure there is at least one data row below
-            if any(rr.get("type") == "row" for rr in table_rows[i+1:]):
-                first_hline = i
-                break
-
     def is_header_row(idx: int) -> bool:
         return first_hline is not None and idx < first_hline
 
-    # track previous data row values (after computations) for @-1 support
-    prev_data_row_cells: list[str] | None = None
+    # One names dict for the whole table, keys formatted once. Every data
+    # row overwrites all c1..cN; p1..pN start at 0.0 and then hold the
+    # previous data row's values (after computations) for @-1 support.
+    c_keys = [f"c{col}" for col in range(1, max_cols + 1)]
+    p_keys = [f"p{col}" for col in range(1, max_cols + 1)]
+    names: dict[str, float] = dict.fromkeys(p_keys, 0.0)
 
     for idx, r in enumerate(table_rows):
         if r.get("type") != "row":
@@ -383,50 +472,30 @@ def _apply_column_formulas_to_table(
 
         cells: list[str] = r["cells"]
 
-        # build base numeric context c1..cN from *current* row
-        names: dict[str, float] = {}
-        for col in range(1, max_cols + 1):
-            names[f"c{col}"] = _coerce_number(cells[col - 1])
-
-        # add previous-row context for @-1 / @-1$K
-        if prev_data_row_cells is None:
-            for col in range(1, max_cols + 1):
-                names[f"p{col}"] = 0.0
-        else:
-            for col in range(1, max_cols + 1):
-                names[f"p{col}"] = _coerce_number(prev_data_row_cells[col - 1])
+        # base numeric context c1..cN from *current* row; `values` is kept
+        # in step with names so it can seed p1..pN without another copy
+        values = list(map(_coerce_number, cells))
+        names.update(zip(c_keys, values))
 
         # apply assignments in order
-        for dest_col, rhs in assignments:
-            # translate a minimal subset of Org/Calc-ish syntax into our eval names:
-            # - $N -> cN
-            # - @-1$K -> pK
-            # - bare @-1 -> p<dest_col>
-            expr = rhs.strip()
-
-            # power: Org/Calc commonly uses '^' for exponent
-            expr = expr.replace("^", "**")
-
-            expr = _PREVROW_COL_RE.sub(lambda m: f"p{m.group(1)}", expr)
-            expr = _PREVROW_SAMECOL_RE.sub(f"p{dest_col}", expr)
-            expr = _COLREF_RE.sub(lambda m: f"c{m.group(1)}", expr)
-
+        for dest_col, code in assignments:
             try:
-                result = _safe_eval(expr, names)
+                result = float(eval(code, _TBLFM_GLOBALS, names))
             except Exception:
                 # fail soft: do not change the cell
                 continue
 
-            # write result into destination col (1-based)
+            # write result into destination col (1-based) and expose it to
+            # later formulas in the same row without re-parsing the cell
             if 1 <= dest_col <= max_cols:
                 cells[dest_col - 1] = _format_result(result)
+                names[c_keys[dest_col - 1]] = result
+                values[dest_col - 1] = result
 
-            # update names for potential later formulas in same row
-            names[f"c{dest_col}"] = _coerce_number(cells[dest_col - 1])
-
-        prev_data_row_cells = list(cells)
+        # values now match the row's final cells
+        names.update(zip(p_keys, values))
 
-def render_inline_tokens(tokens: list[tuple[str, str]],
+def render_inline_tokens(tokens: Sequence[tuple[str, str]],
     *,
     preamble_macros: str = "",
     ) -> str:
@@ -440,63 +509,102 @@ def render_inline_tokens(tokens: list[tuple[str, str]],
       - code         -> <code>
       - math_inline  -> <img class="math-inline" src="/math/<hash>.svg"> (cached)
       - link         -> <a href="...">...</a> or <img ... /> for image links
+
+    Results are memoized per (tokens, preamble_macros). Lines with inline
+    math are always rendered, since that writes the math cache source.
+    A line that is a single plaintext token is just escaped.
     """
-    NULL_SEP = "\u0000"
+    if len(tokens) == 1 and tokens[0][0] == "plaintext":
+        return escape_html(tokens[0][1])
+    if any(token_type == "math_inline" for token_type, _ in tokens):
+        return _render_inline_tokens(tokens, preamble_macros)
+    return _render_inline_tokens_cached(tuple(tokens), preamble_macros)
+
+@functools.lru_cache(maxsize=4096)
+def _render_inline_tokens_cached(
+    tokens: tuple[tuple[str, str], ...],
+    preamble_macros: str,
+) -> str:
+    return _render_inline_tokens(tokens, preamble_macros)
 
-    out: list[str] = []
-    for token_type, token_text in tokens:
-        if token_type == "plaintext":
-            out.append(escape_html(token_text))
-
-        elif token_type == "bold_text":
-            out.append(f"<strong>{escape_html(token_text)}</strong>")
-
-        elif token_type == "italic_text":
-            out.append(f"<em>{escape_html(token_text)}</em>")
-
-        elif token_type == "code":
-            out.append(f"<code>{escape_html(token_text)}</code>")
-
-        elif token_type == "math_inline":
-            src = math_image_url(token_text, preamble_macros=preamble_macros)
-            alt = token_text.strip() or "math"
-            out.append(
-                f'<img src="{escape_html(src)}" '
-                f'alt="{escape_html(alt)}" '
-                f'class="math-inline" />'
-            )
+# Separator packing "url<NULL>desc" into link tokens (see tokenize_inline_org_markup).
+_NULL_SEP = "\u0000"
 
-        elif token_type == "link":
-            # token_text is "url<NULL>desc" as produced by tokenize_inline_org_markup
-            url = token_text
-            label = token_text
-            if NULL_SEP in token_text:
-                url, label = token_text.split(NULL_SEP, 1)
-
-            url = url.strip()
-            label = (label or "").strip() or url
-
-            if is_image_target(url):
-                # Render as image; label becomes alt (and title)
-                alt_text = label or url
-                web_url = normalize_image_src(url)
-                out.append(
-                    f'<img src="{escape_html(web_url)}" '
-                    f'alt="{escape_html(alt_text)}" '
-                    f'title="{escape_html(alt_text)}" '
-                    f'class="inline-image" />'
-                )
-            else:
-                # Normal hyperlink
-                out.append(
-                    f'<a href="{escape_html(url)}">{escape_html(label)}</a>'
-                )
+def _render_plain_token(token_text: str, preamble_macros: str) -> str:
+    return escape_html(token_text)
 
-        else:
-            # fallback
-            out.append(escape_html(token_text))
+def _render_bold_token(token_text: str, preamble_macros: str) -> str:
+    return f"<strong>{escape_html(token_text)}</strong>"
+
+def _render_italic_token(token_text: str, preamble_macros: str) -> str:
+    return f"<em>{escape_html(token_text)}</em>"
+
+def _render_code_token(token_text: str, preamble_macros: str) -> str:
+    return f"<code>{escape_html(token_text)}</code>"
+
+def _render_math_token(token_text: str, preamble_macros: str) -> str:
+    src = math_image_url(token_text, preamble_macros=preamble_macros)
+    alt = token_text.strip() or "math"
+    return (
+        f'<img src="{escape_html(src)}" '
+        f'alt="{escape_html(alt)}" '
+        f'class="math-inline" />'
+    )
+
+def _render_link_token(token_text: str, preamble_macros: str) -> str:
+    # token_text is "url<NULL>desc" as produced by tokenize_inline_org_markup
+    url, sep, label = token_text.partition(_NULL_SEP)
+    url = url.strip()
+    label = (label.strip() if sep else url) or url
 
-    return "".join(out)
+    if is_image_target(url):
+        # Render as image; label becomes alt (and title)
+        alt_text = label or url
+        web_url = normalize_image_src(url)
+        return (
+            f'<img src="{escape_html(web_url)}" '
+            f'alt="{escape_html(alt_text)}" '
+            f'title="{escape_html(alt_text)}" '
+            f'class="inline-image" />'
+        )
+
+    # Normal hyperlink
+    return f'<a href="{escape_html(url)}">{escape_html(label)}</a>'
+
+# token type -> renderer; unknown types fall back to escaped plain text
+_TOKEN_RENDERERS = {
+    "plaintext": _render_plain_token,
+    "bold_text": _render_bold_token,
+    "italic_text": _render_italic_token,
+    "code": _render_code_token,
+    "math_inline": _render_math_token,
+    "link": _render_link_token,
+}
+
+def _render_inline_tokens(
+    tokens: Iterable[tuple[str, str]],
+    preamble_macros: str,
+) -> str:
+    get_renderer = _TOKEN_RENDERERS.get
+    return "".join([
+        get_renderer(token_type, _render_plain_token)(token_text, preamble_macros)
+        for token_type, token_text in tokens
+    ])
+
+# Static document head; {title} and {meta} are filled in by open_html_document.
+_HTML_PROLOG_TMPL = (
+    "<!doctype html>\n"
+    "<html lang=\"en\">\n"
+    "<head>\n"
+    "  <meta charset=\"utf-8\" />\n"
+    "  <title>{title}</title>\n"
+    "  <meta name=\"viewport\" content=\"width=device-width, initial-scale=1\" />\n"
+    "{meta}"
+    '  <link rel="stylesheet" href="/static/org.css" />\n'
+    '  <script src="/static/viewer.js" defer></script>\n'
+    "</head>\n"
+    "<body>\n"
+)
 
 def open_html_document(preamble: object) -> str:
     """
@@ -516,14 +624,18 @@ def open_html_document(preamble: object) -> str:
     date_value = getattr(preamble, "date", None)
     options_value = getattr(preamble, "options", None)
 
+    author_value = author_value.strip() if isinstance(author_value, str) else ""
+    date_value = date_value.strip() if isinstance(date_value, str) else ""
+    options_value = options_value.strip() if isinstance(options_value, str) else ""
+
     meta_lines: list[str] = []
-    if isinstance(author_value, str) and author_value.strip():
-        meta_lines.append(f'  <meta name="author" content="{escape_html(author_value.strip())}" />\n')
-    if isinstance(date_value, str) and date_value.strip():
+    if author_value:
+        meta_lines.append(f'  <meta name="author" content="{escape_html(author_value)}" />\n')
+    if date_value:
         # There is no universally standard "date" meta, but it's fine to include one.
-        meta_lines.append(f'  <meta name="date" content="{escape_html(date_value.strip())}" />\n')
-    if isinstance(options_value, str) and options_value.strip():
-        meta_lines.append(f"  <!-- org-options: {escape_html(options_value.strip())} -->\n")
+        meta_lines.append(f'  <meta name="date" content="{escape_html(date_value)}" />\n')
+    if options_value:
+        meta_lines.append(f"  <!-- org-options: {escape_html(options_value)} -->\n")
 
     # Emit any additional preamble headers as x-org-* meta tags (simple + safe).
     headers = getattr(preamble, "headers", None)
@@ -536,19 +648,7 @@ def open_html_document(preamble: object) -> str:
                     f'  <meta name="x-org-{escape_html(key.strip())}" content="{escape_html(value.strip())}" />\n'
                 )
 
-    return (
-        "<!doctype html>\n"
-        "<html lang=\"en\">\n"
-        "<head>\n"
-        "  <meta charset=\"utf-8\" />\n"
-        f"  <title>{safe_title}</title>\n"
-        "  <meta name=\"viewport\" content=\"width=device-width, initial-scale=1\" />\n"
-        + "".join(meta_lines) +
-        '  <link rel="stylesheet" href="/static/org.css" />\n'
-        '  <script src="/static/viewer.js" defer></script>\n'
-        "</head>\n"
-        "<body>\n"
-    )
+    return _HTML_PROLOG_TMPL.format(title=safe_title, meta="".join(meta_lines))
 
 
 def close_html_document() -> str:
@@ -556,14 +656,20 @@ def close_html_document() -> str:
     return "</body>\n</html>\n"
 
 
+# Typical Org tag names; these need no HTML escaping.
+_SAFE_TAG_RE = re.compile(r"[A-Za-z0-9_@]+\Z").match
+
 def render_tags(tags: Optional[list[str]]) -> str:
     """Render heading tags as a small suffix."""
     if not tags:
         return ""
-    safe = ", ".join(escape_html(t) for t in tags)
+    safe = ", ".join([t if _SAFE_TAG_RE(t) else escape_html(t) for t in tags])
     return f"<span class=\"tags\">[{safe}]</span>"
 
 
+# Header-arg keys made only of these characters need no HTML escaping.
+_SAFE_ATTR_KEY_RE = re.compile(r"[A-Za-z0-9_-]+\Z").match
+
 def build_pre_attributes(event: OrgEvent) -> str:
     """
     Build HTML attributes for <pre> from block events.
@@ -578,6 +684,8 @@ def build_pre_attributes(event: OrgEvent) -> str:
     we additionally add a 'result' class:
       class="block block-example result"
     """
+    esc = escape_html
+    safe_key = _SAFE_ATTR_KEY_RE
     attrs: list[str] = []
     classes: list[str] = []
 
@@ -585,7 +693,7 @@ def build_pre_attributes(event: OrgEvent) -> str:
     name = event.data.get("name")
     if isinstance(name, str) and name:
         classes.append("block")
-        classes.append(f"block-{escape_html(name)}")
+        classes.append(f"block-{esc(name)}")
 
     # Mark “result” blocks from #+RESULTS:
     if event.data.get("is_result"):
@@ -596,22 +704,24 @@ def build_pre_attributes(event: OrgEvent) -> str:
     if isinstance(src_opts, dict):
         lang = src_opts.get("language")
         if isinstance(lang, str) and lang:
+            lang_html = esc(lang)
             # use language as an additional CSS class
-            classes.append(f"lang-{escape_html(lang)}")
+            classes.append(f"lang-{lang_html}")
 
             # keep the data-language attribute for CSS ::before + tooling
-            attrs.append(f'data-language="{escape_html(lang)}"')
+            attrs.append(f'data-language="{lang_html}"')
 
         for key, value in src_opts.items():
             if key == "language":
                 continue
             if isinstance(key, str) and isinstance(value, str):
-                attrs.append(f'data-{escape_html(key)}="{escape_html(value)}"')
+                key_html = key if safe_key(key) else esc(key)
+                attrs.append(f'data-{key_html}="{esc(value)}"')
 
     # Anchor (from #+NAME:)
     anchor = event.data.get("anchor")
     if isinstance(anchor, str) and anchor:
-        attrs.append(f'id="{escape_html(anchor)}"')
+        attrs.append(f'id="{esc(anchor)}"')
 
     # If we collected any classes, serialize them as a single class="..." attribute
     if classes:
@@ -622,54 +732,67 @@ def build_pre_attributes(event: OrgEvent) -> str:
 
 
 def flush_paragraph(paragraph_buffer: list[list[tuple[str, str]]],
-                    out: list[str],
+                    out: TextIO,
                     *,
                     preamble_macros: str = "",
                     ) -> None:
-    """Flush buffered tokenized lines as a <p>...</p>."""
+    """Flush buffered tokenized lines as a <p>...</p> into the writer `out`."""
     if not paragraph_buffer:
         return
 
-    rendered_lines: list[str] = []
-    for token_line in paragraph_buffer:
-        rendered_lines.append(render_inline_tokens(token_line, preamble_macros=preamble_macros))
+    rendered_lines = [
+        render_inline_tokens(token_line, preamble_macros=preamble_macros)
+        for token_line in paragraph_buffer
+    ]
 
     paragraph_buffer.clear()
 
     text = " ".join(s for s in rendered_lines if s.strip() != "")
     if text.strip():
-        out.append(f"<p>{text}</p>\n")
+        out.write(f"<p>{text}</p>\n")
+
+# Path part (up to the first '?' or '#') ending in an image extension.
+_IMAGE_TARGET_RE = re.compile(
+    r"[^?#]*\.(?:png|jpe?g|gif|svg|webp|bmp)(?:[?#]|\Z)",
+    re.IGNORECASE,
+)
 
 def is_image_target(url: str) -> bool:
     """
     Return True if the URL looks like an image file (by extension).
     Query string and fragment are ignored.
     """
-    # strip query and fragment
-    base = url.split("?", 1)[0].split("#", 1)[0]
-    base = base.lower()
-    return base.endswith((
-        ".png",
-        ".jpg",
-        ".jpeg",
-        ".gif",
-        ".svg",
-        ".webp",
-        ".bmp",
-    ))
+    return _IMAGE_TARGET_RE.match(url) is not None
+
 
+# Event types the body renderer treats as one group.
+_TABLE_EVENT_TYPES = frozenset({"table_row", "table_hline"})
+_BLOCK_BEGIN_EVENT_TYPES = frozenset({"block_begin", "src_begin"})
+_PRE_END_EVENT_TYPES = frozenset({"block_end", "src_end"})
 
 def render_org_to_html_body(
     input_path: Path,
     cfg: OrgReaderConfig,
+    out: Optional[TextIO] = None,
+    *,
+    on_body_start: Optional[Callable[[OrgState], None]] = None,
+    deps: Optional[list[tuple[Path, int, int]]] = None,
 ) -> tuple[OrgState, str]:
     """
     Render an Org file (with includes expanded) into HTML *body content*.
     Returns (final_state, body_html).
+
+    If `out` is given, body HTML is written there as it is produced and
+    body_html is "". `on_body_start` is called once with the state when the
+    preamble is complete, before any body HTML is written, so a caller can
+    emit the document head first.
+
+    `deps` is passed on to read_with_includes(), which records every file
+    read, so callers can cache the result (see org_reader.deps_unchanged).
     """
     state = OrgState()
 
-    html_out: list[str] = []
+    html_out = out if out is not None else io.StringIO()
     paragraph_buffer: list[list[tuple[str, str]]] = []
     inside_pre: bool = False
     pre_lines: list[str] = []
@@ -701,7 +824,15 @@ def render_org_to_html_body(
     comment_counter: int = 0
 
     latex_macros_preamble: str = ""
+    latex_macros_dirty: bool = False
 
+    def current_macros_preamble() -> str:
+        """Joined LaTeX macro lines, rebuilt only after macros were added."""
+        nonlocal latex_macros_preamble, latex_macros_dirty
+        if latex_macros_dirty:
+            latex_macros_preamble = "\n".join(state.latex_macro_lines)
+            latex_macros_dirty = False
+        return latex_macros_preamble
 
     # RESULTS handling
     results_mode: str = "none"  # "none" | "awaiting" | "collecting"
@@ -724,14 +855,30 @@ def render_org_to_html_body(
         content = "\n".join(results_lines)
         results_lines = []
 
-        html_out.append('<pre class="block result"><code>')
-        html_out.append(escape_html(content))
-        html_out.append("</code></pre>\n")
+        html_out.write('<pre class="block result"><code>')
+        html_out.write(escape_html(content))
+        html_out.write("</code></pre>\n")
 
         results_mode = "none"
 
     def flush_paragraph_here() -> None:
-        flush_paragraph(paragraph_buffer, html_out, preamble_macros=latex_macros_preamble)
+        flush_paragraph(paragraph_buffer, html_out, preamble_macros=current_macros_preamble())
+
+    def close_block_contexts() -> None:
+        """
+        Flush paragraph, lists, pre and table before a standalone block.
+        The guards are checked here so the common no-op case makes no calls.
+        """
+        if paragraph_buffer:
+            flush_paragraph_here()
+        if inside_ul:
+            close_ul_if_needed()
+        if inside_ol:
+            close_ol_if_needed()
+        if inside_pre:
+            flush_pre_if_needed()
+        if table_collecting:
+            flush_table_if_needed()
 
     def flush_pre_if_needed() -> None:
         nonlocal inside_pre, pre_lines, pre_open_event
@@ -742,7 +889,7 @@ def render_org_to_html_body(
         content = "\n".join(pre_lines)
         pre_lines = []
         attrs = build_pre_attributes(pre_open_event) if pre_open_event else ""
-        html_out.append(f"<pre{attrs}><code>{escape_html(content)}</code></pre>\n")
+        html_out.write(f"<pre{attrs}><code>{escape_html(content)}</code></pre>\n")
         inside_pre = False
         pre_open_event = None
 
@@ -753,16 +900,12 @@ def render_org_to_html_body(
             return
 
         # verse blocks are standalone (like pre/table)
-        flush_paragraph_here()
-        close_ul_if_needed()
-        close_ol_if_needed()
-        flush_pre_if_needed()
-        flush_table_if_needed()
+        close_block_contexts()
 
-        inner = render_verse_lines(verse_lines, preamble_macros=latex_macros_preamble)
+        inner = render_verse_lines(verse_lines, preamble_macros=current_macros_preamble())
 
         attrs = build_verse_attributes(verse_open_event)
-        html_out.append(f"<div{attrs}>\n{inner}\n</div>\n")
+        html_out.write(f"<div{attrs}>\n{inner}\n</div>\n")
 
         inside_verse = False
         verse_lines = []
@@ -780,65 +923,65 @@ def render_org_to_html_body(
             table_caption = None
             return
 
-        # apply formulas before rendering
-        _apply_column_formulas_to_table(table_buffer, table_tblfm)
-
-        # header detection (same rule as in manual)
-        first_hline = None
-        for i, r in enumerate(table_buffer):
-            if r.get("type") == "hline":
-                if any(rr.get("type") == "row" for rr in table_buffer[i+1:]):
-                    first_hline = i
-                    break
-
-        # determine max cols for colspan
-        max_cols = 0
-        for r in table_buffer:
-            if r.get("type") == "row":
-                max_cols = max(max_cols, len(r.get("cells", [])))
+        # shape analysis (header split + width), then formulas before rendering
+        max_cols, first_hline = _analyze_table(table_buffer)
+        _apply_column_formulas_to_table(table_buffer, table_tblfm, max_cols, first_hline)
+
+        # at least one column for the hline colspan
         max_cols = max(max_cols, 1)
 
+        macros = current_macros_preamble()
+
         def cell_html(s: str) -> str:
             # allow inline markup inside cells
-            return render_inline_tokens(tokenize_inline_org_markup(s or ""),  preamble_macros=latex_macros_preamble)
+            return render_inline_tokens(tokenize_inline_org_markup_cached(s or ""),  preamble_macros=macros)
 
         def render_row(cells: list[str], th: bool) -> str:
-            tag = "th" if th else "td"
-            inner = "".join(f"<{tag}>{cell_html(c)}</{tag}>" for c in cells)
-            return f"<tr>{inner}</tr>\n"
+            # build the tags once per row; each cell is then a single join
+            if th:
+                sep, open_tag, close_tag = "</th><th>", "<tr><th>", "</th></tr>\n"
+            else:
+                sep, open_tag, close_tag = "</td><td>", "<tr><td>", "</td></tr>\n"
+            if not cells:
+                return "<tr></tr>\n"
+            return open_tag + sep.join(map(cell_html, cells)) + close_tag
 
         # optional figure wrapper for caption
         if table_caption:
             fig_id = f' id="{escape_html(table_anchor)}"' if table_anchor else ""
-            html_out.append(f"<figure class=\"table\"{fig_id}>\n")
-            html_out.append(f"<figcaption>{render_inline_tokens(table_caption)}</figcaption>\n")
+            html_out.write(f"<figure class=\"table\"{fig_id}>\n")
+            html_out.write(f"<figcaption>{render_inline_tokens(table_caption)}</figcaption>\n")
             table_id_attr = ""
         else:
             table_id_attr = f' id="{escape_html(table_anchor)}"' if table_anchor else ""
 
-        html_out.append(f"<table{table_id_attr}>\n")
+        html_out.write(f"<table{table_id_attr}>\n")
 
         if first_hline is not None and first_hline > 0:
-            html_out.append("<thead>\n")
-            for r in table_buffer[:first_hline]:
-                if r.get("type") == "row":
-                    html_out.append(render_row(r.get("cells", []), th=True))
-            html_out.append("</thead>\n")
+            html_out.write("<thead>\n")
+            html_out.write("".join([
+                render_row(r.get("cells", []), th=True)
+                for r in table_buffer[:first_hline]
+                if r.get("type") == "row"
+            ]))
+            html_out.write("</thead>\n<tbody>\n")
             body_part = table_buffer[first_hline+1:]
         else:
+            html_out.write("<tbody>\n")
             body_part = table_buffer
 
-        html_out.append("<tbody>\n")
-        for r in body_part:
-            if r.get("type") == "hline":
-                html_out.append(f'<tr class="hline"><td colspan="{max_cols}"></td></tr>\n')
-            elif r.get("type") == "row":
-                html_out.append(render_row(r.get("cells", []), th=False))
-        html_out.append("</tbody>\n")
-        html_out.append("</table>\n")
-
-        if table_caption:
-            html_out.append("</figure>\n")
+        # one write for all body rows (the sink may be a file)
+        hline_html = f'<tr class="hline"><td colspan="{max_cols}"></td></tr>\n'
+        html_out.write("".join([
+            hline_html if r.get("type") == "hline"
+            else render_row(r.get("cells", []), th=False)
+            for r in body_part
+            if r.get("type") in ("hline", "row")
+        ]))
+        html_out.write(
+            "</tbody>\n</table>\n</figure>\n" if table_caption
+            else "</tbody>\n</table>\n"
+        )
 
         # reset
         table_collecting = False
@@ -866,7 +1009,7 @@ def render_org_to_html_body(
         if isinstance(tags, list) and heading_text.endswith(":") and " :" in heading_text:
             heading_text = heading_text.rsplit(" :", 1)[0].rstrip()
     
-        heading_tokens = tokenize_inline_org_markup(heading_text)
+        heading_tokens = tokenize_inline_org_markup_cached(heading_text)
     
         opening = f"<{tag}"
         if anchor:
@@ -874,7 +1017,7 @@ def render_org_to_html_body(
         opening += ">"
     
         return (
-            f"{opening}{render_inline_tokens(heading_tokens,  preamble_macros=latex_macros_preamble)}"
+            f"{opening}{render_inline_tokens(heading_tokens,  preamble_macros=current_macros_preamble())}"
             f"{render_tags(tags)}</{tag}>\n"
         )
 
@@ -886,7 +1029,7 @@ def render_org_to_html_body(
         """
         nonlocal inside_pre
         has_end_event = any(
-            ev.type in {"block_end", "src_end"} for ev in filtered_events
+            ev.type in _PRE_END_EVENT_TYPES for ev in filtered_events
         )
         if has_end_event:
             flush_pre_if_needed()
@@ -898,51 +1041,43 @@ def render_org_to_html_body(
     def open_ul_if_needed() -> None:
         nonlocal inside_ul
         if not inside_ul:
-            html_out.append("<ul>\n")
+            html_out.write("<ul>\n")
             inside_ul = True
 
     def close_ul_if_needed() -> None:
         nonlocal inside_ul
         if inside_ul:
-            html_out.append("</ul>\n")
+            html_out.write("</ul>\n")
             inside_ul = False
 
     def open_ol_if_needed() -> None:
         nonlocal inside_ol
         if not inside_ol:
-            html_out.append("<ol>\n")
+            html_out.write("<ol>\n")
             inside_ol = True
 
     def close_ol_if_needed() -> None:
         nonlocal inside_ol
         if inside_ol:
-            html_out.append("</ol>\n")
+            html_out.write("</ol>\n")
             inside_ol = False
 
     def open_container_block(name: str, anchor: Optional[str]) -> None:
         nonlocal inside_container, container_name, container_anchor
-        flush_paragraph_here()
-        close_ul_if_needed()
-        close_ol_if_needed()
-        flush_pre_if_needed()
-        flush_table_if_needed()
+        close_block_contexts()
 
         attrs: list[str] = [f'class="block block-{escape_html(name)}"']
         if anchor:
             attrs.append(f'id="{escape_html(anchor)}"')
-        html_out.append(f"<div {' '.join(attrs)}>\n")
+        html_out.write(f"<div {' '.join(attrs)}>\n")
         inside_container = True
         container_name = name
         container_anchor = anchor
 
     def close_container_block() -> None:
         nonlocal inside_container, container_name, container_anchor
-        flush_paragraph_here()
-        close_ul_if_needed()
-        close_ol_if_needed()
-        flush_pre_if_needed()
-        flush_table_if_needed()
-        html_out.append("</div>\n")
+        close_block_contexts()
+        html_out.write("</div>\n")
         inside_container = False
         container_name = None
         container_anchor = None
@@ -960,7 +1095,7 @@ def render_org_to_html_body(
             close_ul_if_needed()
             close_ol_if_needed()
             flush_pre_if_needed()
-            html_out.append("<table>\n")
+            html_out.write("<table>\n")
             inside_table = True
 
     def close_table_if_needed() -> None:
@@ -969,7 +1104,7 @@ def render_org_to_html_body(
         """
         nonlocal inside_table
         if inside_table:
-            html_out.append("</table>\n")
+            html_out.write("</table>\n")
             inside_table = False
 
     def render_list_item(ev: OrgEvent) -> str:
@@ -977,8 +1112,8 @@ def render_org_to_html_body(
         Render unordered list items (<ul>).
         """
         text = ev.data.get("text", "") or ""
-        tokens = tokenize_inline_org_markup(text)
-        return f"<li>{render_inline_tokens(tokens, preamble_macros=latex_macros_preamble)}</li>\n"
+        tokens = tokenize_inline_org_markup_cached(text)
+        return f"<li>{render_inline_tokens(tokens, preamble_macros=current_macros_preamble())}</li>\n"
 
     def render_ordered_list_item(ev: OrgEvent) -> str:
         """
@@ -986,19 +1121,17 @@ def render_org_to_html_body(
         We ignore the numeric index for now and let HTML handle numbering.
         """
         text = ev.data.get("text", "") or ""
-        tokens = tokenize_inline_org_markup(text)
+        tokens = tokenize_inline_org_markup_cached(text)
         return f"<li>{render_inline_tokens(tokens)}</li>\n"
 
     def unpack_link_token_value(token_text: str) -> tuple[str, str]:
         """
         For a 'link' token_text that was packed as "url<NULL>desc", return (url, desc).
         """
-        NULL_SEP = "\u0000"
-        url = token_text
-        label = token_text
-        if NULL_SEP in token_text:
-            url, label = token_text.split(NULL_SEP, 1)
-        return url.strip(), (label or "").strip()
+        url, sep, label = token_text.partition(_NULL_SEP)
+        if not sep:
+            label = url
+        return url.strip(), label.strip()
 
     def is_single_image_line(tokens: list[tuple[str, str]]) -> bool:
         """
@@ -1036,7 +1169,6 @@ def render_org_to_html_body(
             return f"<figure>{inner}</figure>\n"
 
         img_attrs = build_img_attributes(url, label, html_attrs)
-        img_html = f"<img{img_attrs} />"
 
         if anchor:
             opening = f'<figure id="{escape_html(anchor)}">'
@@ -1049,7 +1181,7 @@ def render_org_to_html_body(
         else:
             closing = "</figure>\n"
 
-        return f"{opening}{img_html}{closing}"
+        return f"{opening}<img{img_attrs} />{closing}"
 
     def render_anchored_image_figure(anchor: str, tokens: list[tuple[str, str]]) -> str:
         """
@@ -1087,12 +1219,12 @@ def render_org_to_html_body(
         noexport_counter += 1
         block_id = f"noexport-{noexport_counter}"
 
-        html_out.append(
+        html_out.write(
             render_hidden_comment_block(
                 comment_id=block_id,
                 anchor=noexport_anchor,
-                lines=list(noexport_lines),
-                preamble_macros=latex_macros_preamble,
+                lines=noexport_lines,  # rebound below, so no copy needed
+                preamble_macros=current_macros_preamble(),
                 button_label=f"Show section: {noexport_title}",
             )
         )
@@ -1121,6 +1253,16 @@ def render_org_to_html_body(
         """
         alt_text = label or url
         web_url = normalize_image_src(url)
+
+        if not html_attrs:
+            # common case: default attributes only, serialized directly
+            # (empty values are skipped, as in the general path below)
+            src_attr = f' src="{escape_html(web_url)}"' if web_url else ""
+            if alt_text:
+                alt_html = escape_html(alt_text)
+                return f'{src_attr} alt="{alt_html}" title="{alt_html}" class="inline-image"'
+            return f'{src_attr} class="inline-image"'
+
         base: dict[str, str] = {
             "src": web_url,
             "alt": alt_text,
@@ -1147,23 +1289,214 @@ def render_org_to_html_body(
                     base[key] = value
 
         # Serialize
-        parts: list[str] = []
-        for k, v in base.items():
-            if v == "":
-                continue
-            parts.append(f'{k}="{escape_html(v)}"')
+        parts = [f'{k}="{escape_html(v)}"' for k, v in base.items() if v != ""]
         return " " + " ".join(parts) if parts else ""
+    # ---------------- EVENT HANDLERS ------
+    # One handler per event type, looked up in EVENT_HANDLERS by the main
+    # loop. Each returns True when it consumed the line.
+    def on_heading(ev: OrgEvent, line: str) -> bool:
+        nonlocal anchor_pending, html_attr_pending
+        flush_paragraph_here()
+        close_ul_if_needed()
+        close_ol_if_needed()
+        flush_pre_if_needed()
+        close_table_if_needed()
+
+        # ATTR_HTML does NOT attach to headings in this simple variant
+        html_attr_pending = None
+
+        anchor_for_heading = ev.data.get("anchor") or anchor_pending
+        html_out.write(render_heading(line, ev, anchor_for_heading))
+        if anchor_for_heading:
+            anchor_pending = None
+        return True
+
+    def on_src_begin(ev: OrgEvent, line: str) -> bool:
+        nonlocal results_mode, html_attr_pending, inside_pre, pre_open_event, pre_lines
+        # src is always verbatim -> <pre>
+        if results_mode == "awaiting":
+            results_mode = "none"
+
+        flush_paragraph_here()
+        close_ul_if_needed()
+        close_ol_if_needed()
+        flush_table_if_needed()
+
+        html_attr_pending = None
+        inside_pre = True
+        pre_open_event = ev
+        pre_lines = []
+        return True
+
+    def on_block_begin(ev: OrgEvent, line: str) -> bool:
+        nonlocal results_mode, anchor_pending, html_attr_pending, caption_pending_tokens
+        nonlocal inside_pre, pre_open_event, pre_lines
+        nonlocal inside_verse, verse_open_event, verse_lines
+        ev_data = ev.data
+        name = ev_data.get("name") or ""
+        verbatim = bool(ev_data.get("verbatim"))
+
+        # results-mode tagging only makes sense for verbatim blocks
+        if results_mode == "awaiting":
+            if verbatim and name == "example":
+                ev_data["is_result"] = True
+            results_mode = "none"
+
+        # --- SPECIAL: verse ---------------------------------
+        if name == "verse":
+            # verse is standalone, like pre/table
+            close_block_contexts()
+
+            # attach anchor if it came via #+NAME (anchor_pending)
+            if not ev_data.get("anchor") and anchor_pending:
+                ev_data["anchor"] = anchor_pending
+                anchor_pending = None
+
+            html_attr_pending = None  # not used
+            caption_pending_tokens = None  # not used
+
+            inside_verse = True
+            verse_open_event = ev
+            verse_lines = []
+            return True
+        # ------------------------------------------------------
+
+        # Non-verbatim blocks become containers
+        if not verbatim:
+            anchor = ev_data.get("anchor") or anchor_pending
+            open_container_block(str(name), anchor if isinstance(anchor, str) else None)
+            if anchor:
+                anchor_pending = None
+            html_attr_pending = None
+            return True
+
+        # Verbatim block -> <pre>
+        flush_paragraph_here()
+        close_ul_if_needed()
+        close_ol_if_needed()
+        flush_table_if_needed()
+        html_attr_pending = None
+        inside_pre = True
+        pre_open_event = ev
+        pre_lines = []
+        if ev_data.get("anchor"):
+            anchor_pending = None
+        return True
+
+    def on_src_end(ev: OrgEvent, line: str) -> bool:
+        flush_pre_if_needed()
+        return True
+
+    def on_block_end(ev: OrgEvent, line: str) -> bool:
+        # If we're closing a container, close it; otherwise it’s a verbatim <pre> end.
+        name = ev.data.get("name")
+        verbatim = bool(ev.data.get("verbatim"))
+
+        if name == "verse":
+            flush_verse_if_needed()
+        elif inside_container and container_name == name and not verbatim:
+            close_container_block()
+        else:
+            flush_pre_if_needed()
+        return True
+
+    def on_list_item(ev: OrgEvent, line: str) -> bool:
+        nonlocal html_attr_pending
+        flush_paragraph_here()
+        close_ol_if_needed()
+        html_attr_pending = None   # lists don’t use it here
+        open_ul_if_needed()
+        html_out.write(render_list_item(ev))
+        return True
+
+    def on_ordered_list_item(ev: OrgEvent, line: str) -> bool:
+        nonlocal html_attr_pending
+        flush_paragraph_here()
+        close_ul_if_needed()
+        html_attr_pending = None
+        open_ol_if_needed()
+        html_out.write(render_ordered_list_item(ev))
+        return True
+
+    def on_table_row(ev: OrgEvent, line: str) -> bool:
+        open_table_if_needed()
+        cells = ev.data.get("cells") or []
+        # Render simple <td> cells; no header detection for now.
+        row_html = "</td><td>".join([escape_html(str(c)) for c in cells])
+        html_out.write(f"<tr><td>{row_html}</td></tr>\n" if cells else "<tr></tr>\n")
+        return True
+
+    def on_table_hline(ev: OrgEvent, line: str) -> bool:
+        # For now we ignore horizontal separators in HTML rendering.
+        # They still delimit tables structurally via events if needed later.
+        open_table_if_needed()
+        return True
+
+    def on_comment(ev: OrgEvent, line: str) -> bool:
+        nonlocal comment_counter
+        close_block_contexts()
+
+        anchor = ev.data.get("anchor")
+        if not isinstance(anchor, str):
+            anchor = None
+
+        if ev.type == "comment":
+            text = ev.data.get("text", "")
+            comment_lines = [str(text)]
+        else:
+            raw_lines = ev.data.get("lines", [])
+            comment_lines = [str(x) for x in raw_lines] if isinstance(raw_lines, list) else []
+
+        comment_counter += 1
+        comment_id = f"comment-{comment_counter}"
+
+        html_out.write(
+            render_hidden_comment_block(
+                comment_id=comment_id,
+                anchor=anchor,
+                lines=comment_lines,
+                preamble_macros=current_macros_preamble(),
+                button_label="Show comment",
+            )
+        )
+        return True
+
+    EVENT_HANDLERS: dict[str, Callable[[OrgEvent, str], bool]] = {
+        "heading": on_heading,
+        "src_begin": on_src_begin,
+        "block_begin": on_block_begin,
+        "src_end": on_src_end,
+        "block_end": on_block_end,
+        "list_item": on_list_item,
+        "ordered_list_item": on_ordered_list_item,
+        "table_row": on_table_row,
+        "table_hline": on_table_hline,
+        "comment": on_comment,
+        "comment_block": on_comment,
+    }
+
     #---------------------------------------
     # ---------------- MAIN LOOP -----------
-    for line in read_with_includes(input_path, cfg):
-        state, events = parse_org_line(line, cfg, state)
+    parse_line = make_line_parser(cfg)
+    write_html = html_out.write
+    get_handler = EVENT_HANDLERS.get
+    for line in read_with_includes(input_path, cfg, deps=deps):
+        state, events = parse_line(line, state)
         tblfm_here: list[str] = []
+        # blank-line test used by several branches below; isspace() does not
+        # copy the line the way strip() does
+        is_blank_line = not line or line.isspace()
+
+        # Preamble lines never emit body HTML, so the head can go first.
+        if on_body_start is not None and not state.is_in_preamble:
+            on_body_start(state)
+            on_body_start = None
 
         # --- Skip drawers completely in HTML output ----------------
         # Lines between :NAME: and :END: (including the markers) are not
         # rendered. The whole drawer is represented only by the 'drawer'
         # event for consumers that care.
-        if getattr(state, "is_inside_drawer", False):
+        if state.is_inside_drawer:
             # Currently inside a drawer (content line)
             continue
         if any(ev.type == "drawer" for ev in events):
@@ -1173,8 +1506,9 @@ def render_org_to_html_body(
         # ------------------------------------------------------------
 
 
-        stripped_for_results = line.lstrip()
-        if stripped_for_results.startswith("#+RESULTS"):
+        directive_match = _DIRECTIVE_LINE_RE.match(line)
+        is_directive_line = directive_match is not None
+        if is_directive_line and directive_match.group(1):
             # Starting a new RESULTS section.
             if results_mode == "collecting":
                 flush_results_block()
@@ -1187,44 +1521,85 @@ def render_org_to_html_body(
         current_line_tokens: list[tuple[str, str]] = [("plaintext", line)]
         filtered_events: list[OrgEvent] = []
         has_table_event: bool = False
+        # Classify the line's events in this one pass; the checks below read
+        # these flags instead of rescanning filtered_events.
+        table_events: list[OrgEvent] = []
+        heading_ev: Optional[OrgEvent] = None
+        has_block_begin: bool = False
+        has_verse_end: bool = False
+        has_pre_end: bool = False
         for ev in events:
-            if ev.type == "line_tokens":
-                maybe_tokens = ev.data.get("tokens")
+            ev_type = ev.type
+            ev_data = ev.data
+            if ev_type == "line_tokens":
+                maybe_tokens = ev_data.get("tokens")
                 if isinstance(maybe_tokens, list):
                     current_line_tokens = maybe_tokens
-            elif ev.type == "name":
-                name_val = ev.data.get("name")
+            elif ev_type == "name":
+                name_val = ev_data.get("name")
                 if isinstance(name_val, str) and name_val.strip():
                     anchor_pending = name_val.strip()
-            elif ev.type == "caption":
-                tokens = ev.data.get("tokens")
+            elif ev_type == "caption":
+                tokens = ev_data.get("tokens")
                 if isinstance(tokens, list):
                     caption_pending_tokens = tokens
-            elif ev.type == "attr_html":
-                attrs = ev.data.get("attrs")
+            elif ev_type == "attr_html":
+                attrs = ev_data.get("attrs")
                 if isinstance(attrs, dict):
                     html_attr_pending = attrs
-            elif ev.type in {"table_row", "table_hline"}:
+            elif ev_type in _TABLE_EVENT_TYPES:
                 filtered_events.append(ev)
-            elif ev.type == "tblfm":
-                parts = ev.data.get("formulas")
+                table_events.append(ev)
+                has_table_event = True
+            elif ev_type == "tblfm":
+                parts = ev_data.get("formulas")
                 if isinstance(parts, list):
                     tblfm_here.extend([str(p) for p in parts if str(p).strip()])
-            elif ev.type == "latex_macro":
-                # state already updated; only rebuild string when something was added
-                if ev.data.get("added"):
-                    latex_macros_preamble = "\n".join(getattr(state, "latex_macro_lines", []))
+            elif ev_type == "latex_macro":
+                # state already updated; the joined string is rebuilt lazily
+                # on next use, so a run of macro lines costs one join
+                if ev_data.get("added"):
+                    latex_macros_dirty = True
                 # directive line is not body content, so we just swallow it later
             else:
                 filtered_events.append(ev)
+                if ev_type == "heading":
+                    if heading_ev is None:
+                        heading_ev = ev
+                elif ev_type in _BLOCK_BEGIN_EVENT_TYPES:
+                    has_block_begin = True
+                elif ev_type in _PRE_END_EVENT_TYPES:
+                    has_pre_end = True
+                    if ev_type == "block_end" and ev_data.get("name") == "verse":
+                        has_verse_end = True
+
+        # Fast path: plain text (or blank) line with no block events, nothing
+        # pending and no special capture mode -- the common case. The slow
+        # path below would reach the same paragraph handling.
+        if (
+            not filtered_events
+            and not table_collecting
+            and not noexport_active
+            and results_mode == "none"
+            and not inside_verse
+            and not inside_pre
+            and anchor_pending is None
+            and caption_pending_tokens is None
+            and html_attr_pending is None
+            and not is_directive_line
+        ):
+            if is_blank_line:
+                close_table_if_needed()
+                flush_paragraph_here()
+            else:
+                add_paragraph_line(current_line_tokens)
+            continue
 
         if tblfm_here and table_collecting:
             table_tblfm.extend(tblfm_here)
             # do not render this directive line
             continue
 
-        table_events = [ev for ev in filtered_events if ev.type in {"table_row", "table_hline"}]
-
         if table_events and not inside_pre:
             # starting a new table?
             if not table_collecting:
@@ -1256,8 +1631,6 @@ def render_org_to_html_body(
             # continue processing current line normally
 
 
-        heading_ev = next((ev for ev in filtered_events if ev.type == "heading"), None)
-
         # --- If we're currently capturing a noexport section ----------------
         if noexport_active:
             # End capture when we hit a heading at same or higher level
@@ -1309,7 +1682,7 @@ def render_org_to_html_body(
         # If we are currently collecting RESULT-lines, swallow non-empty lines
         # into the result buffer until a blank line ends the block.
         if results_mode == "collecting":
-            if line.strip() == "":
+            if is_blank_line:
                 # Blank line ends the result block
                 flush_results_block()
                 # fall through to normal handling of this blank line
@@ -1320,10 +1693,6 @@ def render_org_to_html_body(
 
         # If we're inside a verse block, only watch for its end marker.
         if inside_verse:
-            has_verse_end = any(
-                ev.type == "block_end" and ev.data.get("name") == "verse"
-                for ev in filtered_events
-            )
             if has_verse_end:
                 flush_verse_if_needed()
                 continue
@@ -1335,10 +1704,7 @@ def render_org_to_html_body(
 
         # If we're inside a <pre> block, only watch for end events.
         if inside_pre:
-            has_end_event = any(
-                ev.type in {"block_end", "src_end"} for ev in filtered_events
-            )
-            if has_end_event:
+            if has_pre_end:
                 flush_pre_if_needed()
                 continue
 
@@ -1357,12 +1723,8 @@ def render_org_to_html_body(
         # If we are awaiting results and this line does NOT start a block,
         # we switch into "collecting" mode and treat the line as result text.
         if results_mode == "awaiting":
-            has_block_begin = any(
-                ev.type in {"block_begin", "src_begin"}
-                for ev in filtered_events
-            )
             if not has_block_begin:
-                if line.strip() == "":
+                if is_blank_line:
                     # RESULTS followed by blank -> no content, just reset
                     results_mode = "none"
                 else:
@@ -1372,185 +1734,15 @@ def render_org_to_html_body(
                     continue
 
         for ev in filtered_events:
-            if ev.type == "heading":
-                flush_paragraph_here()
-                close_ul_if_needed()
-                close_ol_if_needed()
-                flush_pre_if_needed()
-                close_table_if_needed() 
-
-                # ATTR_HTML does NOT attach to headings in this simple variant
-                html_attr_pending = None
-
-                anchor_for_heading = ev.data.get("anchor") or anchor_pending
-                html_out.append(render_heading(line, ev, anchor_for_heading))
-                if anchor_for_heading:
-                    anchor_pending = None
+            handler = get_handler(ev.type)
+            if handler is not None and handler(ev, line):
                 line_consumed = True
 
-            elif ev.type == "src_begin":
-                # src is always verbatim -> <pre>
-                if results_mode == "awaiting":
-                    results_mode = "none"
-
-                flush_paragraph_here()
-                close_ul_if_needed()
-                close_ol_if_needed()
-                flush_table_if_needed()
-
-                html_attr_pending = None
-                inside_pre = True
-                pre_open_event = ev
-                pre_lines = []
-                line_consumed = True
-
-            elif ev.type == "block_begin":
-                name = ev.data.get("name") or ""
-                verbatim = bool(ev.data.get("verbatim"))
-
-                # results-mode tagging only makes sense for verbatim blocks
-                if results_mode == "awaiting":
-                    if verbatim and name == "example":
-                        ev.data["is_result"] = True
-                    results_mode = "none"
-
-                # --- SPECIAL: verse ---------------------------------
-                if name == "verse":
-                    # verse is standalone, like pre/table
-                    flush_paragraph_here()
-                    close_ul_if_needed()
-                    close_ol_if_needed()
-                    flush_pre_if_needed()
-                    flush_table_if_needed()
-
-                    # attach anchor if it came via #+NAME (anchor_pending)
-                    if not ev.data.get("anchor") and anchor_pending:
-                        ev.data["anchor"] = anchor_pending
-                        anchor_pending = None
-
-                    html_attr_pending = None  # not used
-                    caption_pending_tokens = None  # not used
-
-                    inside_verse = True
-                    verse_open_event = ev
-                    verse_lines = []
-                    line_consumed = True
-                    continue
-                # ------------------------------------------------------
-
-                # Non-verbatim blocks become containers
-                if not verbatim:
-                    anchor = ev.data.get("anchor") or anchor_pending
-                    open_container_block(str(name), anchor if isinstance(anchor, str) else None)
-                    if anchor:
-                        anchor_pending = None
-                    html_attr_pending = None
-                    line_consumed = True
-                else:
-                    # Verbatim block -> <pre>
-                    flush_paragraph_here()
-                    close_ul_if_needed()
-                    close_ol_if_needed()
-                    flush_table_if_needed()
-                    html_attr_pending = None
-                    inside_pre = True
-                    pre_open_event = ev
-                    pre_lines = []
-                    if ev.data.get("anchor"):
-                        anchor_pending = None
-                    line_consumed = True
-
-            elif ev.type == "src_end":
-                flush_pre_if_needed()
-                line_consumed = True
-
-            elif ev.type == "block_end":
-                # If we're closing a container, close it; otherwise it’s a verbatim <pre> end.
-                name = ev.data.get("name")
-                verbatim = bool(ev.data.get("verbatim"))
-
-                if name == "verse":
-                    flush_verse_if_needed()
-                    line_consumed = True
-                    continue
-
-                if inside_container and container_name == name and not verbatim:
-                    close_container_block()
-                    line_consumed = True
-                else:
-                    flush_pre_if_needed()
-                    line_consumed = True
-
-            elif ev.type == "list_item":
-                flush_paragraph_here()
-                close_ol_if_needed()
-                html_attr_pending = None   # lists don’t use it here
-                open_ul_if_needed()
-                html_out.append(render_list_item(ev))
-                line_consumed = True
-
-            elif ev.type == "ordered_list_item":
-                flush_paragraph_here()
-                close_ul_if_needed()
-                html_attr_pending = None
-                open_ol_if_needed()
-                html_out.append(render_ordered_list_item(ev))
-                line_consumed = True
-
-            elif ev.type == "table_row":   # <-- NEW
-                open_table_if_needed()
-                cells = ev.data.get("cells") or []
-                # Render simple <td> cells; no header detection for now.
-                row_html = "".join(f"<td>{escape_html(str(c))}</td>" for c in cells)
-                html_out.append(f"<tr>{row_html}</tr>\n")
-                line_consumed = True
-
-            elif ev.type == "table_hline":  # <-- NEW
-                # For now we ignore horizontal separators in HTML rendering.
-                # They still delimit tables structurally via events if needed later.
-                open_table_if_needed()
-                line_consumed = True
-
-            elif ev.type in {"comment", "comment_block"}:
-                flush_paragraph_here()
-                close_ul_if_needed()
-                close_ol_if_needed()
-                flush_pre_if_needed()
-                flush_table_if_needed()
-
-                nonlocal_comment_lines: list[str] = []
-
-                anchor = ev.data.get("anchor")
-                if not isinstance(anchor, str):
-                    anchor = None
-
-                if ev.type == "comment":
-                    text = ev.data.get("text", "")
-                    nonlocal_comment_lines = [str(text)]
-                else:
-                    raw_lines = ev.data.get("lines", [])
-                    nonlocal_comment_lines = [str(x) for x in raw_lines] if isinstance(raw_lines, list) else []
-            
-                comment_counter += 1
-                comment_id = f"comment-{comment_counter}"
-            
-                html_out.append(
-                    render_hidden_comment_block(
-                        comment_id=comment_id,
-                        anchor=anchor,
-                        lines=nonlocal_comment_lines,
-                        preamble_macros=latex_macros_preamble,
-                        button_label="Show comment",
-                    )
-                )
-                line_consumed = True
-
-
         if line_consumed:
             continue
 
         # Ignore Org directives (#+TITLE, #+INCLUDE, #+NAME, #+CAPTION, etc.)
-        if is_org_directive_line(line):
+        if is_directive_line:
             continue
 
         # Handle image-only lines with optional anchor/caption/ATTR_HTML
@@ -1559,7 +1751,7 @@ def render_org_to_html_body(
             close_ul_if_needed()
             close_ol_if_needed()
 
-            html_out.append(
+            write_html(
                 render_image_figure(
                     tokens=current_line_tokens,
                     anchor=anchor_pending,
@@ -1574,13 +1766,16 @@ def render_org_to_html_body(
             continue
 
         # Paragraph handling
-        if line.strip() == "":
+        if is_blank_line:
             close_table_if_needed() 
             flush_paragraph_here()
             continue
 
         add_paragraph_line(current_line_tokens)
 
+    if on_body_start is not None:
+        on_body_start(state)
+
     # Final flushes
     flush_results_block()
     flush_verse_if_needed()
@@ -1591,8 +1786,7 @@ def render_org_to_html_body(
     flush_table_if_needed()
     flush_noexport_block()
 
-    body_html = "".join(html_out)
-    return state, body_html
+    return state, ("" if out is not None else html_out.getvalue())
 
 def render_org_to_html_document(
     input_path: Path,
@@ -1613,9 +1807,29 @@ def org_to_html(
     """
     Convert an Org file (with includes expanded) to a minimal HTML document
     and write it to disk.
+
+    If rendering fails (e.g. a missing include or an include cycle), an
+    existing output_path is left untouched.
     """
-    document = render_org_to_html_document(input_path, cfg)
-    output_path.write_text(document, encoding="utf-8")
+    # Stream straight to a temporary file next to the target; the head is
+    # written once the preamble (title, author, ...) is known, and the body
+    # never sits in memory whole. The target is replaced only on success.
+    partial = output_path.with_name(f".{output_path.name}.{os.getpid()}.tmp")
+    try:
+        with partial.open("w", encoding="utf-8", buffering=1 << 16) as fh:
+            render_org_to_html_body(
+                input_path,
+                cfg,
+                fh,
+                on_body_start=lambda st: fh.write(open_html_document(st.preamble)),
+            )
+            fh.write(close_html_document())
+        if output_path.exists():
+            shutil.copymode(output_path, partial)
+        os.replace(partial, output_path)
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        raise
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Convert Org (with includes) to minimal HTML.")
@@ -0,0 +1,205 @@
+# test_config_loader.py
+#
+# Run:
+#   python -m unittest -v
+
+import dataclasses
+import os
+import re
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import config_loader
+import org_reader
+from config_loader import _first_char_set, get_default_config, load_config
+from org_parser import OrgState, parse_org_line
+
+# latex_macro_re before its alternation was factored by shared prefixes.
+_ORIGINAL_LATEX_MACRO_RE = re.compile(
+    r"\\(?:def|newcommand|renewcommand|providecommand|newenvironment|renewenvironment)\b"
+)
+_LATEX_MACRO_NAMES = (
+    "def", "newcommand", "renewcommand", "providecommand", "newenvironment", "renewenvironment",
+)
+
+
+class TestClassify(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cfg = get_default_config()
+
+    def test_default_patterns_are_combined(self):
+        self.assertIsNotNone(self.cfg.combined_line_re)
+        kind, match = self.cfg.classify("#+BEGIN_SRC python")
+        self.assertEqual(kind, "block")
+        self.assertEqual(self.cfg.classified_group(match, 2), "SRC")
+
+    def test_backreference_falls_back_to_single_patterns(self):
+        # \1 would refer to a wrapper group inside the combined pattern.
+        cfg = dataclasses.replace(
+            self.cfg, drawer_begin_re=re.compile(r"^\s*(:)([A-Za-z]+)\1\s*$")
+        )
+        self.assertIsNone(cfg.combined_line_re)
+
+        kind, match = cfg.classify(":FOO:")
+        self.assertEqual(kind, "drawer_begin")
+        self.assertEqual(cfg.classified_group(match, 2), "FOO")
+
+    def test_named_group_falls_back_to_single_patterns(self):
+        # (?P<block>...) collides with the wrapper group of the same name.
+        cfg = dataclasses.replace(
+            self.cfg,
+            block_re=re.compile(r"^\s*#\+(?P<block>begin|end)_(\w+)\b\s*(.*)$", re.IGNORECASE),
+        )
+        self.assertIsNone(cfg.combined_line_re)
+
+        kind, match = cfg.classify("#+begin_src python")
+        self.assertEqual(kind, "block")
+        self.assertEqual(cfg.classified_group(match, 3), "python")
+
+    def test_fallback_keeps_pattern_order(self):
+        cfg = dataclasses.replace(
+            self.cfg, drawer_begin_re=re.compile(r"^\s*(:)([A-Za-z]+)\1\s*$")
+        )
+        for line in ("#+begin_comment", "#+INCLUDE: a.org", "#+TITLE: x", "** Head", "- item", "1. item", "prose"):
+            expected = self.cfg.classify(line)
+            got = cfg.classify(line)
+            self.assertEqual(
+                None if expected is None else expected[0],
+                None if got is None else got[0],
+                line,
+            )
+
+
+class TestLineStartChars(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def load(self, **regex: str):
+        path = Path(self.tmp.name) / "config.yml"
+        body = "".join(f"  {key}: '{value}'\n" for key, value in regex.items())
+        path.write_text(f"regex:\n{body}", encoding="utf-8")
+        return load_config(path)
+
+    def assert_classifies_like_patterns(self, cfg, lines) -> None:
+        for line in lines:
+            expected = next(
+                (name for name, pattern in cfg.line_patterns if pattern.match(line)), None
+            )
+            got = cfg.classify(line)
+            self.assertEqual(expected, None if got is None else got[0], line)
+
+    def test_default_first_chars(self):
+        self.assertEqual(
+            _first_char_set(get_default_config().unordered_list_re), {"-", "+"}
+        )
+
+    def test_leading_whitespace_disables_gate(self):
+        for source in (r"^ +[-+]\s+(.*)$", r"^[ \t]+[-+]\s+(.*)$", r"^\ [-+]\s+(.*)$"):
+            self.assertIsNone(_first_char_set(re.compile(source)), source)
+
+        cfg = self.load(unordered_list_re=r"^ +[-+]\s+(.*)$")
+        self.assertIsNone(cfg.line_start_chars)
+        self.assert_classifies_like_patterns(cfg, ["  - item", "- item", "prose"])
+        _, events = parse_org_line("  - item", cfg, OrgState(is_in_preamble=False))
+        self.assertEqual([e.type for e in events], ["list_item", "line_tokens"])
+
+    def test_optional_first_group_disables_gate(self):
+        for source in (r"^(#)?\+include\b", r"^([-+])*\s+(.*)$", r"^(#){0,1}\+include\b"):
+            self.assertIsNone(_first_char_set(re.compile(source)), source)
+        self.assertEqual(_first_char_set(re.compile(r"^(#)+\+x")), {"#"})
+
+        cfg = self.load(include_keyword=r"^(#)?\+include\b")
+        self.assertIsNone(cfg.line_start_chars)
+        self.assert_classifies_like_patterns(cfg, ["+include: a.org", "#+include: a.org", "prose"])
+
+    def test_include_with_optional_hash_is_expanded(self):
+        cfg = self.load(include_keyword=r"^(#)?\+include\b")
+        root = Path(self.tmp.name)
+        (root / "inc.org").write_text("INC\n", encoding="utf-8")
+        main = root / "main.org"
+        main.write_text("A\n+include: inc.org\n", encoding="utf-8")
+
+        self.assertEqual(list(org_reader.read_with_includes(main, cfg)), ["A", "INC"])
+
+
+class TestLoadConfigCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+        patcher = mock.patch.dict(config_loader._CONFIG_CACHE, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write(self, name: str, blocks: list[str], mtime_s: int = 1) -> Path:
+        path = self.root / name
+        body = "".join(f"  - {block}\n" for block in blocks)
+        path.write_text(f"verbatim_blocks:\n{body}", encoding="utf-8")
+        os.utime(path, ns=(mtime_s * 10**9, mtime_s * 10**9))
+        return path
+
+    def test_unchanged_file_returns_same_instance(self):
+        path = self.write("a.yml", ["src"])
+        self.assertIs(load_config(path), load_config(path))
+
+    def test_edited_file_replaces_its_entry(self):
+        path = self.write("a.yml", ["src"])
+        load_config(path)
+        path = self.write("a.yml", ["example"], mtime_s=2)
+
+        self.assertEqual(load_config(path).verbatim_blocks, frozenset({"example"}))
+        self.assertEqual(len(config_loader._CONFIG_CACHE), 1)
+
+    def test_cache_is_bounded(self):
+        paths = [self.write(f"c{i}.yml", ["src"]) for i in range(config_loader._CONFIG_CACHE_SIZE + 3)]
+        first = load_config(paths[0])
+        for path in paths[1:]:
+            load_config(path)
+
+        self.assertEqual(len(config_loader._CONFIG_CACHE), config_loader._CONFIG_CACHE_SIZE)
+        self.assertIsNot(load_config(paths[0]), first)
+
+
+class TestLatexMacroPattern(unittest.TestCase):
+    def samples(self) -> list[str]:
+        out = ["", "no macros here", "\\re", "\\new", "\\renew", "\\command", "\\newcomman"]
+        for name in _LATEX_MACRO_NAMES:
+            out += [
+                f"\\{name}",
+                f"\\{name}{{\\R}}{{x}}",
+                f"\\{name}*{{\\R}}",
+                f"  text \\{name} text",
+                f"\\{name}s",          # suffixed: no word boundary
+                f"\\{name}_x",
+                f"\\{name}1",
+                f"\\x{name}",          # prefixed
+                f"\\re{name}",
+                f"{name}",             # no backslash
+                f"\\\\{name}",
+                f"\\{name.upper()}",
+            ]
+        return out
+
+    def assert_same_as_original(self, pattern: re.Pattern) -> None:
+        for text in self.samples():
+            old = _ORIGINAL_LATEX_MACRO_RE.search(text)
+            new = pattern.search(text)
+            self.assertEqual(
+                None if old is None else old.span(),
+                None if new is None else new.span(),
+                text,
+            )
+
+    def test_default_matches_original(self):
+        self.assert_same_as_original(get_default_config().latex_macro_re)
+
+    def test_config_yml_matches_original(self):
+        cfg = load_config(Path(__file__).with_name("config.yml"))
+        self.assert_same_as_original(cfg.latex_macro_re)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
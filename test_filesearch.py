@@ -3,24 +3,30 @@
 # Run:
 #   python -m unittest -v
 #
-# This test suite is tailored to your CURRENT API:
-#   un_quote_string, resolve_include, is_include, update_block_state,
-#   should_skip_header_line, preamble_decision, read_with_includes
+# This test suite is tailored to your CURRENT API (org_reader, all taking cfg):
+#   un_quote_string, resolve_include, is_include, should_skip_header_line,
+#   preamble_decision, read_with_includes
+# Block tracking (formerly update_block_state) is OrgState.is_inside_block,
+# maintained by org_parser.parse_org_line.
 #
 # It also avoids brittle expectations about trailing blank lines: a file ending
 # with "\n" does NOT necessarily yield an extra "" line in Python iteration.
 
+import os
 import tempfile
 import unittest
 from pathlib import Path
 
-import filesearch as m  # <-- your module name
+import org_reader as m
+from config_loader import get_default_config
+from org_parser import OrgState, parse_org_line
 
 
 class TestFileSearch(unittest.TestCase):
     def setUp(self) -> None:
         self.tmp = tempfile.TemporaryDirectory()
         self.root = Path(self.tmp.name)
+        self.cfg = get_default_config()
 
     def tearDown(self) -> None:
         self.tmp.cleanup()
@@ -40,104 +46,135 @@ class TestFileSearch(unittest.TestCase):
 
     # ---------- un_quote_string ----------
     def test_un_quote_string_double_quotes(self):
-        self.assertEqual(m.un_quote_string('"file.org"'), "file.org")
+        self.assertEqual(m.un_quote_string('"file.org"', self.cfg), "file.org")
 
     def test_un_quote_string_single_quotes(self):
-        self.assertEqual(m.un_quote_string("'file.org'"), "file.org")
+        self.assertEqual(m.un_quote_string("'file.org'", self.cfg), "file.org")
 
     def test_un_quote_string_no_quotes(self):
-        self.assertEqual(m.un_quote_string("file.org"), "file.org")
+        self.assertEqual(m.un_quote_string("file.org", self.cfg), "file.org")
 
     def test_un_quote_string_keeps_inner_whitespace_but_strips_outer(self):
         # Outer quotes removed; inner whitespace preserved except for strip() after slicing
-        self.assertEqual(m.un_quote_string('"  file.org  "'), "file.org")
+        self.assertEqual(m.un_quote_string('"  file.org  "', self.cfg), "file.org")
 
     # ---------- resolve_include ----------
     def test_resolve_include_relative_without_colon(self):
         main = self.write("main.org", "")
-        resolved = m.resolve_include("#+INCLUDE child.org", main)
+        resolved = m.resolve_include("#+INCLUDE child.org", main, self.cfg)
         self.assertEqual(resolved, (self.root / "child.org").resolve())
 
     def test_resolve_include_relative_with_colon_and_quotes(self):
         main = self.write("dir/main.org", "")
-        resolved = m.resolve_include('#+INCLUDE: "child.org"', main)
+        resolved = m.resolve_include('#+INCLUDE: "child.org"', main, self.cfg)
         self.assertEqual(resolved, (self.root / "dir/child.org").resolve())
 
     def test_resolve_include_ignores_case_and_whitespace_in_line_parsing(self):
         # resolve_include itself doesn't regex-match; it assumes the line is include-ish.
         main = self.write("dir/main.org", "")
-        resolved = m.resolve_include('   #+include:   "child.org"  ', main)
+        resolved = m.resolve_include('   #+include:   "child.org"  ', main, self.cfg)
         self.assertEqual(resolved, (self.root / "dir/child.org").resolve())
 
+    def test_resolve_include_follows_retargeted_symlink(self):
+        self.write("one.org", "ONE\n")
+        self.write("two.org", "TWO\n")
+        link = self.root / "inc.org"
+        link.symlink_to("one.org")
+        main = self.write("main.org", "root\n#+INCLUDE: inc.org\n")
+        self.assertEqual(list(m.read_with_includes(main, self.cfg)), ["root", "ONE"])
+
+        link.unlink()
+        link.symlink_to("two.org")
+        self.assertEqual(list(m.read_with_includes(main, self.cfg)), ["root", "TWO"])
+
+    def test_resolve_include_relative_parent_follows_cwd(self):
+        self.write("a/main.org", "")
+        self.write("b/main.org", "")
+        cwd = os.getcwd()
+        self.addCleanup(os.chdir, cwd)
+
+        os.chdir(self.root / "a")
+        first = m.resolve_include("#+INCLUDE: inc.org", Path("main.org"), self.cfg)
+        os.chdir(self.root / "b")
+        second = m.resolve_include("#+INCLUDE: inc.org", Path("main.org"), self.cfg)
+
+        self.assertEqual(first, (self.root / "a/inc.org").resolve())
+        self.assertEqual(second, (self.root / "b/inc.org").resolve())
+
     # ---------- is_include ----------
     def test_is_include_basic(self):
-        self.assertTrue(m.is_include("#+INCLUDE foo.org"))
+        self.assertTrue(m.is_include("#+INCLUDE foo.org", self.cfg))
 
     def test_is_include_case_and_whitespace(self):
-        self.assertTrue(m.is_include("   #+include: foo.org"))
+        self.assertTrue(m.is_include("   #+include: foo.org", self.cfg))
 
     def test_is_include_non_include(self):
-        self.assertFalse(m.is_include("#+TITLE: Hello"))
-        self.assertFalse(m.is_include("not an include"))
-
-    # ---------- update_block_state ----------
-    def test_update_block_state_enters_and_leaves_example(self):
-        state = False
-        state = m.update_block_state("#+begin_example", state)
-        self.assertTrue(state)
-        state = m.update_block_state("inside", state)
-        self.assertTrue(state)
-        state = m.update_block_state("#+end_example", state)
-        self.assertFalse(state)
-
-    def test_update_block_state_enters_and_leaves_src(self):
-        state = False
-        state = m.update_block_state("  #+BEGIN_SRC python", state)
-        self.assertTrue(state)
-        state = m.update_block_state("print('hi')", state)
-        self.assertTrue(state)
-        state = m.update_block_state("  #+END_SRC", state)
-        self.assertFalse(state)
-
-    def test_update_block_state_ignores_non_verbatim_blocks(self):
-        state = False
-        state = m.update_block_state("#+begin_quote", state)
-        self.assertFalse(state)
-        state = m.update_block_state("#+end_quote", state)
-        self.assertFalse(state)
+        self.assertFalse(m.is_include("#+TITLE: Hello", self.cfg))
+        self.assertFalse(m.is_include("not an include", self.cfg))
+
+    # ---------- verbatim block state (parse_org_line) ----------
+    def verbatim_states(self, *lines: str) -> list[bool]:
+        """
+        Feed `lines` through parse_org_line and return, after each line,
+        whether the parser is inside a verbatim block.
+        """
+        state = OrgState()
+        out = []
+        for line in lines:
+            state, _ = parse_org_line(line, self.cfg, state)
+            out.append(state.is_inside_verbatim_block)
+        return out
+
+    def test_verbatim_state_enters_and_leaves_example(self):
+        self.assertEqual(
+            self.verbatim_states("#+begin_example", "inside", "#+end_example"),
+            [True, True, False],
+        )
+
+    def test_verbatim_state_enters_and_leaves_src(self):
+        self.assertEqual(
+            self.verbatim_states("  #+BEGIN_SRC python", "print('hi')", "  #+END_SRC"),
+            [True, True, False],
+        )
+
+    def test_verbatim_state_ignores_non_verbatim_blocks(self):
+        self.assertEqual(
+            self.verbatim_states("#+begin_center", "#+end_center"),
+            [False, False],
+        )
 
     # ---------- should_skip_header_line ----------
     def test_should_skip_header_line_true(self):
-        self.assertTrue(m.should_skip_header_line("#+TITLE: X"))
-        self.assertTrue(m.should_skip_header_line("  #+author: Y"))
-        self.assertTrue(m.should_skip_header_line("#+OPTIONS: toc:nil"))
-        self.assertTrue(m.should_skip_header_line("#+DATE: 2025-01-01"))
+        self.assertTrue(m.should_skip_header_line("#+TITLE: X", self.cfg))
+        self.assertTrue(m.should_skip_header_line("  #+author: Y", self.cfg))
+        self.assertTrue(m.should_skip_header_line("#+OPTIONS: toc:nil", self.cfg))
+        self.assertTrue(m.should_skip_header_line("#+DATE: 2025-01-01", self.cfg))
 
     def test_should_skip_header_line_false(self):
-        self.assertFalse(m.should_skip_header_line("#+LANGUAGE: de"))
-        self.assertFalse(m.should_skip_header_line("#+PROPERTY: header-args :results output"))
-        self.assertFalse(m.should_skip_header_line("not a header line"))
-        self.assertFalse(m.should_skip_header_line("#+TITLE"))  # missing ':' => not a keyword line
+        self.assertFalse(m.should_skip_header_line("#+LANGUAGE: de", self.cfg))
+        self.assertFalse(m.should_skip_header_line("#+PROPERTY: header-args :results output", self.cfg))
+        self.assertFalse(m.should_skip_header_line("not a header line", self.cfg))
+        self.assertFalse(m.should_skip_header_line("#+TITLE", self.cfg))  # missing ':' => not a keyword line
 
     # ---------- preamble_decision ----------
     def test_preamble_decision_blank_line(self):
-        skip, still = m.preamble_decision("")
+        skip, still = m.preamble_decision("", self.cfg)
         self.assertTrue(skip)
         self.assertTrue(still)
 
     def test_preamble_decision_skippable_header_line(self):
-        skip, still = m.preamble_decision("#+TITLE: Hello")
+        skip, still = m.preamble_decision("#+TITLE: Hello", self.cfg)
         self.assertTrue(skip)
         self.assertTrue(still)
 
     def test_preamble_decision_first_content_ends_preamble(self):
-        skip, still = m.preamble_decision("* Heading")
+        skip, still = m.preamble_decision("* Heading", self.cfg)
         self.assertFalse(skip)
         self.assertFalse(still)
 
     def test_preamble_decision_non_skipped_header_ends_preamble(self):
         # By design: a non-skipped #+KEY: line counts as "content start"
-        skip, still = m.preamble_decision("#+LANGUAGE: de")
+        skip, still = m.preamble_decision("#+LANGUAGE: de", self.cfg)
         self.assertFalse(skip)
         self.assertFalse(still)
 
@@ -180,7 +217,7 @@ class TestFileSearch(unittest.TestCase):
             ]) + "\n",
         )
 
-        got = list(m.read_with_includes(main))
+        got = list(m.read_with_includes(main, self.cfg))
 
         # No trailing "" expectations; just actual yielded lines.
         expected = [
@@ -207,7 +244,7 @@ class TestFileSearch(unittest.TestCase):
             ]) + "\n",
         )
 
-        got = list(m.read_with_includes(main))
+        got = list(m.read_with_includes(main, self.cfg))
         expected = [
             "TOP",
             "#+begin_example",
@@ -231,7 +268,7 @@ class TestFileSearch(unittest.TestCase):
         )
         main = self.write("main.org", "#+INCLUDE: inc.org\n")
 
-        got = list(m.read_with_includes(main))
+        got = list(m.read_with_includes(main, self.cfg))
         expected = [
             "#+LANGUAGE: de (not skipped; ends preamble and is yielded)",
             "#+AUTHOR: Inc author (now content; should be yielded)",
@@ -253,7 +290,7 @@ class TestFileSearch(unittest.TestCase):
         )
         main = self.write("main.org", "#+INCLUDE: inc.org\n")
 
-        got = list(m.read_with_includes(main))
+        got = list(m.read_with_includes(main, self.cfg))
         expected = [
             "L1",
             "",    # body blank line preserved
@@ -261,6 +298,42 @@ class TestFileSearch(unittest.TestCase):
         ]
         self.assertEqual(got, expected)
 
+    def test_read_with_includes_raises_on_include_cycle(self):
+        # a -> b -> a must terminate instead of recursing forever.
+        self.write("b.org", "B-L1\n#+INCLUDE: a.org\n")
+        main = self.write("a.org", "A-L1\n#+INCLUDE: b.org\n")
+
+        with self.assertRaises(ValueError):
+            list(m.read_with_includes(main, self.cfg))
+
+    def test_read_with_includes_expands_diamond_includes_each_time(self):
+        # main -> left, right; both include leaf. Not a cycle: leaf's
+        # content appears once per include.
+        self.write("leaf.org", "LEAF\n")
+        self.write("left.org", "LEFT\n#+INCLUDE: leaf.org\n")
+        self.write("right.org", "RIGHT\n#+INCLUDE: leaf.org\n")
+        main = self.write(
+            "main.org",
+            "#+INCLUDE: left.org\n#+INCLUDE: right.org\n",
+        )
+
+        got = list(m.read_with_includes(main, self.cfg))
+        self.assertEqual(got, ["LEFT", "LEAF", "RIGHT", "LEAF"])
+
+    # ---------- expand_to_list ----------
+    def test_expand_to_list_matches_read_with_includes(self):
+        self.write("sub/inc.org", "#+TITLE: Inc\n\nINC\n#+BEGIN_SRC sh\n#+INCLUDE: x.org\n#+END_SRC\n")
+        main = self.write(
+            "main.org",
+            "#+TITLE: Main\n\nA\n#+INCLUDE: sub/inc.org\n\nB\n#+INCLUDE: sub/inc.org\n",
+        )
+
+        got = m.expand_to_list(main, self.cfg)
+        self.assertIsInstance(got, list)
+        self.assertEqual(got, list(m.read_with_includes(main, self.cfg)))
+        # Served from the include cache the second time round
+        self.assertEqual(m.expand_to_list(main, self.cfg), got)
+
 
 if __name__ == "__main__":
     unittest.main(verbosity=2)
@@ -0,0 +1,362 @@
+# test_math_renderer.py
+#
+# Run:
+#   python -m unittest -v
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import math_renderer as m
+
+
+# Stand-ins for the TeX tools, put first on PATH by StubTexTestCase.
+#
+# latex: reads the document from <job>.tex (one-shot) or stdin (-jobname=,
+# warm process), fails on "\fail" or a missing \end{document}, and writes
+# the fragments as JSON to <job>.dvi plus a .log and .aux.
+# dvisvgm: writes one <stem>-<page>.svg per fragment with the page number
+# zero-padded to the page count, like dvisvgm's %p; fails on "\dvifail".
+# Both append "<tool> <event> <job>" lines to $STUB_LOG.
+_STUB_LATEX = r"""
+import json, os, re, sys
+args = sys.argv[1:]
+jobs = [a.split("=", 1)[1] for a in args if a.startswith("-jobname=")]
+if args and args[-1].endswith(".tex"):
+    job = jobs[0] if jobs else args[-1][:-4]
+    text = open(args[-1], encoding="utf-8").read()
+else:
+    job = jobs[0]
+    with open(os.environ["STUB_LOG"], "a") as log:
+        log.write(f"latex start {job}\n")
+    text = sys.stdin.read()
+if "\\fail" in text or "\\end{document}" not in text:
+    sys.exit(1)
+frags = re.findall(r"\\begin\{orgmath\}\$(.*?)\$\\end\{orgmath\}", text)
+for ext in (".log", ".aux"):
+    open(job + ext, "w").close()
+with open(job + ".dvi", "w", encoding="utf-8") as f:
+    json.dump(frags, f)
+with open(os.environ["STUB_LOG"], "a") as log:
+    log.write(f"latex done {job}\n")
+"""
+
+_STUB_DVISVGM = r"""
+import json, os, sys
+args = sys.argv[1:]
+pattern = args[args.index("-o") + 1]
+dvi = args[-1]
+frags = json.load(open(dvi, encoding="utf-8"))
+if any("\\dvifail" in f for f in frags):
+    sys.exit(1)
+width = len(str(len(frags)))
+for no, frag in enumerate(frags, start=1):
+    with open(pattern.replace("%p", str(no).zfill(width)), "w", encoding="utf-8") as f:
+        f.write(f"<svg>{frag}</svg>")
+with open(os.environ["STUB_LOG"], "a") as log:
+    log.write(f"dvisvgm done {os.path.basename(dvi)[:-4]}\n")
+"""
+
+
+class StubTexTestCase(unittest.TestCase):
+    """
+    Runs math_renderer against the stub tools with fresh module state and
+    a private warm-process daemon.
+    """
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        root = Path(self.tmp.name)
+        bin_dir = root / "bin"
+        bin_dir.mkdir()
+        for name, source in (("latex", _STUB_LATEX), ("dvisvgm", _STUB_DVISVGM)):
+            script = bin_dir / name
+            script.write_text(f"#!{sys.executable}\n{source}", encoding="utf-8")
+            script.chmod(0o755)
+        self.log = root / "stub.log"
+        self.log.touch()
+        self.out = root / "out"
+
+        env = {
+            # Only the stubs: no pdftex, so no preamble formats are built.
+            "PATH": str(bin_dir),
+            "XDG_CACHE_HOME": str(root / "cache"),
+            "STUB_LOG": str(self.log),
+        }
+        self.daemon = m._LatexDaemon()
+        self.addCleanup(self.daemon.shutdown)
+        for patcher in (
+            mock.patch.dict("os.environ", env),
+            mock.patch.dict(m._USER_CACHE_DIRS, clear=True),
+            mock.patch.dict(m._FORMATS, clear=True),
+            mock.patch.dict(m._FORMAT_BUILD_LOCKS, clear=True),
+            mock.patch.dict(m._RENDERED, clear=True),
+            mock.patch.object(m, "_DAEMON", self.daemon),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def log_lines(self) -> list[str]:
+        return self.log.read_text().splitlines()
+
+    def scratch_files(self) -> list[str]:
+        return sorted(p.name for p in m._SCRATCH_DIR.iterdir())
+
+
+class TestUserCacheDir(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        m._USER_CACHE_DIRS.clear()
+        self.addCleanup(m._USER_CACHE_DIRS.clear)
+
+    def test_created_under_xdg_cache_home(self):
+        with mock.patch.dict("os.environ", {"XDG_CACHE_HOME": self.tmp.name}):
+            cache_dir = m._user_cache_dir("dvisvgm")
+        self.assertEqual(cache_dir, Path(self.tmp.name) / "org-parser" / "dvisvgm")
+        self.assertTrue(cache_dir.is_dir())
+        self.assertIn(f"--cache={cache_dir}", m._dvisvgm_argv(Path("job.dvi")))
+
+    def test_unwritable_home_disables_the_cache(self):
+        env = {"XDG_CACHE_HOME": "", "HOME": "/proc/nohome"}
+        with mock.patch.dict("os.environ", env):
+            self.assertIsNone(m._user_cache_dir("dvisvgm"))
+            argv = m._dvisvgm_argv(Path("job.dvi"))
+        self.assertFalse(any(arg.startswith("--cache") for arg in argv))
+
+    def test_unwritable_home_disables_preamble_formats(self):
+        env = {"XDG_CACHE_HOME": "", "HOME": "/proc/nohome"}
+        with mock.patch.dict("os.environ", env), mock.patch.dict(m._FORMATS, clear=True):
+            self.assertIsNone(m._ensure_preamble_format(r"\newcommand{\R}{x}"))
+
+
+class TestPreambleFormatCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.fmt_dir = Path(self.tmp.name) / "fmts"
+        self.fmt_dir.mkdir()
+        for patcher in (
+            mock.patch.object(m, "_user_cache_dir", lambda name: self.fmt_dir),
+            mock.patch.object(m, "_build_format", self.fake_build),
+            mock.patch.object(m, "_format_works", lambda fmt_path: True),
+            mock.patch.dict(m._FORMATS, clear=True),
+            mock.patch.dict(m._FORMAT_BUILD_LOCKS, clear=True),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.built: list[Path] = []
+
+    def fake_build(self, header: str, fmt_path: Path) -> bool:
+        fmt_path.write_bytes(b"fmt")
+        self.built.append(fmt_path)
+        return True
+
+    def test_building_evicts_least_recently_used_formats(self):
+        for i in range(m._FORMATS_KEEP + 4):
+            old = self.fmt_dir / f"old{i:02}.fmt"
+            old.write_bytes(b"fmt")
+            os.utime(old, ns=(i * 10**9, i * 10**9))
+
+        fmt_path = m._ensure_preamble_format(r"\newcommand{\R}{x}")
+
+        remaining = sorted(p.name for p in self.fmt_dir.glob("*.fmt"))
+        self.assertEqual(len(remaining), m._FORMATS_KEEP)
+        self.assertIn(fmt_path.name, remaining)
+        self.assertNotIn("old04.fmt", remaining)  # oldest ones went first
+        self.assertIn("old19.fmt", remaining)
+
+    def test_rebuilds_a_format_deleted_by_another_process(self):
+        fmt_path = m._ensure_preamble_format("")
+        self.assertEqual(m._ensure_preamble_format(""), fmt_path)
+        self.assertEqual(len(self.built), 1)
+
+        fmt_path.unlink()
+        self.assertEqual(m._ensure_preamble_format(""), fmt_path)
+        self.assertEqual(len(self.built), 2)
+        self.assertTrue(fmt_path.exists())
+
+
+    def test_builds_for_other_preambles_do_not_wait(self):
+        first_building = threading.Event()
+        release_first = threading.Event()
+
+        def slow_build(header: str, fmt_path: Path) -> bool:
+            if r"\slow" in header:
+                first_building.set()
+                self.assertTrue(release_first.wait(5))
+            return self.fake_build(header, fmt_path)
+
+        with mock.patch.object(m, "_build_format", slow_build):
+            slow = threading.Thread(target=m._ensure_preamble_format, args=(r"\slow",))
+            slow.start()
+            self.assertTrue(first_building.wait(5))
+            try:
+                # Neither a different nor a cached preamble waits for the build.
+                fast = threading.Thread(
+                    target=lambda: [m._ensure_preamble_format("% fast") for _ in range(2)]
+                )
+                fast.start()
+                fast.join(2)
+                self.assertFalse(fast.is_alive())
+            finally:
+                release_first.set()
+                slow.join()
+        self.assertEqual(len(self.built), 2)
+
+    def test_concurrent_requests_build_a_format_once(self):
+        barrier = threading.Barrier(4)
+        results: list[Path] = []
+
+        def request() -> None:
+            barrier.wait()
+            results.append(m._ensure_preamble_format("% shared"))
+
+        threads = [threading.Thread(target=request) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.built), 1)
+        self.assertEqual(set(results), {self.built[0]})
+
+class TestRenderMathBatch(StubTexTestCase):
+    def latex_runs(self) -> int:
+        return sum(line.startswith("latex done") for line in self.log_lines())
+
+    def test_pages_go_to_their_targets(self):
+        # 12 pages: dvisvgm zero-pads %p to two digits.
+        frags = [(f"x_{{{i}}}", self.out / f"f{i}.svg") for i in range(12)]
+        with mock.patch("os.cpu_count", return_value=1):
+            m.render_math_batch(frags)
+
+        self.assertEqual(self.latex_runs(), 1)
+        for src, out_path in frags:
+            self.assertEqual(out_path.read_text(), f"<svg>{src}</svg>")
+        self.assertEqual(self.scratch_files(), [])
+
+    def test_chunks_render_concurrently_into_the_right_targets(self):
+        frags = [(f"y{i}", self.out / f"g{i}.svg") for i in range(7)]
+        with mock.patch("os.cpu_count", return_value=3):
+            m.render_math_batch(frags, preamble_macros="% shared")
+
+        self.assertEqual(self.latex_runs(), 3)
+        for src, out_path in frags:
+            self.assertEqual(out_path.read_text(), f"<svg>{src}</svg>")
+        self.assertEqual(self.scratch_files(), [])
+
+    def test_latex_failure_propagates_and_cleans_up(self):
+        with self.assertRaises(subprocess.CalledProcessError):
+            m.render_math_batch([("ok", self.out / "ok.svg"), (r"\fail", self.out / "bad.svg")])
+        self.assertFalse((self.out / "ok.svg").exists())
+        self.assertEqual(self.scratch_files(), [])
+
+    def test_dvisvgm_failure_propagates_and_cleans_up(self):
+        with self.assertRaises(subprocess.CalledProcessError):
+            m.render_math_to_svg(r"\dvifail", self.out / "bad.svg")
+        self.assertEqual(self.scratch_files(), [])
+
+    def test_failed_chunk_does_not_stop_the_others(self):
+        frags = [("a", self.out / "a.svg"), (r"\fail", self.out / "b.svg"), ("c", self.out / "c.svg")]
+        with mock.patch("os.cpu_count", return_value=3):
+            with self.assertRaises(subprocess.CalledProcessError):
+                m.render_math_batch(frags)
+        self.assertTrue((self.out / "a.svg").exists())
+        self.assertTrue((self.out / "c.svg").exists())
+        self.assertEqual(self.scratch_files(), [])
+
+    def test_identical_fragments_are_rendered_once_per_process(self):
+        m.render_math_to_svg("z", self.out / "z.svg", preamble_macros="% m")
+        m.render_math_to_svg("z", self.out / "z.svg", preamble_macros="% m")
+        m.render_math_to_svg("z", self.out / "copy.svg", preamble_macros="% m")
+        self.assertEqual(self.latex_runs(), 1)
+        self.assertEqual((self.out / "copy.svg").read_text(), "<svg>z</svg>")
+
+        # Other macros are a different fragment; a deleted target re-renders.
+        m.render_math_to_svg("z", self.out / "z2.svg", preamble_macros="% other")
+        (self.out / "z.svg").unlink()
+        m.render_math_to_svg("z", self.out / "z.svg", preamble_macros="% m")
+        self.assertEqual(self.latex_runs(), 3)
+        self.assertTrue((self.out / "z.svg").exists())
+
+
+    def test_recreates_an_output_directory_removed_between_renders(self):
+        m.render_math_to_svg("a", self.out / "a.svg")
+        shutil.rmtree(self.out)
+
+        m.render_math_to_svg("b", self.out / "b.svg")
+        self.assertEqual((self.out / "b.svg").read_text(), "<svg>b</svg>")
+
+class TestWarmLatex(StubTexTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        patcher = mock.patch.object(m, "WARM_LATEX", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_render_leaves_a_spare_that_the_next_render_uses(self):
+        m.render_math_to_svg("a", self.out / "a.svg", preamble_macros="% m")
+        self.assertEqual((self.out / "a.svg").read_text(), "<svg>a</svg>")
+        spare = self.daemon._jobname
+        self.assertIsNotNone(self.daemon._proc)
+
+        m.render_math_to_svg("b", self.out / "b.svg", preamble_macros="% m")
+        self.assertEqual((self.out / "b.svg").read_text(), "<svg>b</svg>")
+        self.assertIn(f"latex done {spare}", self.log_lines())
+
+    def test_spare_for_other_macros_is_discarded(self):
+        m.render_math_to_svg("a", self.out / "a.svg", preamble_macros="% one")
+        spare = self.daemon._jobname
+
+        m.render_math_to_svg("b", self.out / "b.svg", preamble_macros="% two")
+        self.assertEqual((self.out / "b.svg").read_text(), "<svg>b</svg>")
+        self.assertNotIn(f"latex done {spare}", self.log_lines())
+        self.assertEqual(self.daemon._macros, "% two")
+
+    def test_processes_are_started_outside_the_lock(self):
+        held = []
+        document_start = m._document_start
+
+        def checking_document_start(macros):
+            held.append(self.daemon._lock.locked())
+            return document_start(macros)
+
+        with mock.patch.object(m, "_document_start", checking_document_start):
+            m.render_math_to_svg("a", self.out / "a.svg")
+            m.render_math_to_svg("b", self.out / "b.svg")
+        self.assertTrue(held)
+        self.assertFalse(any(held))
+
+    def test_latex_failure_raises_and_cleans_up(self):
+        with self.assertRaises(subprocess.CalledProcessError):
+            m.render_math_to_svg(r"\fail", self.out / "bad.svg")
+        self.assertFalse((self.out / "bad.svg").exists())
+        self.assertIsNone(self.daemon._proc)  # no spare after a failed job
+        self.assertEqual(self.scratch_files(), [])
+
+    def test_shutdown_kills_the_spare(self):
+        m.render_math_to_svg("a", self.out / "a.svg")
+        proc = self.daemon._proc
+        self.daemon.shutdown()
+        self.assertIsNotNone(proc.poll())
+        self.assertEqual(self.scratch_files(), [])
+
+
+class TestWarmLatexDisabled(StubTexTestCase):
+    def test_off_by_default_renders_one_shot(self):
+        with mock.patch.object(m, "WARM_LATEX", False):
+            m.render_math_to_svg("a", self.out / "a.svg")
+        self.assertEqual((self.out / "a.svg").read_text(), "<svg>a</svg>")
+        self.assertIsNone(self.daemon._proc)
+        self.assertFalse(any(line.startswith("latex start") for line in self.log_lines()))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
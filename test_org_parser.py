@@ -0,0 +1,112 @@
+# test_org_parser.py
+#
+# Run:
+#   python -m unittest -v
+
+import dataclasses
+import re
+import unittest
+
+from config_loader import get_default_config
+from org_parser import OrgState, parse_org_document, parse_org_line
+
+# Exercises every path of parse_org_document(): preamble, the plain-line
+# shortcut, and lines it must hand to the full parser.
+_DOCUMENT = """\
+#+TITLE: Sample
+#+AUTHOR: Someone
+#+OPTIONS: toc:nil
+
+Intro paragraph with *bold* and /italic/ text.
+  indented prose, ~code~ and =verbatim=
+* Heading one :tag1:tag2:
+Some text under the heading.
+#+NAME: tbl
+#+CAPTION: A *table*
+#+ATTR_HTML: :class wide
+| a | b |
+|---+---|
+| 1 | 2 |
+#+TBLFM: $2=$1*2
+- first item
+- second item
+  continuation line
+1. ordered one
+2. ordered two
+# single-line comment
+#+BEGIN_COMMENT
+* not a heading
+| not | a table |
+#+END_COMMENT
+:PROPERTIES:
+:ID: abc
+- not a list item
+:END:
+#+BEGIN_SRC python :results output
+def f():
+    # inline comment
+    return 1
+#+END_SRC
+#+BEGIN_EXAMPLE
+* heading-like line
+#+END_EXAMPLE
+#+BEGIN_CENTER
+centered *text*
+#+BEGIN_QUOTE
+nested quote
+#+END_QUOTE
+#+END_CENTER
+#+LATEX_HEADER: \\newcommand{\\R}{\\mathbb{R}}
+** Heading two
+Trailing prose.
+
+:not a drawer
+|incomplete
+"""
+
+
+class TestParseOrgDocument(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cfg = get_default_config()
+        self.lines = _DOCUMENT.splitlines()
+
+    def per_line(self, cfg) -> tuple[OrgState, list[list]]:
+        state = OrgState()
+        all_events = []
+        for line in self.lines:
+            state, events = parse_org_line(line, cfg, state)
+            all_events.append(events)
+        return state, all_events
+
+    def assert_same_as_per_line(self, cfg) -> None:
+        expected_state, expected_events = self.per_line(cfg)
+        state, events = parse_org_document(self.lines, cfg)
+
+        self.assertEqual(len(events), len(self.lines))
+        for line, want, got in zip(self.lines, expected_events, events):
+            self.assertEqual(want, got, line)
+        self.assertEqual(expected_state, state)
+
+    def test_matches_parse_org_line(self):
+        self.assert_same_as_per_line(self.cfg)
+
+    def test_matches_parse_org_line_without_combined_pattern(self):
+        # A backreference disables the combined pattern and the fast path.
+        cfg = dataclasses.replace(
+            self.cfg, drawer_begin_re=re.compile(r"^\s*(:)([A-Za-z]+)\1\s*$")
+        )
+        self.assertIsNone(cfg.combined_line_re)
+        self.assert_same_as_per_line(cfg)
+
+    def test_continues_from_given_state(self):
+        split = self.lines.index("#+BEGIN_SRC python :results output") + 1
+        state, head = parse_org_document(self.lines[:split], self.cfg)
+        state, tail = parse_org_document(self.lines[split:], self.cfg, state)
+
+        expected_state, expected_events = self.per_line(self.cfg)
+        self.assertEqual(head + tail, expected_events)
+        self.assertEqual(expected_state, state)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,80 @@
+# test_org_to_html.py
+#
+# Run:
+#   python -m unittest -v
+
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import org_to_html as m
+from config_loader import get_default_config
+
+
+class TestMathImageUrl(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = Path(self.tmp.name)
+        patcher = mock.patch.object(m, "MATH_CACHE", self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_writes_tex_source_named_by_digest(self):
+        url = m.math_image_url("x^2", preamble_macros=r"\newcommand{\R}{x}")
+        digest = url[len("/math/"):-len(".svg")]
+        self.assertEqual(len(digest), 40)
+
+        tex = (self.cache / f"{digest}.tex").read_text(encoding="utf-8")
+        self.assertEqual(
+            tex,
+            "%% org-math-cache-v1\n%% macros\n\\newcommand{\\R}{x}\n%% math\nx^2\n",
+        )
+
+    def test_recreates_tex_source_after_cache_wipe(self):
+        url = m.math_image_url("a+b")
+        tex_path = self.cache / (url[len("/math/"):-len(".svg")] + ".tex")
+        tex_path.unlink()
+
+        self.assertEqual(m.math_image_url("a+b"), url)
+        self.assertTrue(tex_path.exists())
+
+
+class TestOrgToHtmlFile(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+        self.out = self.root / "out.html"
+        self.cfg = get_default_config()
+
+    def test_writes_complete_document(self):
+        src = self.root / "main.org"
+        src.write_text("#+TITLE: T\n\nHello\n", encoding="utf-8")
+
+        m.org_to_html(src, self.out, self.cfg)
+
+        html = self.out.read_text(encoding="utf-8")
+        self.assertIn("<title>T</title>", html)
+        self.assertIn("Hello", html)
+        self.assertTrue(html.rstrip().endswith("</html>"))
+        self.assertEqual([p.name for p in self.root.iterdir() if p.name.endswith(".tmp")], [])
+
+    def test_failed_render_keeps_previous_output(self):
+        (self.root / "b.org").write_text("#+INCLUDE: a.org\n", encoding="utf-8")
+        src = self.root / "a.org"
+        src.write_text("A\n#+INCLUDE: b.org\n", encoding="utf-8")
+        self.out.write_text("previous", encoding="utf-8")
+
+        with self.assertRaises(ValueError):
+            m.org_to_html(src, self.out, self.cfg)
+
+        self.assertEqual(self.out.read_text(encoding="utf-8"), "previous")
+        self.assertEqual([p.name for p in self.root.iterdir() if p.name.endswith(".tmp")], [])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -1,17 +1,23 @@
 #!/usr/bin/env python3
 from __future__ import annotations
+from collections import OrderedDict
 from hashlib import sha1
+import os
 from pathlib import Path
-from typing import Iterable
+from typing import Iterable, Iterator
 
 from dataclasses import dataclass, field
+from functools import lru_cache
 from urllib.parse import quote
 import html as _html
+import io
+import re
 
-from flask import Flask, abort, render_template_string, send_from_directory
+from flask import Flask, Response, abort, request, send_from_directory
 
 from math_renderer import render_math_to_svg
 from config_loader import load_config
+from org_reader import deps_unchanged
 from org_to_html import render_org_to_html_body
 
 BASE_DIR = Path.cwd()
@@ -19,12 +25,63 @@ CONFIG_PATH = BASE_DIR / "config.yml"
 ORG_DIR = BASE_DIR / "org"
 README_PATH = (BASE_DIR / "README.org").resolve()
 
+# Name of a math image: the 40 hex digits of its digest
+_HEX40_RE = re.compile(r"[0-9a-f]{40}")
+# Math images are content-addressed: one URL never serves different bytes
+_MATH_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
 MATH_CACHE = BASE_DIR / ".math-cache"
 MATH_CACHE.mkdir(exist_ok=True)
 
 app = Flask(__name__, static_folder="static", static_url_path="/static")
 cfg = load_config(CONFIG_PATH)
 
+# Resolved org path -> (deps, math sources, title, body_html) of its last
+# rendering. An entry is reused while every file it was read from is
+# unchanged on disk and the .math-cache sources its math images are
+# rendered from still exist (rendering the page is what writes them).
+_VIEW_CACHE: OrderedDict[
+    Path, tuple[tuple[tuple[Path, int, int], ...], tuple[Path, ...], str | None, str]
+] = OrderedDict()
+_VIEW_CACHE_SIZE = 64
+
+# Math image URLs as written by org_to_html.math_image_url()
+_MATH_URL_RE = re.compile(r"/math/([0-9a-f]{40})\.svg")
+
+
+def _render_body_cached(org_path: Path) -> tuple[str | None, str]:
+    """
+    Return (preamble title, body_html) for an org file, re-rendering only
+    when the file or one of its includes changed, or a math source of the
+    page was removed from .math-cache.
+    """
+    entry = _VIEW_CACHE.get(org_path)
+    if (
+        entry is not None
+        and deps_unchanged(entry[0])
+        and all(tex.exists() for tex in entry[1])
+    ):
+        try:
+            _VIEW_CACHE.move_to_end(org_path)
+        except KeyError:  # evicted by another request meanwhile
+            pass
+        return entry[2], entry[3]
+
+    deps: list[tuple[Path, int, int]] = []
+    state, body_html = render_org_to_html_body(org_path, cfg, deps=deps)
+    title = state.preamble.title
+    math_sources = tuple(
+        MATH_CACHE / f"{digest}.tex" for digest in dict.fromkeys(_MATH_URL_RE.findall(body_html))
+    )
+    _VIEW_CACHE[org_path] = (tuple(deps), math_sources, title, body_html)
+    try:
+        _VIEW_CACHE.move_to_end(org_path)
+        while len(_VIEW_CACHE) > _VIEW_CACHE_SIZE:
+            _VIEW_CACHE.popitem(last=False)
+    except KeyError:  # concurrent eviction by another request
+        pass
+    return title, body_html
+
 
 LAYOUT_TEMPLATE = """
 <!doctype html>
@@ -68,7 +125,26 @@ LAYOUT_TEMPLATE = """
 </html>
 """
 
-@dataclass
+# The page body is not passed through Jinja: render_layout() renders the part
+# before it and sends head, body and tail as separate chunks, so a large
+# document is not copied into one more full-page string per request.
+# (Jinja drops the template's single trailing newline; so does the tail.)
+_LAYOUT_HEAD_TEMPLATE, _LAYOUT_TAIL = LAYOUT_TEMPLATE.split("{{ content|safe }}")
+_LAYOUT_TAIL = _LAYOUT_TAIL.removesuffix("\n")
+# Compiled once; render_template_string() would parse it on every request.
+_LAYOUT_HEAD = app.jinja_env.from_string(_LAYOUT_HEAD_TEMPLATE)
+
+
+def render_layout(*, page_title: str, file_tree: str, content: str, current_file: str) -> Response:
+    head = _LAYOUT_HEAD.render(
+        page_title=page_title,
+        file_tree=file_tree,
+        current_file=current_file,
+    )
+    return Response((head, content, _LAYOUT_TAIL), mimetype="text/html")
+
+
+@dataclass(slots=True)
 class FileTreeNode:
     dirs: dict[str, "FileTreeNode"] = field(default_factory=dict)
     files: list[str] = field(default_factory=list)
@@ -79,19 +155,73 @@ def _insert_path(root: FileTreeNode, rel_parts: tuple[str, ...]) -> None:
         node = node.dirs.setdefault(part, FileTreeNode())
     node.files.append(rel_parts[-1])
 
-def build_org_tree(org_dir: Path) -> FileTreeNode:
+# org_dir -> (directory mtimes, tree) of the last scan. Adding, removing or
+# renaming an entry bumps the mtime of its parent directory, so the tree is
+# reused while every directory below org_dir still has the recorded mtime.
+_TREE_CACHE: dict[Path, tuple[tuple[tuple[str, int], ...], FileTreeNode]] = {}
+
+
+def _dir_mtimes_unchanged(mtimes: tuple[tuple[str, int], ...]) -> bool:
+    if not mtimes:
+        # org_dir did not exist at scan time; it may have been created since
+        return False
+    try:
+        return all(os.stat(d).st_mtime_ns == m for d, m in mtimes)
+    except OSError:
+        return False
+
+
+def build_org_tree_cached(org_dir: Path) -> FileTreeNode:
+    """
+    Like build_org_tree, but rescans org_dir only when a directory below it
+    changed. The returned tree is shared between callers; do not mutate it.
+    """
+    entry = _TREE_CACHE.get(org_dir)
+    if entry is not None and _dir_mtimes_unchanged(entry[0]):
+        return entry[1]
+
+    mtimes: list[tuple[str, int]] = []
+    tree = _scan_org_tree(org_dir, mtimes)
+    _TREE_CACHE[org_dir] = (tuple(mtimes), tree)
+    return tree
+
+
+def _walk_org_files(
+    top: str, prefix: tuple[str, ...], mtimes: list[tuple[str, int]]
+) -> Iterator[tuple[str, ...]]:
+    """
+    Yield the relative parts of every *.org file below `top`, skipping
+    hidden entries, and record (path, mtime_ns) of each directory visited.
+    Like glob("**"), symlinked directories are not followed.
+    """
+    with os.scandir(top) as it:
+        entries = sorted(it, key=lambda e: e.name)
+    for entry in entries:
+        name = entry.name
+        if name.startswith("."):
+            continue
+        if entry.is_dir(follow_symlinks=False):
+            mtimes.append((entry.path, entry.stat(follow_symlinks=False).st_mtime_ns))
+            yield from _walk_org_files(entry.path, prefix + (name,), mtimes)
+        elif name.endswith(".org"):
+            yield prefix + (name,)
+
+
+def _scan_org_tree(org_dir: Path, mtimes: list[tuple[str, int]]) -> FileTreeNode:
     root = FileTreeNode()
     if not org_dir.exists():
         return root
 
-    for p in sorted(org_dir.glob("**/*.org")):
-        # skip hidden dirs
-        if any(seg.startswith(".") for seg in p.relative_to(org_dir).parts):
-            continue
-        rel = p.relative_to(org_dir)
-        _insert_path(root, rel.parts)
+    top = str(org_dir)
+    mtimes.append((top, os.stat(top).st_mtime_ns))
+    for parts in _walk_org_files(top, (), mtimes):
+        _insert_path(root, parts)
     return root
 
+
+def build_org_tree(org_dir: Path) -> FileTreeNode:
+    return _scan_org_tree(org_dir, [])
+
 def _open_dir_set_for_current(current_rel: str) -> set[str]:
     """
     current_rel is like 'org/2025/foo.org'. We want open dirs within ORG_DIR:
@@ -101,12 +231,12 @@ def _open_dir_set_for_current(current_rel: str) -> set[str]:
         return set()
     inner = current_rel[len("org/"):]
     parts = [p for p in inner.split("/") if p]
-    # ancestors excluding filename
+    # ancestors excluding filename, each extending the previous one
     open_dirs: set[str] = set()
-    acc: list[str] = []
+    acc = ""
     for seg in parts[:-1]:
-        acc.append(seg)
-        open_dirs.add("/".join(acc))
+        acc = f"{acc}/{seg}" if acc else seg
+        open_dirs.add(acc)
     return open_dirs
 
 def render_tree_html(node: FileTreeNode, *, prefix: str, open_dirs: set[str], current_file: str) -> str:
@@ -114,18 +244,28 @@ def render_tree_html(node: FileTreeNode, *, prefix: str, open_dirs: set[str], cu
     prefix: path inside org/ (e.g. '' or '2025')
     current_file: full rel path from BASE_DIR (e.g. 'org/2025/foo.org')
     """
-    out: list[str] = []
+    out = io.StringIO()
+    _write_tree_html(node, out, prefix, open_dirs, current_file)
+    return out.getvalue()
+
+
+def _write_tree_html(
+    node: FileTreeNode, out: io.StringIO, prefix: str, open_dirs: set[str], current_file: str
+) -> None:
+    # Subtrees write into the caller's buffer instead of returning strings
+    # that each level would join again.
+    write = out.write
 
     # directories
     for dirname in sorted(node.dirs.keys()):
         child = node.dirs[dirname]
         child_prefix = f"{prefix}/{dirname}".strip("/")
         open_attr = " open" if child_prefix in open_dirs else ""
-        out.append(f'<details class="fm-dir"{open_attr}>')
-        out.append(f"<summary>{_html.escape(dirname)}/</summary>")
-        out.append('<div class="fm-children">')
-        out.append(render_tree_html(child, prefix=child_prefix, open_dirs=open_dirs, current_file=current_file))
-        out.append("</div></details>")
+        write(f'<details class="fm-dir" data-path="{_html.escape(child_prefix)}"{open_attr}>')
+        write(f"<summary>{_html.escape(dirname)}/</summary>")
+        write('<div class="fm-children">')
+        _write_tree_html(child, out, child_prefix, open_dirs, current_file)
+        write("</div></details>")
 
     # files
     for fname in sorted(node.files):
@@ -133,9 +273,38 @@ def render_tree_html(node: FileTreeNode, *, prefix: str, open_dirs: set[str], cu
         rel_from_base = f"org/{rel_inside_org}"
         href = "/view/" + quote(rel_from_base)
         active = " active" if rel_from_base == current_file else ""
-        out.append(f'<div class="fm-file{active}"><a href="{href}">{_html.escape(fname)}</a></div>')
+        write(
+            f'<div class="fm-file{active}" data-rel="{_html.escape(rel_from_base)}">'
+            f'<a href="{href}">{_html.escape(fname)}</a></div>'
+        )
+
+
+# (tree, html) of the last rendered sidebar with nothing opened or active.
+# The tree object comes from build_org_tree_cached, so identity means "unchanged".
+_SIDEBAR_SKELETON: tuple[FileTreeNode | None, str] = (None, "")
+
+
+def render_sidebar_html(tree: FileTreeNode, current_file: str) -> str:
+    """
+    Same output as render_tree_html(tree, prefix="", ...) for current_file,
+    but the tree is only walked once per tree; the per-request `open` and
+    `active` markers are spliced into the cached skeleton.
+    """
+    global _SIDEBAR_SKELETON
+    cached_tree, skeleton = _SIDEBAR_SKELETON
+    if cached_tree is not tree:
+        skeleton = render_tree_html(tree, prefix="", open_dirs=set(), current_file="")
+        _SIDEBAR_SKELETON = (tree, skeleton)
+
+    if not current_file:
+        return skeleton
 
-    return "".join(out)
+    html_out = skeleton
+    for d in _open_dir_set_for_current(current_file):
+        tag = f'<details class="fm-dir" data-path="{_html.escape(d)}">'
+        html_out = html_out.replace(tag, tag[:-1] + " open>", 1)
+    tag = f'<div class="fm-file" data-rel="{_html.escape(current_file)}">'
+    return html_out.replace(tag, '<div class="fm-file active"' + tag[len('<div class="fm-file"'):], 1)
 
 
 def _load_math_cache_payload(tex_path: Path) -> tuple[str, str]:
@@ -149,38 +318,41 @@ def _load_math_cache_payload(tex_path: Path) -> tuple[str, str]:
     raw = tex_path.read_text(encoding="utf-8")
 
     if raw.startswith("%% org-math-cache-v1"):
-        lines = raw.splitlines()
-        try:
-            i_macros = lines.index("%% macros")
-            i_math = lines.index("%% math")
-        except ValueError:
+        # The markers are whole lines; the header line precedes "%% macros"
+        # and the (possibly empty) macros block ends with "\n".
+        _, sep_macros, rest = raw.partition("\n%% macros\n")
+        macros, sep_math, math_src = rest.partition("\n%% math\n")
+        if not sep_math and rest.startswith("%% math\n"):
+            # empty macros block
+            macros, sep_math, math_src = "", "\n", rest[len("%% math\n"):]
+        if not (sep_macros and sep_math):
             # malformed -> fallback to legacy behavior
             return "", raw.strip()
 
-        macros = "\n".join(lines[i_macros + 1 : i_math]).strip()
-        math_src = "\n".join(lines[i_math + 1 :]).strip()
-        return macros, math_src
+        return macros.strip(), math_src.strip()
 
     # legacy: whole file is the math snippet
     return "", raw.strip()
 
+@lru_cache(maxsize=2048)
+def _load_math_cache_payload_cached(path_str: str, mtime_ns: int) -> tuple[str, str]:
+    """
+    _load_math_cache_payload(), memoized per (path, mtime_ns): a snippet whose
+    SVG rendering failed is not re-read and re-split when it is requested again.
+    """
+    return _load_math_cache_payload(Path(path_str))
+
 @app.route("/")
 def index():
-    tree = build_org_tree(ORG_DIR)
-    file_tree_html = render_tree_html(
-        tree,
-        prefix="",
-        open_dirs=set(),
-        current_file="",
-    )
+    tree = build_org_tree_cached(ORG_DIR)
+    file_tree_html = render_sidebar_html(tree, "")
 
     content = """
       <h1>Org Viewer</h1>
       <p>Wähle links eine Datei aus.</p>
     """
 
-    return render_template_string(
-        LAYOUT_TEMPLATE,
+    return render_layout(
         page_title="Org Viewer",
         file_tree=file_tree_html,
         content=content,
@@ -190,6 +362,15 @@ def index():
 
 @app.route("/view/<path:filename>")
 def view_file(filename: str):
+    # Reject what can never name a viewable file before touching the disk
+    if (
+        not filename.lower().endswith(".org")
+        or "\0" in filename
+        or filename.startswith("/")
+        or ".." in filename.split("/")
+    ):
+        abort(404)
+
     org_path = (BASE_DIR / filename).resolve()
     try:
         org_path.relative_to(BASE_DIR)
@@ -205,18 +386,16 @@ def view_file(filename: str):
         except ValueError:
             abort(404)
 
-    # body-only rendering
-    state, body_html = render_org_to_html_body(org_path, cfg)
+    # body-only rendering (cached until the file or an include changes)
+    title, body_html = _render_body_cached(org_path)
 
     current_rel = str(org_path.relative_to(BASE_DIR))
-    tree = build_org_tree(ORG_DIR)
-    open_dirs = _open_dir_set_for_current(current_rel)
-    file_tree_html = render_tree_html(tree, prefix="", open_dirs=open_dirs, current_file=current_rel)
+    tree = build_org_tree_cached(ORG_DIR)
+    file_tree_html = render_sidebar_html(tree, current_rel)
 
-    title = state.preamble.title or current_rel
+    title = title or current_rel
 
-    return render_template_string(
-        LAYOUT_TEMPLATE,
+    return render_layout(
         page_title=title,
         file_tree=file_tree_html,
         content=body_html,
@@ -245,21 +424,35 @@ if __name__ == "__main__":
 @app.route("/math/<digest>.svg")
 def math_image(digest: str):
     # Basic safety: only hex digests allowed
-    if not all(c in "0123456789abcdef" for c in digest) or len(digest) != 40:
+    if not _HEX40_RE.fullmatch(digest):
         abort(404)
 
+    # The digest names the rendered content, so it is the ETag and the
+    # image never changes under its URL. ("*" is not a match: it would also
+    # answer digests that have no image and must 404.)
+    if digest in request.if_none_match.as_set(include_weak=True):
+        resp = Response(status=304)
+        resp.set_etag(digest)
+        resp.headers["Cache-Control"] = _MATH_CACHE_CONTROL
+        return resp
+
     svg_path = MATH_CACHE / f"{digest}.svg"
 
     if not svg_path.exists():
         source_path = MATH_CACHE / f"{digest}.tex"
-        if not source_path.exists():
+        try:
+            st = source_path.stat()
+        except FileNotFoundError:
             abort(404)
 
-        macros, math_src = _load_math_cache_payload(source_path)
+        macros, math_src = _load_math_cache_payload_cached(str(source_path), st.st_mtime_ns)
 
         try:
             render_math_to_svg(math_src, svg_path, preamble_macros=macros)
         except Exception:
             abort(500)
 
-    return send_from_directory(MATH_CACHE, svg_path.name)
+    resp = send_from_directory(MATH_CACHE, svg_path.name)
+    resp.set_etag(digest)
+    resp.headers["Cache-Control"] = _MATH_CACHE_CONTROL
+    return resp